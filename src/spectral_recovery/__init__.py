@@ -2,11 +2,54 @@
 The spectral_recovery module includes the core functions for reading imagery,
 processing indices, and computing recovery metrics.
 
+Submodules and their dependencies (e.g spyndex, matplotlib) are imported
+on first use of the functions below, so importing the package is fast.
+
 """
 
-from spectral_recovery.io.raster import read_timeseries
-from spectral_recovery.io.polygon import read_restoration_polygons
-from spectral_recovery.targets import historic, reference
-from spectral_recovery.indices import compute_indices
-from spectral_recovery.metrics import compute_metrics
-from spectral_recovery.plotting import plot_spectral_trajectory
+import importlib
+
+# Registers the "satts" DataArray accessor
+import spectral_recovery.timeseries
+
+# Public names and the modules they are imported from on first use. A
+# None attribute is the module itself.
+_LAZY_ATTRS = {
+    "read_timeseries": ("spectral_recovery.io.raster", "read_timeseries"),
+    "read_restoration_polygons": (
+        "spectral_recovery.io.polygon",
+        "read_restoration_polygons",
+    ),
+    "historic": ("spectral_recovery.targets.historic", None),
+    "reference": ("spectral_recovery.targets.reference", None),
+    "compute_indices": ("spectral_recovery.indices", "compute_indices"),
+    "compute_metrics": ("spectral_recovery.metrics", "compute_metrics"),
+    "compute_pixel_metrics": ("spectral_recovery.metrics", "compute_pixel_metrics"),
+    "required_years": ("spectral_recovery.metrics", "required_years"),
+    "plot_spectral_trajectory": (
+        "spectral_recovery.plotting",
+        "plot_spectral_trajectory",
+    ),
+}
+
+_SUBMODULES = ["indices", "io", "metrics", "plotting", "targets", "timeseries"]
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        module_name, attr = _LAZY_ATTRS[name]
+        module = importlib.import_module(module_name)
+        value = module if attr is None else getattr(module, attr)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Cache, so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_SUBMODULES))
@@ -0,0 +1,147 @@
+"""Precomputed catalogue of the spyndex bands and indices.
+
+Importing spyndex and walking its catalogue takes seconds, so the
+names, application domains, bands and formulas used to validate and
+compute indices are snapshotted to resources/catalogue.json and loaded
+once into immutable mappings and frozensets. Regenerate the snapshot
+after upgrading spyndex with::
+
+    python -m spectral_recovery._catalogue
+
+"""
+
+import functools
+import importlib.metadata
+import json
+import importlib.resources as pkg_resources
+from pathlib import Path
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, NamedTuple, Tuple
+
+from spectral_recovery._config import SUPPORTED_DOMAINS
+
+CATALOGUE_RESOURCE = "catalogue.json"
+CONSTANT_DEFAULTS_RESOURCE = "constant_defaults.json"
+
+# Indices implemented by spectral-recovery rather than spyndex
+SR_INDICES = ("GCI", "TCB", "TCW", "TCG")
+
+
+class Catalogue(NamedTuple):
+    """The bands and indices of the spyndex catalogue.
+
+    Attributes
+    ----------
+    spyndex_version : str
+        The spyndex version the catalogue was built from.
+    bands : tuple of str
+        Standard band names, in spyndex's order.
+    band_set : frozenset of str
+        The standard band names, for membership checks.
+    common_names : mapping
+        Spyndex's common name of each standard band.
+    indices : frozenset of str
+        Names of all spyndex indices.
+    domains : mapping
+        Application domain of each spyndex index.
+    index_bands : mapping
+        Bands and constants used by each spyndex index.
+    formulas : mapping
+        Formula of each spyndex index.
+    supported_indices : frozenset of str
+        Spyndex indices of the supported domains and spectral-recovery's
+        indices.
+    constant_defaults : mapping
+        Index-specific constant defaults, see constant_defaults.json.
+
+    """
+
+    spyndex_version: str
+    bands: Tuple[str, ...]
+    band_set: FrozenSet[str]
+    common_names: Mapping[str, str]
+    indices: FrozenSet[str]
+    domains: Mapping[str, str]
+    index_bands: Mapping[str, Tuple[str, ...]]
+    formulas: Mapping[str, str]
+    supported_indices: FrozenSet[str]
+    constant_defaults: Mapping[str, dict]
+
+
+@functools.cache
+def catalogue() -> Catalogue:
+    """The catalogue, loaded from its snapshot on first use"""
+    snapshot = _read_resource(CATALOGUE_RESOURCE)
+    bands = snapshot["bands"]
+    indices = snapshot["indices"]
+    return Catalogue(
+        spyndex_version=snapshot["spyndex_version"],
+        bands=tuple(bands),
+        band_set=frozenset(bands),
+        common_names=MappingProxyType(
+            {band: info["common_name"] for band, info in bands.items()}
+        ),
+        indices=frozenset(indices),
+        domains=MappingProxyType(
+            {index: info["application_domain"] for index, info in indices.items()}
+        ),
+        index_bands=MappingProxyType(
+            {index: tuple(info["bands"]) for index, info in indices.items()}
+        ),
+        formulas=MappingProxyType(
+            {index: info["formula"] for index, info in indices.items()}
+        ),
+        supported_indices=frozenset(
+            index
+            for index, info in indices.items()
+            if info["application_domain"] in SUPPORTED_DOMAINS
+        )
+        | frozenset(SR_INDICES),
+        constant_defaults=MappingProxyType(_read_resource(CONSTANT_DEFAULTS_RESOURCE)),
+    )
+
+
+def build_catalogue() -> dict:
+    """Snapshot of the installed spyndex catalogue, as stored in JSON"""
+    import spyndex as spx
+
+    return {
+        "spyndex_version": importlib.metadata.version("spyndex"),
+        "bands": {
+            band: {"common_name": spx.bands[band].common_name} for band in spx.bands
+        },
+        "indices": {
+            index: {
+                "application_domain": spx.indices[index].application_domain,
+                "bands": list(spx.indices[index].bands),
+                "formula": spx.indices[index].formula,
+            }
+            for index in spx.indices
+        },
+    }
+
+
+def write_catalogue(path: str | Path = None) -> None:
+    """Write the snapshot of the installed spyndex catalogue.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Path of the snapshot. Default is the package's resource.
+
+    """
+    if path is None:
+        path = pkg_resources.files("spectral_recovery.resources") / CATALOGUE_RESOURCE
+    with open(path, "w") as f:
+        json.dump(build_catalogue(), f, indent=1)
+        f.write("\n")
+
+
+def _read_resource(name: str) -> dict:
+    resource = pkg_resources.files("spectral_recovery.resources").joinpath(name)
+    with resource.open() as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    write_catalogue()
@@ -2,15 +2,29 @@
 
 import re
 import json
-import spyndex as spx
 
 DATETIME_FREQ = "YS"
 
 REQ_DIMS = ["band", "time", "y", "x"]
 
+# Memory budget per chunk when rechunking stacks to full time-axis tiles
+RECHUNK_MAX_MEM = "256MB"
+
+# Default maximum size of on-disk recovery target caches
+TARGET_CACHE_MAX_SIZE = "10GB"
+
+VALID_YEAR = re.compile(r"^\d{4}$")
+
 # Index configurations
-STANDARD_BANDS = list(spx.bands)
 SUPPORTED_DOMAINS = ["vegetation", "burn"]
-SUPPORTED_INDICES = [ix for ix in list(spx.indices) if spx.indices[ix].application_domain in SUPPORTED_DOMAINS] + ["GCI", "TCW", "TCG"]
 
-VALID_YEAR = re.compile(r"^\d{4}$")
+
+def __getattr__(name):
+    # Read from the catalogue snapshot on first use
+    if name in ("STANDARD_BANDS", "SUPPORTED_INDICES"):
+        from spectral_recovery._catalogue import catalogue
+
+        if name == "STANDARD_BANDS":
+            return list(catalogue().bands)
+        return catalogue().supported_indices
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
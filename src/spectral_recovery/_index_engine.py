@@ -0,0 +1,287 @@
+"""Fused evaluation of spectral index formulas.
+
+The formulas of all requested indices are compiled into one generated
+NumPy function that is applied to each chunk of the stack. Each band is
+read once per chunk and every index is written into a single output
+array, so temporaries are chunk-sized instead of stack-sized.
+"""
+
+import ast
+import functools
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+import xarray as xr
+
+# Formulas are plain arithmetic, see spyndex's index formulas
+_ALLOWED_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.USub,
+    ast.UAdd,
+)
+
+
+def formula_names(formula: str) -> list:
+    """Names of the bands and constants used by a formula, in order."""
+    names = []
+    for node in ast.walk(_parse(formula)):
+        if isinstance(node, ast.Name) and node.id not in names:
+            names.append(node.id)
+    return names
+
+
+def compute_fused(
+    formulas: Dict[str, str],
+    params: Dict,
+    combinations: Dict = None,
+    order: List[str] = None,
+) -> xr.DataArray:
+    """Compute indices from their formulas in one pass over the bands.
+
+    Parameters
+    ----------
+    formulas : dict
+        Formula of each index, keyed by index name.
+    params : dict
+        Bands (DataArrays) and constants (scalars) used by the formulas,
+        keyed by their standard names.
+    combinations : dict, optional
+        Indices that are linear combinations of bands, e.g tasselled cap
+        components, computed together by accumulating each weighted band
+        into an (indices x chunk) block. Maps a
+        tuple of index names to a (bands, coefficients) tuple, where
+        coefficients is an (indices x bands) array.
+    order : list of str, optional
+        The order of the indices in the output. Default is the order of
+        formulas and then combinations.
+
+    Returns
+    -------
+    xr.DataArray
+        The indices stacked along a "band" dimension.
+
+    Raises
+    ------
+    KeyError
+        If a band or constant used by a formula is not in params.
+
+    """
+    combinations = combinations or {}
+    used = [(index, formula_names(formula)) for index, formula in formulas.items()]
+    used += [(index, list(bands)) for index, (bands, _) in combinations.items()]
+    names = []
+    for index, index_names in used:
+        for name in index_names:
+            if name not in params:
+                index = "/".join(index) if isinstance(index, tuple) else index
+                raise KeyError(f"Missing '{name}' in the parameters for {index}")
+            if name not in names:
+                names.append(name)
+    bands = tuple(n for n in names if isinstance(params[n], xr.DataArray))
+    scalars = {n: params[n] for n in names if n not in bands}
+    band_data = [params[b].drop_vars("band", errors="ignore") for b in bands]
+
+    # Coefficients are cast as Python float scalars would be, so a
+    # combination matches the weighted sum written as a formula
+    coefficient_dtype = np.result_type(*[b.dtype for b in band_data], 0.0)
+    coefficients = {
+        f"_C{k}": np.asarray(matrix, dtype=coefficient_dtype)
+        for k, (_, matrix) in enumerate(combinations.values())
+    }
+    kernel = _compile_kernel(
+        tuple(formulas.items()),
+        bands,
+        tuple(scalars),
+        tuple((outputs, tuple(b)) for outputs, (b, _) in combinations.items()),
+        tuple(order) if order is not None else None,
+    )
+    dtype = _output_dtype(kernel, [b.dtype for b in band_data], scalars, coefficients)
+    index_stack = xr.apply_ufunc(
+        kernel,
+        *band_data,
+        kwargs=scalars | coefficients | {"out_dtype": dtype},
+        output_core_dims=[["band"]],
+        dask="parallelized",
+        output_dtypes=[dtype],
+        dask_gufunc_kwargs={"output_sizes": {"band": len(kernel.outputs)}},
+    )
+    return index_stack.transpose("band", ...).assign_coords(band=list(kernel.outputs))
+
+
+def _parse(formula: str) -> ast.Expression:
+    tree = ast.parse(formula, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(
+                f"Unsupported operation '{type(node).__name__}' in formula '{formula}'"
+            )
+    return tree
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_kernel(
+    formulas: Tuple[Tuple[str, str], ...],
+    bands: Tuple[str, ...],
+    scalars: Tuple[str, ...],
+    combinations: Tuple[Tuple[Tuple[str, ...], Tuple[str, ...]], ...] = (),
+    order: Tuple[str, ...] = None,
+):
+    """Generate a function computing all formulas from bands and scalars.
+
+    The function takes the bands positionally, the scalars, the
+    coefficients of each combination (as `_C0`, `_C1`, ...) and the
+    output dtype as keywords, and returns an array with the indices
+    along a new last axis, in the given order or in the order of
+    formulas and then combinations. Subexpressions shared by the formulas (e.g
+    `N - R` in NDVI, EVI and SAVI) are evaluated once into temporaries,
+    which are deleted after their last use.
+    """
+    trees = [_canonical(_parse(formula).body) for _, formula in formulas]
+    shared = _shared_subexpressions(trees)
+    outputs = [index for index, _ in formulas]
+
+    temps = {}
+    statements = []
+    outputs += [index for indices, _ in combinations for index in indices]
+    slots = {index: (order or outputs).index(index) for index in outputs}
+    for (index, _), tree in zip(formulas, trees):
+        expression = _substitute(tree, shared, temps, statements)
+        statements.append(f"out[{slots[index]}] = {ast.unparse(expression)}")
+    for k, (indices, combination_bands) in enumerate(combinations):
+        # Weights of each band as a column over the combination's indices
+        temps[f"_w{k}"] = f"_w{k}"
+        statements.append(f"_w{k} = _C{k}.reshape(_C{k}.shape + (1,) * (out.ndim - 1))")
+        first = slots[indices[0]]
+        contiguous = [slots[i] for i in indices] == list(
+            range(first, first + len(indices))
+        )
+        temps[f"_c{k}"] = f"_c{k}"
+        if contiguous:
+            statements.append(f"_c{k} = out[{first}:{first + len(indices)}]")
+        else:
+            statements.append(
+                f"_c{k} = np.empty(({len(indices)},) + out.shape[1:], dtype=out_dtype)"
+            )
+        # Accumulate band by band, in the order a weighted sum would
+        statements.append(
+            f"np.multiply(_w{k}[:, 0], {combination_bands[0]}, out=_c{k})"
+        )
+        for b, band in enumerate(combination_bands[1:], start=1):
+            statements.append(f"_c{k} += _w{k}[:, {b}] * {band}")
+        if not contiguous:
+            for c, index in enumerate(indices):
+                statements.append(f"out[{slots[index]}] = _c{k}[{c}]")
+    last_use = {
+        temp: max(
+            i
+            for i, statement in enumerate(statements)
+            if re.search(rf"\b{temp}\b", statement)
+        )
+        for temp in temps.values()
+    }
+
+    coefficients = tuple(f"_C{k}" for k in range(len(combinations)))
+    args = ", ".join(bands + ("*",) + scalars + coefficients + ("out_dtype",))
+    shapes = ", ".join(f"np.shape({b})" for b in bands)
+    lines = [
+        f"def _kernel({args}):",
+        f"    out = np.empty(({len(outputs)},) + np.broadcast_shapes({shapes}), dtype=out_dtype)",
+    ]
+    for i, statement in enumerate(statements):
+        lines.append(f"    {statement}")
+        done = [temp for temp, last in last_use.items() if last == i]
+        if done:
+            lines.append(f"    del {', '.join(done)}")
+    lines.append("    return np.moveaxis(out, 0, -1)")
+    source = "\n".join(lines)
+    namespace = {"np": np}
+    exec(compile(source, "<fused indices>", "exec"), namespace)
+    kernel = namespace["_kernel"]
+    kernel.formulas = formulas
+    kernel.combinations = combinations
+    kernel.bands = bands
+    kernel.outputs = tuple(order or outputs)
+    kernel.source = source
+    return kernel
+
+
+def _key(node: ast.AST) -> str:
+    return ast.dump(node, annotate_fields=False)
+
+
+def _canonical(node: ast.AST) -> ast.AST:
+    """Order the operands of + and * so equal terms have equal keys.
+
+    Swapping the operands of + and * does not change floating point
+    results, so formulas evaluate exactly as written.
+    """
+    for child in ast.iter_child_nodes(node):
+        _canonical(child)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Mult)):
+        if _key(node.right) < _key(node.left):
+            node.left, node.right = node.right, node.left
+    return node
+
+
+def _shared_subexpressions(trees) -> set:
+    """Keys of the operations that occur more than once across trees.
+
+    The subterms of a repeated operation are only counted at its first
+    occurrence, since they are evaluated once with it.
+    """
+    counts = {}
+
+    def count(node):
+        if isinstance(node, (ast.BinOp, ast.UnaryOp)):
+            key = _key(node)
+            counts[key] = counts.get(key, 0) + 1
+            if counts[key] > 1:
+                return
+        for child in ast.iter_child_nodes(node):
+            count(child)
+
+    for tree in trees:
+        count(tree)
+    return {key for key, n in counts.items() if n > 1}
+
+
+def _substitute(node, shared, temps, statements) -> ast.AST:
+    """Replace shared operations in node by temporaries.
+
+    Assignments of new temporaries are appended to statements.
+    """
+    key = _key(node)
+    if key in temps:
+        return ast.Name(id=temps[key], ctx=ast.Load())
+    for field, child in ast.iter_fields(node):
+        if isinstance(child, ast.AST):
+            setattr(node, field, _substitute(child, shared, temps, statements))
+    if key in shared:
+        temps[key] = f"_t{len(temps)}"
+        statements.append(f"{temps[key]} = {ast.unparse(node)}")
+        return ast.Name(id=temps[key], ctx=ast.Load())
+    return node
+
+
+def _output_dtype(kernel, dtypes, scalars, coefficients) -> np.dtype:
+    """The dtype of the indices when evaluated on arrays of dtypes"""
+    probes = {
+        name: np.ones(1, dtype=dtype) for name, dtype in zip(kernel.bands, dtypes)
+    }
+    with np.errstate(all="ignore"):
+        results = [
+            eval(formula, {}, probes | scalars) for _, formula in kernel.formulas
+        ]
+    results += [matrix.dtype for matrix in coefficients.values()]
+    return np.result_type(*results)
@@ -1,11 +1,22 @@
 """Utility functions for spectral-recovery."""
 
 import functools
-import spyndex as spx
+import inspect
+import os
 import xarray as xr
 
 from rioxarray.exceptions import MissingCRS
-from prettytable import PrettyTable, ALL
+
+from spectral_recovery._catalogue import catalogue
+
+# Unambiguous common names for the bands whose spyndex common names
+# ("green", "rededge") are shared with other bands
+COMMON_NAME_OVERRIDES = {
+    "G1": "green1",
+    "RE1": "rededge1",
+    "RE2": "rededge2",
+    "RE3": "rededge3",
+}
 
 
 def maintain_rio_attrs(func: callable) -> callable:
@@ -77,27 +88,83 @@ def maintain_rio_attrs(func: callable) -> callable:
     return wrapper_maintain_rio_attrs
 
 
+def dataset_per_index(func: callable) -> callable:
+    """A wrapper for accepting a Dataset with one variable per index.
+
+    Functions written for a (band, time, y, x) `timeseries_data`
+    DataArray also accept a Dataset of (time, y, x) index variables,
+    e.g from `compute_indices(..., as_dataset=True)`. The function is
+    applied to each index in turn, so the indices never need to be
+    concatenated into one array, and the (small) results are stacked
+    along the band dimension.
+
+    Notes
+    -----
+    A `recovery_target` argument is narrowed to the index of each call.
+    An `out` store argument gets a sub-store per index, e.g out/NBR.
+
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper_dataset_per_index(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        data = bound.arguments.get("timeseries_data")
+        if not isinstance(data, xr.Dataset):
+            return func(*args, **kwargs)
+
+        results = []
+        for index in data.data_vars:
+            index_args = signature.bind(*args, **kwargs)
+            index_args.arguments["timeseries_data"] = _index_of(data, index)
+            if "recovery_target" in index_args.arguments:
+                index_args.arguments["recovery_target"] = _index_of(
+                    index_args.arguments["recovery_target"], index
+                )
+            if index_args.arguments.get("out") is not None:
+                index_args.arguments["out"] = os.path.join(
+                    index_args.arguments["out"], str(index)
+                )
+            results.append(func(*index_args.args, **index_args.kwargs))
+        if isinstance(results[0], dict):
+            return {
+                key: xr.concat([result[key] for result in results], dim="band")
+                for key in results[0]
+            }
+        return xr.concat(results, dim="band")
+
+    return wrapper_dataset_per_index
+
+
+def _index_of(obj, index: str):
+    """Select one index of an index Dataset, DataArray or dict of them"""
+    if isinstance(obj, dict):
+        return {key: _index_of(value, index) for key, value in obj.items()}
+    if isinstance(obj, xr.Dataset):
+        # Unnamed, as the band of a stack would be
+        return obj[index].expand_dims(band=[index]).rename(None)
+    if isinstance(obj, xr.DataArray) and "band" in obj.dims:
+        return obj.sel(band=[index])
+    return obj
+
+
 def common_and_long_to_short(standard):
     """Dict of short and common names to standard names
 
     Notes
     -----
-    This manually changes the G1, RE1, RE2, and RE3 common
-    names to green1, rededge1, rededge2, and rededge3 respectively
+    The G1, RE1, RE2, and RE3 common names are green1, rededge1,
+    rededge2, and rededge3 respectively (see COMMON_NAME_OVERRIDES)
     to be less ambiguous. This means that the common names returned
     will be slightly different than those used in spyndex.
 
     """
-    # make 'green' and 'rededge' common names unambiguous
-    spx.bands["G1"].common_name = "green1"
-    spx.bands["RE1"].common_name = "rededge1"
-    spx.bands["RE2"].common_name = "rededge2"
-    spx.bands["RE3"].common_name = "rededge3"
-
+    common_names = catalogue().common_names
     common_and_short = {}
     for band in standard:
-        common_and_short[spx.bands[band].short_name] = band
-        common_and_short[spx.bands[band].common_name] = band
+        # Standard names are spyndex's short names
+        common_and_short[band] = band
+        common_and_short[COMMON_NAME_OVERRIDES.get(band, common_names[band])] = band
     return common_and_short
 
 
@@ -112,6 +179,9 @@ def bands_pretty_table():
         spyndex package.
 
     """
+    import spyndex as spx
+    from prettytable import PrettyTable, ALL
+
     band_table = PrettyTable()
     band_table.hrules = ALL
     band_table.field_names = [
@@ -126,7 +196,7 @@ def bands_pretty_table():
         band_table.add_row(
             [
                 st,
-                spx.bands[st].common_name,
+                COMMON_NAME_OVERRIDES.get(st, spx.bands[st].common_name),
                 spx.bands[st].long_name,
                 f"{spx.bands[st].min_wavelength, spx.bands[st].max_wavelength}",
                 platforms,
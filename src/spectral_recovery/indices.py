@@ -10,24 +10,28 @@ spectral indices from a stack of images and str of index names.
 """
 
 import copy
-import json
 
+import numpy as np
 import xarray as xr
-import importlib.resources as pkg_resources
 import spyndex as spx
 
 from typing import List, Dict
 
+from dask.base import tokenize
+
 from spectral_recovery._utils import maintain_rio_attrs
+from spectral_recovery._index_engine import compute_fused
+from spectral_recovery._catalogue import catalogue
 from spectral_recovery._config import SUPPORTED_DOMAINS
+from spectral_recovery.io.raster import write_indices_zarr, write_indices_cogs
+
+
+def __getattr__(name):
+    # Index-specific constant defaults, loaded on first use
+    if name == "INDEX_CONSTANT_DEFAULTS":
+        return catalogue().constant_defaults
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Set up global index configurations:
-#    1. Only support vegetation and burn indices
-#    2. Init index-specific constant defaults
-with pkg_resources.open_text(
-    "spectral_recovery.resources", "constant_defaults.json"
-) as f:
-    INDEX_CONSTANT_DEFAULTS = json.load(f)
 
 def GCI(params_dict: Dict[str, xr.DataArray]) -> xr.DataArray:
     """Compute the Green Chlorophyll Index (GCI) index"""
@@ -39,43 +43,119 @@ def GCI(params_dict: Dict[str, xr.DataArray]) -> xr.DataArray:
     return gci
 
 
+# Tasselled cap coefficients (components x TC_BANDS) for each sensor:
+#    "oli": Baig et al. (2014), Landsat 8 OLI at-satellite reflectance
+#    "etm+": Huang et al. (2002), Landsat 7 ETM+ at-satellite reflectance
+#    "tm": Crist (1985), Landsat TM reflectance factors
+TC_BANDS = ["B", "G", "R", "N", "S1", "S2"]
+TC_COMPONENTS = ["TCB", "TCG", "TCW"]
+TC_COEFFICIENTS = {
+    "oli": [
+        [0.3029, 0.2786, 0.4733, 0.5599, 0.508, 0.1872],
+        [-0.2941, -0.243, -0.5424, 0.7276, 0.0713, -0.1608],
+        [0.1511, 0.1973, 0.3283, 0.3407, -0.7117, -0.4559],
+    ],
+    "etm+": [
+        [0.3561, 0.3972, 0.3904, 0.6966, 0.2286, 0.1596],
+        [-0.3344, -0.3544, -0.4556, 0.6966, -0.0242, -0.263],
+        [0.2626, 0.2141, 0.0926, 0.0656, -0.7629, -0.5388],
+    ],
+    "tm": [
+        [0.2043, 0.4158, 0.5524, 0.5741, 0.3124, 0.2303],
+        [-0.1603, -0.2819, -0.4934, 0.794, -0.0002, -0.1446],
+        [0.0315, 0.2021, 0.3102, 0.1594, -0.6806, -0.6109],
+    ],
+}
+
+
+def tasselled_cap(
+    params_dict: Dict[str, xr.DataArray],
+    components: List[str] = TC_COMPONENTS,
+    sensor: str = "oli",
+) -> xr.DataArray:
+    """Compute tasselled cap components as weighted sums of the bands.
+
+    Applies the (components x bands) coefficient matrix of the sensor
+    to the B, G, R, N, S1 and S2 bands, reading each band once per chunk
+    for all components. Bands are accumulated in the order of the
+    weighted sum of each component, so results match the sum exactly
+    (unlike `np.einsum` or BLAS, whose summation order can vary).
+
+    Parameters
+    ----------
+    params_dict : dict
+        Dictionary mapping standard band names to band slices.
+    components : list of str
+        Components to compute, any of "TCB" (brightness), "TCG"
+        (greenness) and "TCW" (wetness). Default is all three.
+    sensor : {"oli", "etm+", "tm"}
+        The sensor of the coefficients. Default is "oli".
+
+    Returns
+    -------
+    xr.DataArray
+        The components stacked along the band dimension.
+
+    """
+    return compute_fused(
+        {},
+        params_dict,
+        combinations={
+            tuple(components): (TC_BANDS, _tc_coefficients(components, sensor))
+        },
+    )
+
+
+def _tc_coefficients(components: List[str], sensor: str) -> np.ndarray:
+    """Rows of a sensor's tasselled cap coefficients for components"""
+    if sensor not in TC_COEFFICIENTS:
+        raise ValueError(
+            f"sensor must be one of {list(TC_COEFFICIENTS)} ('{sensor}' provided)"
+        )
+    rows = [TC_COMPONENTS.index(c) for c in components]
+    return np.array(TC_COEFFICIENTS[sensor])[rows]
+
+
+def TCB(params_dict: Dict[str, xr.DataArray]) -> xr.DataArray:
+    """Compute the Tasselled Cap Brightness (TCB) index"""
+    return tasselled_cap(params_dict, ["TCB"])
+
+
 def TCW(params_dict: Dict[str, xr.DataArray]) -> xr.DataArray:
     """Compute the Tasselled Cap Wetness (TCW) index"""
-    try:
-        tcw = (
-            0.1511 * params_dict["B"]
-            + 0.1973 * params_dict["G"]
-            + 0.3283 * params_dict["R"]
-            + 0.3407 * params_dict["N"]
-            - 0.7117 * params_dict["S1"]
-            - 0.4559 * params_dict["S2"]
-        )
-    except KeyError as e:
-        raise KeyError(f"Missing '{e.args[0]}' in the parameters for TCW")
-    tcw = tcw.expand_dims(dim={"band": ["TCW"]})
-    return tcw
+    return tasselled_cap(params_dict, ["TCW"])
+
 
 def TCG(params_dict: Dict[str, xr.DataArray]) -> xr.DataArray:
-    """Compute the Tasselled Cap Greenness (TCW) index"""
-    try:
-        tcg = (
-            -0.2941 * params_dict["B"]
-            - 0.243 * params_dict["G"]
-            - 0.5424 * params_dict["R"]
-            + 0.7276 * params_dict["N"]
-            + 0.0713 * params_dict["S1"]
-            - 0.1608 * params_dict["S2"]
-        )
-    except KeyError as e:
-        raise KeyError(f"Missing '{e.args[0]}' in the parameters for TCG")
-    tcg = tcg.expand_dims(dim={"band": ["TCG"]})
-    return tcg
+    """Compute the Tasselled Cap Greenness (TCG) index"""
+    return tasselled_cap(params_dict, ["TCG"])
+
+
+SR_REC_IDXS = {"GCI": GCI, "TCB": TCB, "TCW": TCW, "TCG": TCG}
+
+# Formulas of the spectral-recovery indices that are not tasselled cap
+# components, for the fused engine
+SR_REC_FORMULAS = {"GCI": "(N / G) - 1"}
+
+ENGINES = ["spyndex", "fused"]
+
+OUT_FORMATS = {"zarr": write_indices_zarr, "cog": write_indices_cogs}
+
+PRECISIONS = ["float32", "float64"]
 
-SR_REC_IDXS = {"GCI": GCI, "TCW": TCW, "TCG": TCG}
 
 @maintain_rio_attrs
 def compute_indices(
-    image_stack: xr.DataArray, indices: list[str], constants: dict = {}, **kwargs
+    image_stack: xr.DataArray,
+    indices: list[str],
+    constants: dict = {},
+    engine: str = "spyndex",
+    tc_sensor: str = "oli",
+    as_dataset: bool = False,
+    out: str = None,
+    out_format: str = "zarr",
+    precision: str = None,
+    **kwargs,
 ):
     """Compute spectral indices using the spyndex package.
 
@@ -88,37 +168,166 @@ def compute_indices(
         list of spectral indices to compute
     constants : dict of flt, optional
         constant and value pairs e.g {"L": 0.5}
+    engine : {"spyndex", "fused"}, optional
+        How to evaluate the index formulas. "spyndex" evaluates each
+        index separately with spyndex.computeIndex. "fused" compiles the
+        formulas of all indices into one function applied per chunk,
+        which reads each band once and writes all indices in one pass,
+        avoiding a stack-sized temporary for every operation. Terms
+        shared by the indices (e.g N - R) are evaluated once. Default
+        is "spyndex".
+    tc_sensor : {"oli", "etm+", "tm"}, optional
+        Sensor of the coefficients used for the tasselled cap components
+        (TCB, TCG and TCW). See `tasselled_cap`. Default is "oli".
+    as_dataset : bool, optional
+        If True, return a Dataset with one (time, y, x) variable per
+        index instead of concatenating the indices along the band
+        dimension, which copies every index and casts them to a common
+        dtype. Metrics and recovery targets accept the Dataset directly.
+        Default is False.
+    out : str, optional
+        Path to write the indices to. If given, indices are computed and
+        written one year at a time, so memory is bounded by one year of
+        chunks rather than the whole stack. An interrupted write resumes
+        from the first incomplete year when called again with the same
+        stack and parameters.
+    out_format : {"zarr", "cog"}, optional
+        Format of `out`. "zarr" writes a Zarr store with one variable
+        per index, chunked by year (requires zarr). "cog" writes a Cloud
+        Optimized GeoTIFF per index and year to out/INDEX/YYYY.tif,
+        readable with `read_timeseries`. Default is "zarr".
+    precision : {"float32", "float64"}, optional
+        Floating point precision of the computation. Bands and constants
+        are cast to it before the formulas are evaluated, so indices are
+        computed and returned in it. "float32" halves the memory of the
+        bands and indices, and is precise enough for index values. Default
+        is None, computing in the precision of image_stack.
     kwargs : dict, optional
         Additional kwargs for wrapped spyndex.computeIndex function.
 
     Returns
     -------jmk,
         xr.DataArray: stack of images with spectral indices stacked along
-        the band dimension.
+        the band dimension, or xr.Dataset of indices if as_dataset=True.
+        If `out` is given, the indices are lazily read from `out`.
 
     """
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {ENGINES} ('{engine}' provided)")
+    if precision is not None and precision not in PRECISIONS:
+        raise ValueError(
+            f"precision must be one of {PRECISIONS} ('{precision}' provided)"
+        )
+    if out is not None:
+        if out_format not in OUT_FORMATS:
+            raise ValueError(
+                f"out_format must be one of {list(OUT_FORMATS)} ('{out_format}' provided)"
+            )
+        # Identifies a partially written output to resume
+        fingerprint = tokenize(
+            image_stack, indices, constants, tc_sensor, precision, kwargs
+        )
+        index_ds = compute_indices(
+            image_stack,
+            indices,
+            constants=constants,
+            engine=engine,
+            tc_sensor=tc_sensor,
+            as_dataset=True,
+            precision=precision,
+            **kwargs,
+        )
+        index_ds = OUT_FORMATS[out_format](index_ds, out, fingerprint)
+        if as_dataset:
+            return index_ds
+        return index_ds.to_dataarray(dim="band")
     spx_indices, sr_indices = _split_indices_by_source(indices)
-    params_dict = _build_params_dict(image_stack)
+    params_dict = _with_precision(_build_params_dict(image_stack), precision)
+    if engine == "fused":
+        if spx_indices and _supported_domain(spx_indices):
+            constants_dict = _build_constants_dict(spx_indices, constants)
+            params_dict = _with_precision(
+                params_dict | constants_dict | kwargs, precision
+            )
+        formulas = {i: catalogue().formulas[i] for i in spx_indices} | {
+            i: SR_REC_FORMULAS[i] for i in sr_indices if i in SR_REC_FORMULAS
+        }
+        tc_indices = [i for i in sr_indices if i in TC_COMPONENTS]
+        combinations = {}
+        if tc_indices:
+            combinations[tuple(tc_indices)] = (
+                TC_BANDS,
+                _tc_coefficients(tc_indices, tc_sensor),
+            )
+        index_stack = compute_fused(
+            formulas, params_dict, combinations, order=spx_indices + sr_indices
+        )
+        if as_dataset:
+            # Views into the fused output, one per index
+            return xr.Dataset(
+                {
+                    str(i): index_stack.isel(band=k, drop=True)
+                    for k, i in enumerate(index_stack.band.values)
+                }
+            )
+        return index_stack
     spx_and_sr_outputs = []
+    index_vars = {}
     if spx_indices:
         # Compute indexes implemented in spx (spyndex)
         if _supported_domain(spx_indices):
             constants_dict = _build_constants_dict(spx_indices, constants)
-            params_dict = params_dict | constants_dict | kwargs
-            spx_index_stack = spx.computeIndex(index=spx_indices, params=params_dict)
-            # Rename index to band or expand if only one index was computed
-            spx_index_stack = (spx_index_stack.rename({"index": "band"})
-                   if "index" in spx_index_stack.dims
-                   else spx_index_stack.expand_dims(dim={"band": spx_indices}))
-            spx_and_sr_outputs.append(spx_index_stack)
+            params_dict = _with_precision(
+                params_dict | constants_dict | kwargs, precision
+            )
+            if as_dataset:
+                spx_outputs = spx.computeIndex(
+                    index=spx_indices, params=params_dict, returnOrigin=False
+                )
+                if len(spx_indices) == 1:
+                    spx_outputs = [spx_outputs]
+                index_vars.update(zip(spx_indices, spx_outputs))
+            else:
+                spx_index_stack = spx.computeIndex(
+                    index=spx_indices, params=params_dict
+                )
+                # Rename index to band or expand if only one index was computed
+                spx_index_stack = (
+                    spx_index_stack.rename({"index": "band"})
+                    if "index" in spx_index_stack.dims
+                    else spx_index_stack.expand_dims(dim={"band": spx_indices})
+                )
+                spx_and_sr_outputs.append(spx_index_stack)
     if sr_indices:
         # Compute indexes implemented in sr (spectral-recovery)
         sr_idxs_outputs = []
+        # All tasselled cap components come from one pass over the bands
+        tc_indices = [i for i in sr_indices if i in TC_COMPONENTS]
+        if tc_indices:
+            tc_stack = tasselled_cap(params_dict, tc_indices, tc_sensor)
         for i in sr_indices:
-            sr_idxs_outputs.append(SR_REC_IDXS[i](params_dict=params_dict))
-        sr_index_stack = xr.concat(sr_idxs_outputs, dim="band")
-        spx_and_sr_outputs.append(sr_index_stack)
-    print(spx_and_sr_outputs)
+            if i in TC_COMPONENTS:
+                k = tc_indices.index(i)
+                sr_idxs_outputs.append(tc_stack.isel(band=slice(k, k + 1)))
+            else:
+                sr_idxs_outputs.append(SR_REC_IDXS[i](params_dict=params_dict))
+        if as_dataset:
+            index_vars.update(
+                {
+                    i: o.squeeze("band", drop=True)
+                    for i, o in zip(sr_indices, sr_idxs_outputs)
+                }
+            )
+        else:
+            sr_index_stack = xr.concat(sr_idxs_outputs, dim="band")
+            spx_and_sr_outputs.append(sr_index_stack)
+    if as_dataset:
+        return xr.Dataset(
+            {
+                i: index_vars[i].drop_vars("band", errors="ignore")
+                for i in spx_indices + sr_indices
+            }
+        )
     # concatenate spx and sr indexes into one DataArray
     index_stack = xr.concat(spx_and_sr_outputs, dim="band")
     return index_stack
@@ -128,10 +337,9 @@ def _split_indices_by_source(indices: List[str]) -> tuple[List[str], List[str]]:
     """Split a list of indices by their source of computation: spyndex or spectral-recovery"""
     spx_list = []
     sr_list = []
-    spx_indices = list(spx.indices)
-    sr_indices = list(SR_REC_IDXS.keys())
+    spx_indices = catalogue().indices
     for i in indices:
-        if i in sr_indices:
+        if i in SR_REC_IDXS:
             sr_list.append(i)
         elif i in spx_indices:
             spx_list.append(i)
@@ -153,11 +361,12 @@ def _supported_domain(indices: list[str]):
     ValueError
         If any index has an unsupported application domain.
     """
+    domains = catalogue().domains
     for i in indices:
-        if spx.indices[i].application_domain not in SUPPORTED_DOMAINS:
+        if domains[i] not in SUPPORTED_DOMAINS:
             raise ValueError(
                 "only application domain 'vegetation' and 'burn' are supported (index"
-                f" {i} has application domain '{spx.indices[i].application_domain}')"
+                f" {i} has application domain '{domains[i]}')"
             ) from None
     return True
 
@@ -184,18 +393,31 @@ def _build_params_dict(image_stack: xr.DataArray):
         Dictionary mapping standard names to slice of image_stack.
 
     """
-    standard_names = list(spx.bands)
+    stack_bands = set(image_stack.band.values)
     params_dict = {}
-    for standard in standard_names:
-        try:
-            band_slice = image_stack.sel(band=standard)
-            params_dict[standard] = band_slice
-        except KeyError:
-            continue
+    for standard in catalogue().bands:
+        if standard in stack_bands:
+            params_dict[standard] = image_stack.sel(band=standard)
 
     return params_dict
 
 
+def _with_precision(params_dict: Dict, precision: str) -> Dict:
+    """Cast the bands and numeric constants of params_dict to precision"""
+    if precision is None:
+        return params_dict
+    dtype = np.dtype(precision)
+    cast = {}
+    for name, value in params_dict.items():
+        if isinstance(value, xr.DataArray):
+            cast[name] = value if value.dtype == dtype else value.astype(dtype)
+        elif isinstance(value, (int, float, np.number)):
+            cast[name] = dtype.type(value)
+        else:
+            cast[name] = value
+    return cast
+
+
 def _build_constants_dict(indices: List, constants: Dict) -> Dict:
     """Build dict of constants and values for the requested indices.
 
@@ -226,7 +448,7 @@ def _build_constants_dict(indices: List, constants: Dict) -> Dict:
     given_constants = list(constants_dict.keys())
     for i in indices:
         try:
-            default_constants = INDEX_CONSTANT_DEFAULTS[i]
+            default_constants = catalogue().constant_defaults[i]
         except KeyError:
             continue
         for c, v in default_constants["defaults"].items():
@@ -4,9 +4,12 @@ Handles reading timeseries of TIFs into a single DataArray, ensures
 band names and attributes are consistent. Also handles writing.
 """
 
+import functools
+import os
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Iterable
 
+import rasterio
 import rioxarray
 
 import pandas as pd
@@ -14,17 +17,35 @@ import numpy as np
 import xarray as xr
 
 from spectral_recovery._utils import bands_pretty_table, common_and_long_to_short
-from spectral_recovery._config import SUPPORTED_INDICES
 from rasterio._err import CPLE_AppDefinedError
 
+from spectral_recovery._catalogue import catalogue
 from spectral_recovery._config import (
     VALID_YEAR,
     REQ_DIMS,
-    STANDARD_BANDS,
 )
 
-COMMON_LONG_SHORT_DICT = common_and_long_to_short(STANDARD_BANDS)
-BANDS_TABLE = bands_pretty_table()
+# Flags the years written to a Zarr store of indices
+_YEAR_COMPLETE = "year_complete"
+
+
+@functools.cache
+def _common_long_short() -> Dict[str, str]:
+    return common_and_long_to_short(catalogue().bands)
+
+
+@functools.cache
+def _bands_table():
+    return bands_pretty_table()
+
+
+def __getattr__(name):
+    # Built on first use
+    if name == "COMMON_LONG_SHORT_DICT":
+        return _common_long_short()
+    if name == "BANDS_TABLE":
+        return _bands_table()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def read_timeseries(
@@ -32,6 +53,7 @@ def read_timeseries(
     band_names: Dict[int, str] = None,
     path_to_mask: str = None,
     array_type: str = "dask",
+    years: Iterable[int] | Dict[int, Iterable[int]] = None,
 ):
     """Reads and stacks a list of tifs into a 4D DataArray.
 
@@ -49,6 +71,11 @@ def read_timeseries(
         NumPy arrays will be loaded into memory while Dask arrays will be
         lazily evaluated until being explicitly loaded into memory with a
         .compute() call. Default is "numpy".
+    years : iterable of int or dict, optional
+        Years to read. TIFs for all other years are skipped. Either an
+        iterable of years or the per-site dict returned by
+        `spectral_recovery.metrics.required_years`, in which case the
+        union of the site years is read. Default reads all years.
 
     Returns
     -------
@@ -63,18 +90,22 @@ def read_timeseries(
     Files must be named in the format 'YYYY.tif' where 'YYYY' is a valid year.
 
     """
+    if isinstance(years, dict):
+        years = set().union(*years.values())
+    if years is not None:
+        years = {int(year) for year in years}
     image_dict = {}
     if isinstance(path_to_tifs, str):
         directory_of_tifs = _get_tifs_from_dir(path_to_tifs)
         for file in directory_of_tifs:
             filename_year = Path(file).stem
-            if _valid_year_str(filename_year):
+            if _valid_year_str(filename_year) and _requested(filename_year, years):
                 image_dict[pd.to_datetime(filename_year)] = _read_from_path(
                     file=file, array_type=array_type
                 )
     elif isinstance(path_to_tifs, dict):
         for key_year, file in path_to_tifs.items():
-            if _valid_year_str(str(key_year)):
+            if _valid_year_str(str(key_year)) and _requested(key_year, years):
                 image_dict[pd.to_datetime(str(key_year))] = _read_from_path(
                     file=file, array_type=array_type
                 )
@@ -83,6 +114,9 @@ def read_timeseries(
             f"Invalid path input. path_to_tifs can be a str path to a directory of TIFs or a dictionary mapping str years to str paths of individual TIF files. Recieved {type(path_to_tifs)}"
         )
 
+    if not image_dict and years is not None:
+        raise ValueError(f"No TIFs found for the requested years {sorted(years)}.")
+
     # Stack images along the time dimension
     stacked_data = xr.concat(
         image_dict.values(), dim=pd.Index(image_dict.keys(), name="time")
@@ -115,6 +149,11 @@ def _valid_year_str(str_year):
     return True
 
 
+def _requested(year, years):
+    """Check if year is one of the requested years (all if None)"""
+    return years is None or int(year) in years
+
+
 def _read_from_path(file, array_type):
     """Read TIF file into Xarray DataArray"""
     if array_type == "numpy":
@@ -139,6 +178,9 @@ def _names_from_desc(raster_data: xr.DataArray, band_nums: List) -> Dict[int, st
     """
     try:
         long_names = raster_data.attrs["long_name"]
+        # rioxarray gives the description of a single band as a str
+        if isinstance(long_names, str):
+            long_names = [long_names]
         band_names = dict(zip(band_nums, long_names))
     except KeyError:
         raise ValueError(
@@ -220,18 +262,19 @@ def _to_standard_band_names(in_names: List[str]) -> Tuple[List[str], List[str]]:
 
 
     """
+    common_long_short = _common_long_short()
     standard_names = []
     attr_names = []
     for given_name in in_names:
         converted = False
-        if given_name in COMMON_LONG_SHORT_DICT.keys():
+        if given_name in common_long_short.keys():
             converted = True
-            standard_names.append(COMMON_LONG_SHORT_DICT[given_name])
+            standard_names.append(common_long_short[given_name])
             attr_names.append(given_name)
-        elif given_name in STANDARD_BANDS:
+        elif given_name in catalogue().band_set:
             converted = True
             standard_names.append(given_name)
-        elif given_name in SUPPORTED_INDICES:
+        elif given_name in catalogue().supported_indices:
             converted = True
             standard_names.append(given_name)
 
@@ -251,4 +294,142 @@ def _mask_stack(stack: xr.DataArray, mask: xr.DataArray, fill=np.nan) -> xr.Data
             f"Only 2D masks are supported. {len(mask.dims)}D mask provided."
         )
     masked_stack = stack.where(mask, fill)
-    return masked_stack
\ No newline at end of file
+    return masked_stack
+
+
+def write_indices_zarr(index_ds: xr.Dataset, out: str, fingerprint: str) -> xr.Dataset:
+    """Write indices to a Zarr store one year at a time, resuming if possible.
+
+    Each year is written as a region of the store, so only the chunks of
+    one year are computed (and compressed in parallel by dask) at a
+    time. A "year_complete" flag is set after each year's region is
+    written. If out already holds indices with the same fingerprint,
+    the years already complete are skipped.
+
+    Parameters
+    ----------
+    index_ds : xr.Dataset
+        The indices, one (time, y, x) variable per index.
+    out : str
+        Path to the Zarr store.
+    fingerprint : str
+        Identifies the stack and parameters the indices were computed
+        from. A store with a different fingerprint is overwritten.
+
+    Returns
+    -------
+    xr.Dataset
+        The indices lazily read from the store.
+
+    """
+    index_ds = index_ds.chunk({"time": 1, "y": "auto", "x": "auto"})
+    complete = _zarr_complete_years(out, fingerprint, index_ds.time)
+    if complete is None:
+        # Writes the coordinates and flags, but none of the indices
+        complete = np.zeros(index_ds.sizes["time"], dtype=bool)
+        index_ds.assign({_YEAR_COMPLETE: ("time", complete)}).assign_attrs(
+            fingerprint=fingerprint
+        ).to_zarr(out, mode="w", compute=False, consolidated=False)
+    # Variables without a time dimension (e.g y, x) are already written
+    region_ds = index_ds.drop_vars(
+        [v for v in index_ds.variables if "time" not in index_ds[v].dims]
+    )
+    for k in np.flatnonzero(~complete):
+        region = {"time": slice(k, k + 1)}
+        region_ds.isel(region).to_zarr(out, region=region, consolidated=False)
+        _set_complete(out, region["time"])
+    store = xr.open_zarr(out, decode_coords="all", consolidated=False)
+    return store[list(index_ds.data_vars)]
+
+
+def write_indices_cogs(index_ds: xr.Dataset, out: str, fingerprint: str) -> xr.Dataset:
+    """Write indices to one Cloud Optimized GeoTIFF per index and year.
+
+    Files are written to out/INDEX/YYYY.tif, so each index can be read
+    back with `read_timeseries`. One year of the indices is computed at
+    a time and each file is compressed by GDAL using all CPUs. Files
+    are written under a temporary name and renamed into place, so a
+    file that exists is complete. Files tagged with the same
+    fingerprint are kept, so an interrupted write resumes where it
+    stopped.
+
+    Parameters
+    ----------
+    index_ds : xr.Dataset
+        The indices, one (time, y, x) variable per index.
+    out : str
+        Path to the output directory.
+    fingerprint : str
+        Identifies the stack and parameters the indices were computed
+        from. Files with a different fingerprint are overwritten.
+
+    Returns
+    -------
+    xr.Dataset
+        The indices lazily read from the files.
+
+    """
+    years = pd.DatetimeIndex(index_ds.time.values).year
+    paths = {
+        index: {year: Path(out, str(index), f"{year}.tif") for year in years}
+        for index in index_ds.data_vars
+    }
+    for k, year in enumerate(years):
+        pending = [
+            index
+            for index in index_ds.data_vars
+            if not _cog_complete(paths[index][year], fingerprint)
+        ]
+        if not pending:
+            continue
+        year_ds = index_ds[pending].isel(time=k, drop=True).compute()
+        for index in pending:
+            path = paths[index][year]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.tmp")
+            # The band description names the index for read_timeseries
+            year_ds[index].assign_attrs(long_name=(str(index),)).rio.to_raster(
+                tmp,
+                driver="COG",
+                compress="DEFLATE",
+                num_threads="ALL_CPUS",
+                tags={"fingerprint": fingerprint},
+            )
+            os.replace(tmp, path)
+    return xr.Dataset(
+        {
+            index: read_timeseries(
+                {year: str(path) for year, path in index_paths.items()}
+            ).sel(band=index, drop=True)
+            for index, index_paths in paths.items()
+        }
+    )
+
+
+def _zarr_complete_years(out: str, fingerprint: str, time: xr.DataArray):
+    """Years already written to a store, or None if it must be rewritten"""
+    try:
+        store = xr.open_zarr(out, consolidated=False)
+    except FileNotFoundError:
+        return None
+    if (
+        store.attrs.get("fingerprint") != fingerprint
+        or _YEAR_COMPLETE not in store
+        or not np.array_equal(store.time.values, time.values)
+    ):
+        return None
+    return store[_YEAR_COMPLETE].values.astype(bool)
+
+
+def _set_complete(out: str, years: slice) -> None:
+    n_years = years.stop - years.start
+    xr.Dataset({_YEAR_COMPLETE: ("time", np.ones(n_years, dtype=bool))}).to_zarr(
+        out, region={"time": years}, consolidated=False
+    )
+
+
+def _cog_complete(path: Path, fingerprint: str) -> bool:
+    if not path.exists():
+        return False
+    with rasterio.open(path) as src:
+        return src.tags().get("fingerprint") == fingerprint
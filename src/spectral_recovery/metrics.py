@@ -1,16 +1,28 @@
 """Methods for computing recovery metrics."""
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import xarray as xr
 import numpy as np
 import pandas as pd
 import geopandas as gpd
+import dask.array as da
+import shapely
 
-from spectral_recovery._utils import maintain_rio_attrs
+from affine import Affine
+from rasterio import features
+
+from spectral_recovery._utils import maintain_rio_attrs, dataset_per_index
 
 NEG_TIMESTEP_MSG = "timestep cannot be negative."
 VALID_PERC_MSP = "percent must be between 0 and 100."
+VALID_SCALES = ["pixel", "polygon"]
+# Metrics that require a recovery target
+TARGET_METRICS = ["y2r", "r80p"]
+# Dimensions added to metric outputs when params are given as sequences
+PARAM_DIMS = {"timestep": "timestep", "percent_of_target": "percent"}
+# Dimension of metric trajectories, i.e when timestep="all"
+TRAJECTORY_DIM = "years_since_restoration"
 METRIC_FUNCS = {}
 
 
@@ -20,6 +32,7 @@ def register_metric(f):
     return f
 
 
+@dataset_per_index
 @maintain_rio_attrs
 def compute_metrics(
     timeseries_data: xr.DataArray,
@@ -28,58 +41,808 @@ def compute_metrics(
     recovery_target: xr.DataArray = None,
     timestep: int = 5,
     percent_of_target: int = 80,
+    scale: str = "pixel",
+    group_sites: bool = False,
+    out: str = None,
 ):
-    """
-    TODO: Add docstring.
+    """Compute recovery metrics for each restoration site.
+
+    Parameters
+    ----------
+    timeseries_data : xr.DataArray or xr.Dataset
+        The timeseries of indices to compute metrics over. Must
+        contain band, time, y, and x dimensions. A Dataset with one
+        (time, y, x) variable per index, e.g from `compute_indices(...,
+        as_dataset=True)`, is processed one index at a time.
+    restoration_polygons : gpd.GeoDataFrame
+        The restoration sites with "dist_start" and "rest_start"
+        attributes.
+    metrics : list of str
+        The recovery metrics to compute, e.g ["dNBR", "YrYr"].
+    recovery_target : xr.DataArray or dict, optional
+        The recovery target(s). Either a single DataArray used for all
+        sites or a dict mapping each site's index to a DataArray.
+        Required by Y2R and R80P.
+    timestep : int, sequence of int, or "all"
+        Timestep (years after restoration start) used by dNBR, YrYr,
+        R80P and RRI. Default is 5. If a sequence is given, metrics
+        are evaluated for every timestep in one pass and results gain
+        a "timestep" dimension. If "all", metric trajectories are
+        computed for every available post-restoration year and results
+        gain a "years_since_restoration" dimension.
+    percent_of_target : int or sequence of int
+        Percent of the recovery target used by Y2R and R80P. Default
+        is 80. If a sequence is given, results gain a "percent" dimension.
+    scale : {"pixel", "polygon"}
+        The scale to compute metrics at. 'pixel' computes metrics for
+        every pixel in a site. 'polygon' first reduces each site to
+        its per-band median trajectory (median over y and x for every
+        year) and computes metrics on that trajectory, resulting in one
+        value per-band per-site. Default is 'pixel'.
+    group_sites : bool
+        If True and scale='pixel', sites sharing the same "dist_start"
+        and "rest_start" years are computed together: metrics are
+        evaluated once over the union of the group's polygons and then
+        clipped to each site. Per-site (dict) recovery targets cannot
+        be shared, so Y2R and R80P are still computed per-site when
+        recovery_target is a dict. Default is False.
+    out : str, optional
+        Path to a Zarr store. If given, metrics are computed out-of-core:
+        site dates are rasterized per spatial chunk and metrics are
+        evaluated chunk-by-chunk (full time axis per chunk) and written
+        straight to the store, so peak memory is bounded by the chunk
+        size rather than the scene size. The result is one wall-to-wall
+        DataArray rather than per-site results, so each pixel holds the
+        dates of one site and sites must not overlap. Only scale="pixel"
+        and a single (non-dict) recovery_target are supported. See
+        `compute_pixel_metrics`.
+
+    Returns
+    -------
+    metric_ds : xr.Dataset or xr.DataArray
+        Dataset with one variable per restoration site, keyed by the
+        row indexes of restoration_polygons. Each variable has a
+        "metric" dimension and, if scale="pixel", "y" and "x" dimensions.
+        Metrics that do not depend on a swept parameter are broadcast
+        along its dimension. If `out` is given, a lazy wall-to-wall
+        DataArray read from the store is returned instead.
+
+    Raises
+    ------
+    ValueError
+        If `out` is given and restoration sites overlap.
 
     """
+    if scale not in VALID_SCALES:
+        raise ValueError(f"scale must be 'polygon' or 'pixel' ('{scale}' provided)")
+    if out is not None:
+        if scale != "pixel" or isinstance(recovery_target, dict):
+            raise ValueError(
+                "out requires scale='pixel' and a single (non-dict) recovery_target."
+            )
+        overlapping = _overlapping_sites(restoration_polygons)
+        if overlapping:
+            raise ValueError(
+                "out requires non-overlapping sites, since each pixel holds the"
+                f" dates of one site (overlapping sites: {overlapping})."
+            )
+        disturbance_start, restoration_start = _rasterize_dates(
+            restoration_polygons, timeseries_data
+        )
+        return compute_pixel_metrics(
+            timeseries_data=timeseries_data,
+            disturbance_start=disturbance_start,
+            restoration_start=restoration_start,
+            metrics=metrics,
+            recovery_target=recovery_target,
+            timestep=timestep,
+            percent_of_target=percent_of_target,
+            out=out,
+        )
     if recovery_target is None:
-        for tmetric in ["Y2R", "R80P"]:
-            if tmetric in metrics:
+        for tmetric in metrics:
+            if tmetric.lower() in TARGET_METRICS:
                 raise ValueError(
                     f"{tmetric} requires a recovery target but recovery_target is None"
                 )
+    for m in metrics:
+        if m.lower() not in METRIC_FUNCS:
+            raise ValueError(f"{m} is not a valid metric choice!")
+
+    params = {
+        "timestep": timestep,
+        "percent_of_target": percent_of_target,
+    }
+    # Clips keep the time axis, so every site and metric shares one index
+    year_index = _year_index(timeseries_data)
+    grouped_metrics = {}
+    if group_sites and scale == "pixel":
+        grouped_metrics = _metrics_by_date_group(
+            timeseries_data=timeseries_data,
+            restoration_polygons=restoration_polygons,
+            metrics=metrics,
+            recovery_target=recovery_target,
+            params=params,
+            year_index=year_index,
+        )
 
     per_polygon_metrics = {}
     for index, row in restoration_polygons.iterrows():
-        # Prepare arguments being passed to the metric functions
-        clipped_ts = timeseries_data.rio.clip([row.geometry])
-        m_kwargs = dict(
-            disturbance_start=row["dist_start"],
-            restoration_start=row["rest_start"],
-            timeseries_data=clipped_ts,
-            params={
-                "timestep": timestep,
-                "percent_of_target": percent_of_target,
-            },
+        site_results = grouped_metrics.get(index, {})
+        site_metrics = [m for m in metrics if m not in site_results]
+        if site_metrics:
+            # Prepare arguments being passed to the metric functions
+            clipped_ts = timeseries_data.rio.clip([row.geometry])
+            if isinstance(recovery_target, dict):
+                site_target = recovery_target[index]
+            else:
+                # if a DataArray or None, just pass as-is
+                site_target = recovery_target
+            if scale == "polygon":
+                clipped_ts = _site_trajectory(clipped_ts)
+                if site_target is not None and {"y", "x"} <= set(site_target.dims):
+                    site_target = _site_trajectory(site_target.rio.clip([row.geometry]))
+            m_kwargs = dict(
+                disturbance_start=row["dist_start"],
+                restoration_start=row["rest_start"],
+                timeseries_data=clipped_ts,
+                params=params,
+                recovery_target=site_target,
+                year_index=year_index,
+            )
+            site_results = site_results | _run_metrics(site_metrics, m_kwargs)
+        per_polygon_metrics[index] = _stack_metrics([site_results[m] for m in metrics])
+    # Sites differ in extent (and trajectory length), so pad to the union
+    metric_da = xr.concat(
+        per_polygon_metrics.values(),
+        pd.Index(per_polygon_metrics.keys(), name="site"),
+        join="outer",
+    )
+    metric_da = metric_da.transpose(
+        "site",
+        "metric",
+        TRAJECTORY_DIM,
+        *PARAM_DIMS.values(),
+        ...,
+        missing_dims="ignore",
+    )
+    metric_ds = metric_da.to_dataset(dim="site")
+    return metric_ds
+
+
+@dataset_per_index
+@maintain_rio_attrs
+def compute_pixel_metrics(
+    timeseries_data: xr.DataArray,
+    disturbance_start: xr.DataArray,
+    restoration_start: xr.DataArray,
+    metrics: List[str],
+    recovery_target: xr.DataArray = None,
+    timestep: int = 5,
+    percent_of_target: int = 80,
+    out: str = None,
+) -> xr.DataArray:
+    """Compute wall-to-wall recovery metrics from per-pixel date rasters.
+
+    Rather than attaching dates to restoration polygons, each pixel has
+    its own disturbance and restoration start year, e.g from a
+    change-detection product. Metrics are computed for every pixel
+    without a polygon loop: observations are gathered along time at
+    each pixel's year, chunk-by-chunk for dask-backed inputs.
+
+    Parameters
+    ----------
+    timeseries_data : xr.DataArray or xr.Dataset
+        The timeseries of indices to compute metrics over. Must
+        contain band, time, y, and x dimensions. A Dataset with one
+        (time, y, x) variable per index, e.g from `compute_indices(...,
+        as_dataset=True)`, is processed one index at a time.
+    disturbance_start : xr.DataArray
+        Raster of disturbance start years. Must have the same y and x
+        coordinates (and CRS) as timeseries_data. A "band" dimension of
+        size 1, as read by rioxarray, is dropped.
+    restoration_start : xr.DataArray
+        Raster of restoration start years, aligned like disturbance_start.
+    metrics : list of str
+        The recovery metrics to compute, e.g ["dNBR", "YrYr"].
+    recovery_target : xr.DataArray, optional
+        The recovery target. Required by Y2R and R80P.
+    timestep : int, sequence of int, or "all"
+        See `compute_metrics`.
+    percent_of_target : int or sequence of int
+        See `compute_metrics`.
+    out : str, optional
+        Path to a Zarr store. If given, metrics are computed chunk-wise
+        with `xarray.map_blocks` over the spatial chunks of
+        timeseries_data (rechunked to span the full time axis; NumPy
+        inputs are chunked automatically) and written straight to the
+        store. Peak memory is bounded by the chunk size. Requires zarr.
+
+    Returns
+    -------
+    metric_da : xr.DataArray
+        DataArray with a "metric" dimension and the band, y and x
+        dimensions of timeseries_data. Pixels whose years are NaN or
+        outside the timeseries are NaN. If `out` is given, the
+        DataArray is lazily read from the store.
+
+    """
+    for m in metrics:
+        if m.lower() not in METRIC_FUNCS:
+            raise ValueError(f"{m} is not a valid metric choice!")
+        if recovery_target is None and m.lower() in TARGET_METRICS:
+            raise ValueError(
+                f"{m} requires a recovery target but recovery_target is None"
+            )
+    disturbance_start = _as_date_raster(
+        disturbance_start, timeseries_data, "disturbance_start"
+    )
+    restoration_start = _as_date_raster(
+        restoration_start, timeseries_data, "restoration_start"
+    )
+    params = {
+        "timestep": timestep,
+        "percent_of_target": percent_of_target,
+    }
+    year_index = _year_index(timeseries_data)
+    if out is not None:
+        metric_da = _blockwise_pixel_metrics(
+            timeseries_data=timeseries_data,
+            disturbance_start=disturbance_start,
+            restoration_start=restoration_start,
+            metrics=metrics,
+            recovery_target=recovery_target,
+            params=params,
+            year_index=year_index,
         )
-        if isinstance(recovery_target, dict):
-            m_kwargs["recovery_target"] = recovery_target[index]
+        metric_da.to_dataset(name="metrics").to_zarr(out, mode="w")
+        return xr.open_zarr(out)["metrics"]
+
+    return _pixel_metrics(
+        timeseries_data=timeseries_data,
+        disturbance_start=disturbance_start,
+        restoration_start=restoration_start,
+        metrics=metrics,
+        recovery_target=recovery_target,
+        params=params,
+        year_index=year_index,
+    )
+
+
+def required_years(
+    restoration_polygons: gpd.GeoDataFrame,
+    metrics: List[str],
+    timestep: int | List[int] | str = 5,
+    reference_years: Dict[int, Tuple[int, int]] | Tuple[int, int] = None,
+    end_year: int = None,
+) -> Dict[int, List[int]]:
+    """Plan the years each restoration site needs for metrics and targets.
+
+    The result can be passed to `read_timeseries(years=...)` so that only
+    the TIFs of those years are read.
+
+    Parameters
+    ----------
+    restoration_polygons : gpd.GeoDataFrame
+        The restoration sites, with "dist_start" and "rest_start" columns.
+    metrics : list of str
+        The metrics that will be computed.
+    timestep : int, list of int, "all" or None
+        The timestep(s) that will be passed to `compute_metrics`. None
+        plans for R80P on the most recent year. Default is 5.
+    reference_years : dict or tuple of int, optional
+        Reference windows of the recovery targets. Either a (start, end)
+        tuple shared by all sites (e.g for reference site targets) or a
+        dict mapping site indexes to (start, end) tuples (e.g for
+        historic targets).
+    end_year : int, optional
+        The last year of the timeseries. Required for metrics that read
+        up to the most recent year, i.e Y2R, timestep="all" and
+        timestep=None.
+
+    Returns
+    -------
+    site_years : dict
+        Sorted list of required years keyed by the row indexes of
+        restoration_polygons.
+
+    """
+    for m in metrics:
+        if m.lower() not in METRIC_FUNCS:
+            raise ValueError(f"{m} is not a valid metric choice!")
+    open_ended = (
+        timestep is None
+        or isinstance(timestep, str)
+        or "y2r" in [m.lower() for m in metrics]
+    )
+    if open_ended and end_year is None:
+        raise ValueError(
+            "end_year is required to plan Y2R, timestep='all' or timestep=None."
+        )
+
+    site_years = {}
+    for index, row in restoration_polygons.iterrows():
+        dist_start = int(row["dist_start"])
+        rest_start = int(row["rest_start"])
+        if timestep is None:
+            post_years = [end_year]
+        elif isinstance(timestep, str):
+            post_years = list(range(rest_start + 1, end_year + 1))
         else:
-            # if a DataArray or None, just pass as-is
-            m_kwargs["recovery_target"] = recovery_target
+            post_years = [rest_start + t for t in np.atleast_1d(timestep)]
 
-        m_results = []
+        years = set()
         for m in metrics:
-            try:
-                m_func = METRIC_FUNCS[m.lower()]
-            except KeyError:
-                raise ValueError(f"{m} is not a valid metric choice!")
-            m_results.append(m_func(**m_kwargs).assign_coords({"metric": m}))
-        per_polygon_metrics[index] = xr.concat(m_results, "metric")
-    metric_da = xr.concat(
-        per_polygon_metrics.values(), pd.Index(per_polygon_metrics.keys(), name="site")
+            m = m.lower()
+            if m in ("dnbr", "yryr"):
+                years.update([rest_start, *post_years])
+            elif m == "rri":
+                years.update([dist_start, rest_start, *post_years])
+                years.update(year - 1 for year in post_years)
+            elif m == "r80p":
+                years.update(post_years)
+            elif m == "y2r":
+                years.update(range(rest_start, end_year + 1))
+
+        if isinstance(reference_years, dict):
+            ref_start, ref_end = reference_years[index]
+            years.update(range(int(ref_start), int(ref_end) + 1))
+        elif reference_years is not None:
+            ref_start, ref_end = reference_years
+            years.update(range(int(ref_start), int(ref_end) + 1))
+        site_years[index] = sorted(int(year) for year in years)
+
+    return site_years
+
+
+def _pixel_metrics(
+    timeseries_data: xr.DataArray,
+    disturbance_start: xr.DataArray,
+    restoration_start: xr.DataArray,
+    metrics: List[str],
+    recovery_target: xr.DataArray,
+    params: Dict,
+    year_index: pd.Index = None,
+) -> xr.DataArray:
+    """Evaluate metrics for per-pixel dates, stacked along "metric"."""
+    m_kwargs = dict(
+        disturbance_start=disturbance_start,
+        restoration_start=restoration_start,
+        timeseries_data=timeseries_data,
+        params=params,
+        recovery_target=recovery_target,
+        year_index=year_index,
     )
-    metric_ds = metric_da.to_dataset(dim="site")
-    return metric_ds
+    metric_da = _stack_metrics(_run_metrics(metrics, m_kwargs).values())
+    return metric_da.transpose(
+        "metric",
+        TRAJECTORY_DIM,
+        *PARAM_DIMS.values(),
+        ...,
+        missing_dims="ignore",
+    )
+
+
+def _blockwise_pixel_metrics(
+    timeseries_data: xr.DataArray,
+    disturbance_start: xr.DataArray,
+    restoration_start: xr.DataArray,
+    metrics: List[str],
+    recovery_target: xr.DataArray,
+    params: Dict,
+    year_index: pd.Index = None,
+) -> xr.DataArray:
+    """Lazily evaluate per-pixel metrics with one task per spatial chunk.
+
+    Each block holds the full time axis of a spatial chunk, so metrics
+    are evaluated with the in-memory engine on one chunk at a time. The
+    output template is derived by evaluating the metrics on a single
+    pixel with the earliest dates, which also fixes the coordinates of
+    a "years_since_restoration" trajectory shared by all blocks.
+    """
+    if timeseries_data.chunks is None:
+        timeseries_data = timeseries_data.chunk()
+    timeseries_data = timeseries_data.satts.rechunk_time()
+    spatial_chunks = {
+        "y": timeseries_data.chunksizes["y"],
+        "x": timeseries_data.chunksizes["x"],
+    }
+    block_args = [
+        disturbance_start.chunk(spatial_chunks),
+        restoration_start.chunk(spatial_chunks),
+    ]
+    block_kwargs = dict(metrics=metrics, params=params, year_index=year_index)
+    sample_target = recovery_target
+    if recovery_target is not None and {"y", "x"} <= set(recovery_target.dims):
+        block_args.append(recovery_target.chunk(spatial_chunks))
+        sample_target = recovery_target.isel(y=[0], x=[0])
+    else:
+        block_kwargs["recovery_target"] = recovery_target
+
+    sample_dates = [
+        xr.full_like(dates.isel(y=[0], x=[0]), float(dates.min(skipna=True)))
+        for dates in (disturbance_start, restoration_start)
+    ]
+    sample = _pixel_metrics(
+        timeseries_data=timeseries_data.isel(y=[0], x=[0]).compute(),
+        disturbance_start=sample_dates[0].compute(),
+        restoration_start=sample_dates[1].compute(),
+        metrics=metrics,
+        recovery_target=sample_target,
+        params=params,
+        year_index=year_index,
+    )
+    sizes = dict(sample.sizes) | {
+        "y": timeseries_data.sizes["y"],
+        "x": timeseries_data.sizes["x"],
+    }
+    chunks = [spatial_chunks.get(d, -1) for d in sample.dims]
+    template = xr.DataArray(
+        da.full([sizes[d] for d in sample.dims], np.nan, chunks=chunks),
+        dims=sample.dims,
+        coords={d: sample[d].values for d in sample.indexes if d not in ("y", "x")}
+        | {"y": timeseries_data["y"].values, "x": timeseries_data["x"].values},
+    )
+    block_kwargs["template"] = template.isel(y=[0], x=[0]).compute()
+    metric_da = xr.map_blocks(
+        _metrics_block,
+        timeseries_data.drop_vars(
+            [c for c in timeseries_data.coords if c not in timeseries_data.dims]
+        ),
+        args=block_args,
+        kwargs=block_kwargs,
+        template=template,
+    )
+    return metric_da.rio.write_crs(timeseries_data.rio.crs)
+
+
+def _metrics_block(
+    timeseries_data: xr.DataArray,
+    disturbance_start: xr.DataArray,
+    restoration_start: xr.DataArray,
+    recovery_target: xr.DataArray = None,
+    metrics: List[str] = None,
+    params: Dict = None,
+    template: xr.DataArray = None,
+    year_index: pd.Index = None,
+) -> xr.DataArray:
+    """Evaluate per-pixel metrics on one in-memory spatial block.
+
+    `template` is a single-pixel block of the output; the result is
+    conformed to its dims and (non-spatial) coordinates.
+    """
+    block_template = template.reindex(
+        y=timeseries_data["y"].values, x=timeseries_data["x"].values
+    )
+    if restoration_start.isnull().all():
+        return block_template
+    metric_v = _pixel_metrics(
+        timeseries_data=timeseries_data,
+        disturbance_start=disturbance_start,
+        restoration_start=restoration_start,
+        metrics=metrics,
+        recovery_target=recovery_target,
+        params=params,
+        year_index=year_index,
+    )
+    metric_v = metric_v.drop_vars(
+        [c for c in metric_v.coords if c not in metric_v.dims]
+    )
+    return metric_v.reindex_like(block_template).astype(np.float64)
+
+
+def _rasterize_dates(
+    restoration_polygons: gpd.GeoDataFrame, timeseries_data: xr.DataArray
+) -> Tuple[xr.DataArray, xr.DataArray]:
+    """Lazily rasterize site dates onto the spatial grid of timeseries_data.
+
+    Rasterization happens per spatial chunk so the full-scene date
+    rasters are never held in memory. Sites must not overlap, see
+    `_overlapping_sites`.
+    """
+    if timeseries_data.chunks is None:
+        timeseries_data = timeseries_data.chunk({"y": "auto", "x": "auto"})
+    grid = timeseries_data.isel(band=0, time=0, drop=True)
+    grid = grid.drop_vars([c for c in grid.coords if c not in ("y", "x")])
+    template = grid.astype(np.float64)
+    transform = timeseries_data.rio.transform()
+    date_rasters = []
+    for date_col in ["dist_start", "rest_start"]:
+        shapes = list(
+            zip(
+                restoration_polygons.geometry.values,
+                restoration_polygons[date_col].astype(np.float64),
+            )
+        )
+        date_rasters.append(
+            xr.map_blocks(
+                _rasterize_block,
+                template,
+                kwargs={"shapes": shapes, "resolution": (transform.a, transform.e)},
+                template=template,
+            ).rio.write_crs(timeseries_data.rio.crs)
+        )
+    return tuple(date_rasters)
+
+
+def _overlapping_sites(restoration_polygons: gpd.GeoDataFrame) -> List[Tuple]:
+    """Pairs of site indexes whose polygons overlap (share area)."""
+    geometries = np.asarray(restoration_polygons.geometry.values)
+    left, right = restoration_polygons.sindex.query(geometries, predicate="intersects")
+    pairs = left < right
+    left, right = left[pairs], right[pairs]
+    # Sites that only share an edge or a corner do not overlap
+    shared = shapely.area(shapely.intersection(geometries[left], geometries[right]))
+    index = restoration_polygons.index
+    return list(
+        zip(index[left[shared > 0]].tolist(), index[right[shared > 0]].tolist())
+    )
+
+
+def _rasterize_block(
+    block: xr.DataArray, shapes: List, resolution: Tuple[float, float]
+) -> xr.DataArray:
+    """Burn (geometry, value) shapes into one block of the grid."""
+    res_x, res_y = resolution
+    # Coordinates are pixel centres, the transform origin is a corner
+    transform = Affine.translation(
+        block["x"].values[0] - res_x / 2, block["y"].values[0] - res_y / 2
+    ) * Affine.scale(res_x, res_y)
+    burned = features.rasterize(
+        shapes,
+        out_shape=(block.sizes["y"], block.sizes["x"]),
+        transform=transform,
+        fill=np.nan,
+        dtype=np.float64,
+    )
+    return block.copy(data=burned)
+
+
+def _as_date_raster(
+    dates: xr.DataArray, timeseries_data: xr.DataArray, name: str
+) -> xr.DataArray:
+    """Check a date raster is 2D and aligned with timeseries_data."""
+    if "band" in dates.dims and dates.sizes["band"] == 1:
+        dates = dates.squeeze("band", drop=True)
+    if set(dates.dims) != {"y", "x"}:
+        raise ValueError(
+            f"{name} must be a 2D raster with y and x dimensions (has {dates.dims})."
+        )
+    for dim in ["y", "x"]:
+        if not np.array_equal(dates[dim].values, timeseries_data[dim].values):
+            raise ValueError(
+                f"{name} is not aligned with timeseries_data ({dim} coordinates differ)."
+            )
+    return dates.astype(np.float64)
+
+
+def _run_metrics(metrics: List[str], m_kwargs: Dict) -> Dict[str, xr.DataArray]:
+    """Evaluate each metric with the same kwargs, keyed by metric name."""
+    m_results = {}
+    for m in metrics:
+        m_func = METRIC_FUNCS[m.lower()]
+        m_results[m] = m_func(**m_kwargs).assign_coords({"metric": m})
+    return m_results
+
+
+def _stack_metrics(m_results: List[xr.DataArray]) -> xr.DataArray:
+    """Stack metric results along "metric".
+
+    Metrics that do not depend on a swept parameter (or trajectory) are
+    broadcast along its dimension, and trajectories of different lengths
+    (e.g RRI starts a year later) are padded with NaN.
+    """
+    return xr.concat(list(m_results), "metric", join="outer", coords="minimal")
+
+
+def _metrics_by_date_group(
+    timeseries_data: xr.DataArray,
+    restoration_polygons: gpd.GeoDataFrame,
+    metrics: List[str],
+    recovery_target: xr.DataArray | dict,
+    params: Dict,
+    year_index: pd.Index = None,
+) -> Dict[int, Dict[str, xr.DataArray]]:
+    """Compute metrics once per group of sites sharing dist/rest years.
+
+    Each group is clipped to the union of its polygons so that time
+    selections are made once per group, then the result is clipped
+    back to each site. Single-site groups and metrics that need a
+    per-site target are left out and computed per-site by the caller.
+
+    Returns
+    -------
+    grouped_metrics : dict
+        Dictionary mapping site index to a dict of metric results.
+
+    """
+    if isinstance(recovery_target, dict):
+        metrics = [m for m in metrics if m.lower() not in TARGET_METRICS]
+        recovery_target = None
+    grouped_metrics = {}
+    if not metrics:
+        return grouped_metrics
+
+    date_groups = restoration_polygons.groupby(["dist_start", "rest_start"], sort=False)
+    for (dist_start, rest_start), sites in date_groups:
+        if len(sites) == 1:
+            continue
+        group_ts = timeseries_data.rio.clip(sites.geometry.values)
+        m_kwargs = dict(
+            disturbance_start=dist_start,
+            restoration_start=rest_start,
+            timeseries_data=group_ts,
+            params=params,
+            recovery_target=recovery_target,
+            year_index=year_index,
+        )
+        group_da = _stack_metrics(_run_metrics(metrics, m_kwargs).values())
+        for index, geometry in sites.geometry.items():
+            site_da = group_da.rio.clip([geometry])
+            grouped_metrics[index] = {m: site_da.sel(metric=m) for m in metrics}
+    return grouped_metrics
+
+
+def _site_trajectory(site_data: xr.DataArray) -> xr.DataArray:
+    """Reduce a clipped site to its per-band median trajectory.
+
+    Uses the same skipna median over y and x as the "median" statistic
+    of `satts.stats`, so a site becomes a (band, time) series for
+    trajectory inputs, or a (band) series for pixel-scale targets.
+
+    """
+    return site_data.median(dim=["y", "x"], skipna=True)
+
+
+def _param_coord(value, name: str) -> Tuple[xr.DataArray, bool]:
+    """Wrap a scalar or sequence parameter as a coordinate DataArray.
+
+    Returns the parameter values along dimension `name` and whether
+    the parameter was given as a scalar.
+    """
+    values = np.atleast_1d(value)
+    param_da = xr.DataArray(values, dims=[name], coords={name: values})
+    return param_da, np.ndim(value) == 0
+
+
+def _timestep_coord(
+    timestep,
+    restoration_start: int,
+    timeseries_data: xr.DataArray,
+    lag: int = 0,
+    year_index: pd.Index = None,
+) -> Tuple[xr.DataArray, bool]:
+    """Wrap the timestep parameter as a coordinate DataArray.
+
+    If timestep is "all", returns every available post-restoration
+    year (as years since restoration) along the "years_since_restoration"
+    dimension. `lag` additionally requires the year `lag` years before
+    each timestep to be available, e.g lag=1 for RRI's t-1/t window.
+    `year_index` is the `_year_index` of timeseries_data, built if None.
+    """
+    if isinstance(timestep, str):
+        if timestep != "all":
+            raise ValueError(
+                f"timestep must be an int, sequence or 'all' ('{timestep}' provided)"
+            )
+        if year_index is None:
+            year_index = _year_index(timeseries_data)
+        years = year_index.values
+        if isinstance(restoration_start, xr.DataArray):
+            # Per-pixel restoration years get every step the time dim
+            # can hold, so the steps do not depend on which pixels are
+            # present. Steps beyond a pixel's timeseries are NaN.
+            steps = np.arange(1, years.max() - years.min() + 1)
+        else:
+            steps = years[years > restoration_start] - restoration_start
+            steps = steps[np.isin(restoration_start + steps - lag, years)]
+        if steps.size == 0:
+            raise ValueError(
+                f"No post-restoration years after {restoration_start} in time dim."
+            )
+        return (
+            xr.DataArray(steps, dims=[TRAJECTORY_DIM], coords={TRAJECTORY_DIM: steps}),
+            False,
+        )
+    return _param_coord(timestep, PARAM_DIMS["timestep"])
+
+
+def _finalize_params(metric_v: xr.DataArray, scalar_params: Dict[str, bool]):
+    """Squeeze out scalar param dims, move swept param dims to the front."""
+    for dim, is_scalar in scalar_params.items():
+        if is_scalar and dim in metric_v.dims:
+            metric_v = metric_v.squeeze(dim, drop=True)
+    swept_dims = [
+        d for d in [TRAJECTORY_DIM, *PARAM_DIMS.values()] if d in metric_v.dims
+    ]
+    return metric_v.transpose(*swept_dims, ...)
+
+
+def _first_year(years: int | xr.DataArray) -> int | None:
+    """Earliest year of a single year or per-pixel raster of years.
+
+    None if the raster has no (non-NaN) years.
+    """
+    if isinstance(years, xr.DataArray):
+        first = years.min(skipna=True)
+        return None if bool(first.isnull()) else int(first)
+    return years
+
+
+def _year_index(timeseries_data: xr.DataArray) -> pd.Index:
+    """Year -> time position lookup of a stack.
+
+    Built once per `compute_metrics` or `compute_pixel_metrics` call and
+    passed to the metrics, since every clip of the stack keeps its time
+    axis.
+    """
+    return pd.Index(timeseries_data.indexes["time"].year)
+
+
+def _sel_years(
+    timeseries_data: xr.DataArray, years: int | xr.DataArray, year_index: pd.Index
+) -> xr.DataArray:
+    """Select the time slice of every year in `years` in one gather.
+
+    `years` can be a single year, a DataArray of years along parameter
+    dimensions (e.g "timestep"), or a per-pixel DataArray of years with
+    y and x dimensions. The result has the dimensions of `years` in
+    place of "time". `year_index` is the `_year_index` of timeseries_data.
+    """
+    if not isinstance(years, xr.DataArray):
+        years = xr.DataArray(years)
+    if {"y", "x"} & set(years.dims):
+        return _gather_pixel_years(timeseries_data, years, year_index)
+    positions = year_index.get_indexer(years.values.ravel())
+    if (positions == -1).any():
+        missing = sorted(set(years.values.ravel()[positions == -1].tolist()))
+        raise ValueError(f"{missing} not found in time dim.")
+    positions = years.copy(data=positions.reshape(years.shape))
+    return timeseries_data.isel(time=positions).drop_vars("time")
+
+
+def _gather_pixel_years(
+    timeseries_data: xr.DataArray, years: xr.DataArray, year_index: pd.Index
+) -> xr.DataArray:
+    """Gather each pixel's observation at a per-pixel year.
+
+    Uses a vectorized take along the time axis for each chunk, so
+    dask-backed inputs are gathered chunk-by-chunk. Pixels whose year
+    is NaN or not in the time dim are NaN.
+    """
+    time_years = year_index.values
+    return xr.apply_ufunc(
+        _take_years,
+        timeseries_data,
+        years,
+        kwargs={"time_years": time_years},
+        input_core_dims=[["time"], []],
+        dask="parallelized",
+        output_dtypes=[np.float64],
+        dask_gufunc_kwargs={"allow_rechunk": True},
+    )
+
+
+def _take_years(data: np.ndarray, years: np.ndarray, time_years: np.ndarray):
+    """Take values along the last (time) axis at the position of `years`."""
+    order = np.argsort(time_years)
+    sorted_years = time_years[order]
+    years = np.asarray(years, dtype=np.float64)
+    shape = np.broadcast_shapes(data.shape[:-1], years.shape)
+    sorted_pos = np.searchsorted(sorted_years, np.nan_to_num(years, nan=-1))
+    sorted_pos = np.clip(sorted_pos, 0, sorted_years.size - 1)
+    valid = np.broadcast_to(sorted_years[sorted_pos] == years, shape)
+    positions = np.broadcast_to(order[sorted_pos], shape)
+    taken = np.take_along_axis(
+        np.broadcast_to(data, shape + data.shape[-1:]), positions[..., None], axis=-1
+    )[..., 0]
+    return np.where(valid, taken, np.nan)
 
 
 def has_no_missing_years(images: xr.DataArray):
     """Check for continous set of years in DataArray"""
-    years = images.coords["time"].dt.year.values
-    if not np.all((years == list(range(years[0], years[-1] + 1)))):
-        return False
-    return True
+    years = _year_index(images).values
+    return bool(np.all(np.diff(years) == 1))
 
 
 @register_metric
@@ -89,6 +852,7 @@ def dnbr(
     params: Dict = {"timestep": 5},
     recovery_target: xr.DataArray = None,
     disturbance_start: int = None,
+    year_index: pd.Index = None,
 ) -> xr.DataArray:
     """Per-pixel dNBR.
 
@@ -103,7 +867,12 @@ def dnbr(
         The restoration area to compute dnbr for.
     params : Dict
         Parameters to customize metric computation. dnbr uses
-        the 'timestep' parameter with default = {"timestep": 5}
+        the 'timestep' parameter with default = {"timestep": 5}.
+        A sequence of timesteps adds a "timestep" dimension, and
+        "all" adds a "years_since_restoration" dimension.
+    year_index : pd.Index, optional
+        Year of each time position of timeseries_data, see `_year_index`.
+        Built from timeseries_data if None.
 
     Returns
     -------
@@ -111,25 +880,30 @@ def dnbr(
         DataArray containing the dNBR value for each pixel.
 
     """
-    if params["timestep"] < 0:
+    timesteps, scalar_t = _timestep_coord(
+        params["timestep"], restoration_start, timeseries_data, year_index=year_index
+    )
+    if (timesteps < 0).any():
         raise ValueError(NEG_TIMESTEP_MSG)
+    if year_index is None:
+        year_index = _year_index(timeseries_data)
 
-    rest_post_t = str(restoration_start + params["timestep"])
-    timesries_end = (
-        np.max(timeseries_data.time.values).astype("datetime64[Y]").astype(int) + 1970
-    )
-    if int(rest_post_t) > int(timesries_end):
+    rest_post_t = restoration_start + timesteps
+    timesries_end = year_index.max()
+    # Per-pixel restoration years beyond the timeseries are set to NaN
+    if not isinstance(restoration_start, xr.DataArray) and int(rest_post_t.max()) > int(
+        timesries_end
+    ):
         raise ValueError(
-            f" {restoration_start}+{params['timestep']}={rest_post_t} is greater"
+            f" {restoration_start}+{params['timestep']}={rest_post_t.values} is greater"
             f" than end of timeseries: {timesries_end}. "
         ) from None
 
-    dnbr_v = (
-        timeseries_data.sel(time=rest_post_t).drop_vars("time")
-        - timeseries_data.sel(time=str(restoration_start)).drop_vars("time")
-    ).squeeze("time")
+    dnbr_v = _sel_years(timeseries_data, rest_post_t, year_index) - _sel_years(
+        timeseries_data, restoration_start, year_index
+    )
 
-    return dnbr_v
+    return _finalize_params(dnbr_v, {PARAM_DIMS["timestep"]: scalar_t})
 
 
 @register_metric
@@ -139,6 +913,7 @@ def yryr(
     params: Dict = {"timestep": 5},
     recovery_target: xr.DataArray = None,
     disturbance_start: int = None,
+    year_index: pd.Index = None,
 ):
     """Per-pixel YrYr.
 
@@ -153,7 +928,12 @@ def yryr(
         The restoration area to compute yryr for.
     params : Dict
         Parameters to customize metric computation. yryr uses
-        the 'timestep' parameter with default = {"timestep": 5}
+        the 'timestep' parameter with default = {"timestep": 5}.
+        A sequence of timesteps adds a "timestep" dimension, and
+        "all" adds a "years_since_restoration" dimension.
+    year_index : pd.Index, optional
+        Year of each time position of timeseries_data, see `_year_index`.
+        Built from timeseries_data if None.
 
     Returns
     -------
@@ -161,15 +941,19 @@ def yryr(
         DataArray containing the YrYr value for each pixel.
 
     """
-    if params["timestep"] < 0:
+    timesteps, scalar_t = _timestep_coord(
+        params["timestep"], restoration_start, timeseries_data, year_index=year_index
+    )
+    if (timesteps < 0).any():
         raise ValueError(NEG_TIMESTEP_MSG)
+    if year_index is None:
+        year_index = _year_index(timeseries_data)
 
-    rest_post_t = str(restoration_start + params["timestep"])
-    obs_post_t = timeseries_data.sel(time=rest_post_t).drop_vars("time")
-    obs_start = timeseries_data.sel(time=str(restoration_start)).drop_vars("time")
-    yryr_v = ((obs_post_t - obs_start) / params["timestep"]).squeeze("time")
+    obs_post_t = _sel_years(timeseries_data, restoration_start + timesteps, year_index)
+    obs_start = _sel_years(timeseries_data, restoration_start, year_index)
+    yryr_v = (obs_post_t - obs_start) / timesteps
 
-    return yryr_v
+    return _finalize_params(yryr_v, {PARAM_DIMS["timestep"]: scalar_t})
 
 
 @register_metric
@@ -179,6 +963,7 @@ def r80p(
     recovery_target: xr.DataArray,
     params: Dict = {"percent_of_target": 80, "timestep": 5},
     disturbance_start: int = None,
+    year_index: pd.Index = None,
 ) -> xr.DataArray:
     """Per-pixel R80P.
 
@@ -198,7 +983,13 @@ def r80p(
     params : Dict
         Parameters to customize metric computation. r80p uses
         the 'timestep' and 'percent_of_target' parameters with
-        default = {"percent_of_target": 80, "timestep": 5}.
+        default = {"percent_of_target": 80, "timestep": 5}. Sequences
+        of timesteps or percents add "timestep" or "percent" dimensions,
+        and all thresholds are broadcast in a single sweep. A timestep
+        of "all" adds a "years_since_restoration" dimension.
+    year_index : pd.Index, optional
+        Year of each time position of timeseries_data, see `_year_index`.
+        Built from timeseries_data if None.
 
     Returns
     -------
@@ -206,24 +997,35 @@ def r80p(
         DataArray containing the R80P value for each pixel.
 
     """
+    percents, scalar_p = _param_coord(
+        params["percent_of_target"], PARAM_DIMS["percent_of_target"]
+    )
     if params["timestep"] is None:
-        rest_post_t = timeseries_data["time"].data[-1]
-    elif params["timestep"] < 0:
-        raise ValueError(NEG_TIMESTEP_MSG)
-    elif params["percent_of_target"] <= 0 or params["percent_of_target"] > 100:
-        raise ValueError(VALID_PERC_MSP)
+        # Use the most recent observation in the timeseries
+        scalar_t = True
+        obs_post_t = timeseries_data.isel(time=-1).drop_vars("time")
     else:
-        rest_post_t = str(restoration_start + params["timestep"])
-    r80p_v = (timeseries_data.sel(time=rest_post_t)).drop_vars("time") / (
-        (params["percent_of_target"] / 100) * recovery_target
+        timesteps, scalar_t = _timestep_coord(
+            params["timestep"],
+            restoration_start,
+            timeseries_data,
+            year_index=year_index,
+        )
+        if (timesteps < 0).any():
+            raise ValueError(NEG_TIMESTEP_MSG)
+        if year_index is None:
+            year_index = _year_index(timeseries_data)
+        obs_post_t = _sel_years(
+            timeseries_data, restoration_start + timesteps, year_index
+        )
+    if (percents <= 0).any() or (percents > 100).any():
+        raise ValueError(VALID_PERC_MSP)
+
+    r80p_v = obs_post_t / ((percents / 100) * recovery_target)
+    return _finalize_params(
+        r80p_v,
+        {PARAM_DIMS["timestep"]: scalar_t, PARAM_DIMS["percent_of_target"]: scalar_p},
     )
-    try:
-        # if using the default timestep (the max/most recent),
-        # the indexing will not get rid of the "time" dim
-        r80p_v = r80p_v.squeeze("time")
-    except KeyError:
-        pass
-    return r80p_v
 
 
 @register_metric
@@ -233,6 +1035,7 @@ def y2r(
     recovery_target: xr.DataArray,
     params: Dict = {"percent_of_target": 80},
     disturbance_start: int = None,
+    year_index: pd.Index = None,
 ) -> xr.DataArray:
     """Per-pixel Y2R.
 
@@ -246,7 +1049,12 @@ def y2r(
         The restoration area to compute r80p for.
     params : Dict
         Parameters to customize metric computation. r80p uses
-        the 'percent_of_target' parameter with default = {"percent_of_target": 80}
+        the 'percent_of_target' parameter with default = {"percent_of_target": 80}.
+        A sequence of percents adds a "percent" dimension and all
+        thresholds are evaluated in a single sweep over the recovery window.
+    year_index : pd.Index, optional
+        Year of each time position of timeseries_data, see `_year_index`.
+        Built from timeseries_data if None.
 
     Returns
     -------
@@ -256,40 +1064,58 @@ def y2r(
         have not yet reached the recovery target value.
 
     """
-    if params["percent_of_target"] <= 0 or params["percent_of_target"] > 100:
+    percents, scalar_p = _param_coord(
+        params["percent_of_target"], PARAM_DIMS["percent_of_target"]
+    )
+    if (percents <= 0).any() or (percents > 100).any():
         raise ValueError(VALID_PERC_MSP)
 
-    recovery_window = timeseries_data.sel(time=slice(str(restoration_start), None))
+    y2r_target = recovery_target * (percents / 100)
+    window_start = _first_year(restoration_start)
+    if year_index is None:
+        year_index = _year_index(timeseries_data)
+    window_pos = (
+        len(year_index)
+        if window_start is None
+        else year_index.searchsorted(window_start)
+    )
+    if window_pos == len(year_index):
+        # No restoration years (e.g all NaN) or all are after the end
+        # of the timeseries, so no pixel can have recovered
+        y2r_v = timeseries_data.isel(time=0, drop=True) - y2r_target
+        if isinstance(restoration_start, xr.DataArray):
+            y2r_v = y2r_v - restoration_start
+        y2r_v = xr.full_like(y2r_v, np.nan, dtype=np.float64)
+        return _finalize_params(y2r_v, {PARAM_DIMS["percent_of_target"]: scalar_p})
+
+    # Only the (clipped) recovery window is reduced along time, so only
+    # it is rechunked into time-contiguous tiles
+    recovery_window = timeseries_data.isel(
+        time=slice(window_pos, None)
+    ).satts.rechunk_time()
     if not has_no_missing_years(recovery_window):
         raise ValueError(
             f"Missing years. Y2R requires data for all years between {recovery_window.time.min()}-{recovery_window.time.max()}."
         )
 
-    print(recovery_target, params["percent_of_target"])
-    y2r_target = recovery_target * (params["percent_of_target"] / 100)
-
-    years_to_recovery = (recovery_window >= y2r_target).argmax(dim="time", skipna=True)
-    # Pixels with value 0 could be:
-    # 1. pixels that were recovered at the first timestep
-    # 2. pixels that never recovered (argmax returns 0 if all values are False)
-    # 3. pixels that were NaN for the entire recovery window.
-    #
-    # Only 1. is a valid 0, so set pixels that never recovered to -9999,
-    # and pixels that were NaN for the entire recovery window back to NaN.
-    not_zero = years_to_recovery != 0
-    recovered_at_zero = recovery_window.sel(time=str(restoration_start)) >= y2r_target
-    is_nan = recovery_window.isnull().all("time")
-    valid_output = not_zero | recovered_at_zero | is_nan
-
-    # Set unrecovered 0's to -9999, aund NaN 0's to NaN
-    y2r_v = years_to_recovery.where(valid_output, -9999)
-    y2r_v = y2r_v.where(~is_nan, np.nan).drop_vars("time")
+    # Mask years before each pixel's restoration start (a no-op when
+    # restoration_start is a single year for all pixels).
+    window_years = xr.DataArray(year_index.values[window_pos:], dims=["time"])
+    in_window = window_years >= restoration_start
+    recovered = (recovery_window >= y2r_target) & in_window
+    # argmax returns 0 if all values are False, so pixels that never
+    # recovered are set to -9999, and pixels that were NaN for the
+    # entire recovery window are set to NaN. Years in the window are
+    # contiguous so the first recovered position maps directly to a year.
+    # The window starts at the first year of the stack at or after
+    # window_start, which is later if restoration predates the stack.
+    first_recovered = recovered.argmax(dim="time")
+    y2r_v = (int(window_years[0]) + first_recovered) - restoration_start
+    is_nan = recovery_window.where(in_window).isnull().all("time")
+    y2r_v = y2r_v.where(recovered.any("time"), -9999)
+    y2r_v = y2r_v.where(~is_nan, np.nan)
 
-    try:
-        y2r_v = y2r_v.squeeze("time")
-    except KeyError:
-        pass
-    return y2r_v
+    return _finalize_params(y2r_v, {PARAM_DIMS["percent_of_target"]: scalar_p})
 
 
 @register_metric
@@ -299,6 +1125,7 @@ def rri(
     timeseries_data: xr.DataArray,
     params: Dict = {"timestep": 5},
     recovery_target: xr.DataArray = None,
+    year_index: pd.Index = None,
 ) -> xr.DataArray:
     """Per-pixel RRI.
 
@@ -315,7 +1142,12 @@ def rri(
     params : Dict
         Parameters to customize metric computation. r80p uses
         the 'timestep' and 'use_dist_avg' parameters with
-        default = {"timestep": 5}.
+        default = {"timestep": 5}. A sequence of timesteps adds a
+        "timestep" dimension, and "all" adds a "years_since_restoration"
+        dimension (starting from the first year with a t-1 observation).
+    year_index : pd.Index, optional
+        Year of each time position of timeseries_data, see `_year_index`.
+        Built from timeseries_data if None.
 
     Returns
     -------
@@ -323,36 +1155,46 @@ def rri(
         DataArray containing the RRI value for each pixel.
 
     """
-    if params["timestep"] < 0:
+    timesteps, scalar_t = _timestep_coord(
+        params["timestep"],
+        restoration_start,
+        timeseries_data,
+        lag=1,
+        year_index=year_index,
+    )
+    if (timesteps < 0).any():
         raise ValueError(NEG_TIMESTEP_MSG)
 
-    if params["timestep"] == 0:
+    if (timesteps == 0).any():
         raise ValueError("timestep for RRI must be greater than 0.")
+    if year_index is None:
+        year_index = _year_index(timeseries_data)
 
-    rest_post_tm1 = str(restoration_start + (params["timestep"] - 1))
-    rest_post_t = str(restoration_start + params["timestep"])
+    rest_post_tm1 = restoration_start + (timesteps - 1)
+    rest_post_t = restoration_start + timesteps
 
-    if pd.to_datetime(rest_post_tm1) not in timeseries_data.time.values:
-        raise ValueError(
-            f"{rest_post_tm1} (year of timestep - 1) not found in time dim."
-        )
-    if pd.to_datetime(rest_post_t) not in timeseries_data.time.values:
-        raise ValueError(f"{rest_post_t} (year of timestep) not found in time dim.")
+    time_years = year_index.values
+    if not isinstance(restoration_start, xr.DataArray):
+        for label, years in [
+            ("year of timestep - 1", rest_post_tm1.values),
+            ("year of timestep", rest_post_t.values),
+        ]:
+            missing = years[~np.isin(years, time_years)]
+            if missing.size:
+                raise ValueError(f"{missing[0]} ({label}) not found in time dim.")
 
-    max_rest_t_tm1 = timeseries_data.sel(time=slice(rest_post_tm1, rest_post_t)).max(
-        dim=["time"]
-    )
-    rest_start = timeseries_data.sel(time=str(restoration_start)).drop_vars("time")
-    dist_start = timeseries_data.sel(time=str(disturbance_start)).drop_vars("time")
+    # NaN-skipping max of the t-1 and t observations. Per-pixel years
+    # outside the time dim gather NaN, so mask them to not skip over them.
+    max_rest_t_tm1 = np.fmax(
+        _sel_years(timeseries_data, rest_post_tm1, year_index),
+        _sel_years(timeseries_data, rest_post_t, year_index),
+    ).where(rest_post_tm1.isin(time_years) & rest_post_t.isin(time_years))
+    rest_start = _sel_years(timeseries_data, restoration_start, year_index)
+    dist_start = _sel_years(timeseries_data, disturbance_start, year_index)
     dist_end = rest_start
 
     rri_v = (max_rest_t_tm1 - rest_start) / (dist_start - dist_end)
-    # if dist_pre_1_2 has length greater than one we will need to squeeze the time dim
-    try:
-        rri_v = rri_v.squeeze("time")
-    except KeyError:
-        pass
-    return rri_v
+    return _finalize_params(rri_v, {PARAM_DIMS["timestep"]: scalar_t})
 
 
 def year_dt(dt, dt_type: str = "int"):
@@ -0,0 +1,288 @@
+"""Pixel pools of restoration/reference sites for vectorized targets.
+
+Sites are rasterized once into compact pools of pixel positions, so
+targets for many sites can be computed with one gather of the stack
+and segment reductions over the site labels, rather than by clipping
+the stack for every site.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+import xarray as xr
+
+from affine import Affine
+from dask.utils import parse_bytes
+from rasterio import features
+from rasterio.windows import Window
+from rioxarray.exceptions import NoDataInBounds
+
+from spectral_recovery._config import RECHUNK_MAX_MEM
+
+
+def site_pixels(geometry, transform: Affine, shape: Tuple[int, int]):
+    """Rows, cols and window of the pixels a geometry clips.
+
+    Matches `rio.clip` (pixels whose centres fall in the geometry) but
+    only rasterizes the geometry over the window of its bounds, so the
+    cost is independent of the size of the scene.
+
+    Returns
+    -------
+    rows, cols : np.ndarray
+        Absolute row and column positions of the clipped pixels.
+    window : rasterio.windows.Window
+        The window spanning the clipped pixels, i.e the extent that
+        `rio.clip` crops to.
+    """
+    height, width = shape
+    minx, miny, maxx, maxy = geometry.bounds
+    inverse = ~transform
+    corners = np.array(
+        [
+            inverse * (x, y)
+            for x, y in [(minx, miny), (minx, maxy), (maxx, miny), (maxx, maxy)]
+        ]
+    )
+    col_off = int(np.clip(np.floor(corners[:, 0].min()), 0, width))
+    row_off = int(np.clip(np.floor(corners[:, 1].min()), 0, height))
+    col_end = int(np.clip(np.ceil(corners[:, 0].max()), 0, width))
+    row_end = int(np.clip(np.ceil(corners[:, 1].max()), 0, height))
+    if col_end <= col_off or row_end <= row_off:
+        raise NoDataInBounds("No data found in bounds.")
+
+    mask = features.geometry_mask(
+        [geometry],
+        out_shape=(row_end - row_off, col_end - col_off),
+        transform=transform * Affine.translation(col_off, row_off),
+        invert=True,
+    )
+    rows, cols = np.nonzero(mask)
+    if rows.size == 0:
+        raise NoDataInBounds("No data found in bounds.")
+    rows = rows + row_off
+    cols = cols + col_off
+    window = Window(
+        col_off=cols.min(),
+        row_off=rows.min(),
+        width=cols.max() - cols.min() + 1,
+        height=rows.max() - rows.min() + 1,
+    )
+    return rows, cols, window
+
+
+def union_window(windows, halo: int, shape: Tuple[int, int]) -> Window:
+    """Window spanning all windows, buffered by halo pixels in the scene."""
+    height, width = shape
+    row_off = max(min(w.row_off for w in windows) - halo, 0)
+    col_off = max(min(w.col_off for w in windows) - halo, 0)
+    row_end = min(max(w.row_off + w.height for w in windows) + halo, height)
+    col_end = min(max(w.col_off + w.width for w in windows) + halo, width)
+    return Window(
+        col_off=col_off,
+        row_off=row_off,
+        width=col_end - col_off,
+        height=row_end - row_off,
+    )
+
+
+def clip_pixels(
+    data: xr.DataArray, rows, cols, window: Window, origin: Window = None
+) -> xr.DataArray:
+    """Clip data to a site's pixels, as `rio.clip` does.
+
+    `rows`, `cols` and `window` are from `site_pixels`. If data is itself
+    a window of the scene, `origin` is that window.
+    """
+    row_off = window.row_off - (origin.row_off if origin is not None else 0)
+    col_off = window.col_off - (origin.col_off if origin is not None else 0)
+    clipped = data.rio.isel_window(
+        Window(
+            col_off=col_off, row_off=row_off, width=window.width, height=window.height
+        )
+    )
+    mask = np.zeros((window.height, window.width), dtype=bool)
+    mask[rows - window.row_off, cols - window.col_off] = True
+    return clipped.where(xr.DataArray(mask, dims=("y", "x")))
+
+
+def pixel_pool(
+    sites: Dict, timeseries_data: xr.DataArray
+) -> Tuple[Dict, np.ndarray, np.ndarray]:
+    """Rasterize sites into a pool of the unique pixels they cover.
+
+    Parameters
+    ----------
+    sites : dict
+        Geometries keyed by site id.
+    timeseries_data : xr.DataArray
+        The stack the sites are rasterized onto.
+
+    Returns
+    -------
+    site_info : dict
+        For each site id, a (positions, rows, cols, window) tuple where
+        positions index the site's pixels in the pool.
+    rows, cols : np.ndarray
+        Row and column of each pixel in the pool.
+    """
+    transform = timeseries_data.rio.transform(recalc=True)
+    shape = (timeseries_data.rio.height, timeseries_data.rio.width)
+    clipped = {
+        site_id: site_pixels(geometry, transform, shape)
+        for site_id, geometry in sites.items()
+    }
+    flat = np.concatenate(
+        [rows * shape[1] + cols for rows, cols, _ in clipped.values()]
+    )
+    pool, positions = np.unique(flat, return_inverse=True)
+    site_info = {}
+    start = 0
+    for site_id, (rows, cols, window) in clipped.items():
+        stop = start + rows.size
+        site_info[site_id] = (positions[start:stop], rows, cols, window)
+        start = stop
+    return site_info, pool // shape[1], pool % shape[1]
+
+
+def gather_pixels(
+    timeseries_data: xr.DataArray, rows: np.ndarray, cols: np.ndarray
+) -> xr.DataArray:
+    """Gather pixels from the stack along a new "pixel" dimension."""
+    return timeseries_data.isel(
+        y=xr.DataArray(rows, dims="pixel"), x=xr.DataArray(cols, dims="pixel")
+    ).drop_vars(["y", "x"])
+
+
+def time_quantile(data: xr.DataArray, q: float) -> xr.DataArray:
+    """NaN-skipping q-th quantile over time, the median if q is 0.5.
+
+    Dask-backed data (e.g a batch of gathered pixels) is rechunked to
+    one chunk along time first.
+    """
+    if data.chunks is not None:
+        data = data.chunk({"time": -1})
+    if q == 0.5:
+        return data.median(dim="time", skipna=True)
+    return data.quantile(q, dim="time", skipna=True).drop_vars("quantile")
+
+
+def pool_batches(
+    timeseries_data: xr.DataArray,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    max_mem: str = RECHUNK_MAX_MEM,
+):
+    """Gather pool pixels in batches that fit in max_mem.
+
+    Yields
+    ------
+    start : int
+        Position in the pool of the first pixel of the batch.
+    batch : xr.DataArray
+        The batch of pixels gathered with `gather_pixels`.
+    """
+    pixel_bytes = timeseries_data.dtype.itemsize * int(
+        np.prod(
+            [
+                timeseries_data.sizes[d]
+                for d in timeseries_data.dims
+                if d not in ("y", "x")
+            ]
+        )
+    )
+    batch_size = max(parse_bytes(max_mem) // max(pixel_bytes, 1), 1)
+    for start in range(0, rows.size, batch_size):
+        stop = start + batch_size
+        yield start, gather_pixels(timeseries_data, rows[start:stop], cols[start:stop])
+
+
+def pool_time_quantile(
+    timeseries_data: xr.DataArray,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    q: float = 0.5,
+    max_mem: str = RECHUNK_MAX_MEM,
+) -> np.ndarray:
+    """Time quantile of each pool pixel, computed batch by batch.
+
+    Only one batch of the stack is held in memory at a time, so peak
+    memory is bounded by max_mem rather than by the size of the pool.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (..., n_pixels), e.g (band, n_pixels).
+    """
+    return np.concatenate(
+        [
+            np.asarray(time_quantile(batch, q).transpose(..., "pixel").values)
+            for _, batch in pool_batches(timeseries_data, rows, cols, max_mem)
+        ],
+        axis=-1,
+    )
+
+
+def segment_nanmedian(values: np.ndarray, labels: np.ndarray, n_labels: int):
+    """NaN-skipping median of values grouped by integer labels.
+
+    See `segment_nanquantile`.
+    """
+    return segment_nanquantile(values, labels, n_labels, 0.5)
+
+
+def segment_nanquantile(
+    values: np.ndarray, labels: np.ndarray, n_labels: int, q: float
+):
+    """NaN-skipping q-th quantile of values grouped by integer labels.
+
+    Sorts once by (label, value) and interpolates between the two values
+    around the quantile's rank in each label's non-NaN segment, as the
+    default linear method of `np.nanquantile` does, so all groups are
+    reduced without a Python loop.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array of shape (..., n) to reduce along the last axis.
+    labels : np.ndarray
+        Label in [0, n_labels) of each of the n values.
+    n_labels : int
+        The number of labels.
+    q : float
+        The quantile to compute, between 0 and 1.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (..., n_labels). NaN for labels without values.
+    """
+    lead_shape = values.shape[:-1]
+    values = values.reshape(-1, values.shape[-1])
+    n_rows = values.shape[0]
+    # Offset labels per row so every (row, label) pair is one segment
+    row_labels = (np.arange(n_rows)[:, None] * n_labels + labels[None, :]).ravel()
+    flat_values = values.ravel()
+    order = np.lexsort((flat_values, row_labels))
+    sorted_values = flat_values[order]
+
+    n_segments = n_rows * n_labels
+    seg_sizes = np.bincount(row_labels, minlength=n_segments)
+    seg_valid = np.bincount(
+        row_labels, weights=~np.isnan(flat_values), minlength=n_segments
+    ).astype(int)
+    # NaNs sort to the end of each segment
+    seg_starts = np.concatenate([[0], np.cumsum(seg_sizes)[:-1]])
+    rank = q * np.maximum(seg_valid - 1, 0)
+    frac = rank - np.floor(rank)
+    lo = seg_starts + np.floor(rank).astype(int)
+    hi = seg_starts + np.ceil(rank).astype(int)
+    has_values = seg_valid > 0
+    lo = np.where(has_values, lo, 0)
+    hi = np.where(has_values, hi, 0)
+    if sorted_values.size == 0:
+        quantiles = np.full(n_segments, np.nan)
+    else:
+        quantiles = sorted_values[lo] * (1 - frac) + sorted_values[hi] * frac
+    quantiles = np.where(has_values, quantiles, np.nan)
+    return quantiles.reshape(*lead_shape, n_labels)
@@ -0,0 +1,274 @@
+"""Mergeable fixed-bin histogram sketches for approximate quantiles.
+
+A sketch holds one histogram of counts per (row, label) over a fixed
+value range of each row, so its memory is independent of how many
+values it has seen. Sketches of the same ranges are merged by adding
+their counts, which lets quantiles be computed over values streamed
+chunk by chunk.
+"""
+
+import warnings
+
+from typing import Tuple, Union
+
+import dask
+import numpy as np
+import xarray as xr
+
+from spectral_recovery._config import RECHUNK_MAX_MEM
+from spectral_recovery.targets._sites import pool_batches, time_quantile
+
+
+class QuantileSketch:
+    """Fixed-bin histograms of labelled values.
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of independent rows (e.g bands) of values.
+    n_labels : int
+        The number of labels (e.g sites) each row is grouped by.
+    value_range : tuple of float or np.ndarray
+        The (min, max) of the values, shared by every row, or an array
+        of shape (n_rows, 2) with the (min, max) of each row. Values
+        outside of a row's range are counted in its first or last bin.
+    error : float
+        The maximum error of quantiles, as a fraction of the width of
+        each row's value range. Sets the number of bins to
+        ceil(1 / error).
+
+    """
+
+    def __init__(
+        self,
+        n_rows: int,
+        n_labels: int,
+        value_range: Union[Tuple[float, float], np.ndarray],
+        error: float = 0.001,
+    ):
+        if not 0 < error < 1:
+            raise ValueError(f"error must be between 0 and 1 ({error} provided)")
+        ranges = np.asarray(value_range, dtype=float)
+        if ranges.shape == (2,):
+            ranges = np.tile(ranges, (n_rows, 1))
+        if (
+            ranges.shape != (n_rows, 2)
+            or not np.isfinite(ranges).all()
+            or (ranges[:, 1] < ranges[:, 0]).any()
+        ):
+            raise ValueError(f"Invalid value_range {value_range}.")
+        self.n_rows = n_rows
+        self.n_labels = n_labels
+        self.value_range = ranges
+        self.n_bins = int(np.ceil(1 / error))
+        self.counts = np.zeros((n_rows, n_labels, self.n_bins), dtype=np.int64)
+
+    @property
+    def bin_width(self) -> np.ndarray:
+        """Width of the bins of each row"""
+        width = self.value_range[:, 1] - self.value_range[:, 0]
+        # A degenerate range still needs non-zero bins to place values in
+        return np.where(width > 0, width, 1.0) / self.n_bins
+
+    def update(self, values: np.ndarray, labels: np.ndarray) -> "QuantileSketch":
+        """Count values of shape (n_rows, n) with labels of shape (n,).
+
+        NaN values are skipped.
+        """
+        values = np.asarray(values, dtype=float).reshape(self.n_rows, -1)
+        lo = self.value_range[:, :1]
+        bins = np.floor((values - lo) / self.bin_width[:, None])
+        valid = ~np.isnan(bins)
+        bins = np.clip(np.nan_to_num(bins), 0, self.n_bins - 1).astype(np.int64)
+        cells = (
+            np.arange(self.n_rows)[:, None] * self.n_labels + labels[None, :]
+        ) * self.n_bins + bins
+        self.counts += np.bincount(cells[valid], minlength=self.counts.size).reshape(
+            self.counts.shape
+        )
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Add the counts of a sketch with the same shape and bins."""
+        if other.counts.shape != self.counts.shape or not np.array_equal(
+            other.value_range, self.value_range
+        ):
+            raise ValueError("Cannot merge sketches with different bins.")
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Approximate q-th quantile of each (row, label).
+
+        Interpolates between the values at the ranks around the quantile,
+        as the linear method of `np.nanquantile` does, with each value
+        estimated from the bin it falls in. The error is at most the
+        width of one bin.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (n_rows, n_labels). NaN where no values were
+            counted.
+        """
+        cumulative = np.cumsum(self.counts, axis=-1)
+        totals = cumulative[..., -1]
+        rank = q * np.maximum(totals - 1, 0)
+        frac = rank - np.floor(rank)
+        values = self._value_at(cumulative, np.floor(rank)) * (1 - frac)
+        values += self._value_at(cumulative, np.ceil(rank)) * frac
+        return np.where(totals > 0, values, np.nan)
+
+    def _value_at(self, cumulative: np.ndarray, rank: np.ndarray) -> np.ndarray:
+        """Estimate of the value at each (0-based) rank of sorted values"""
+        # The bin holding the value at each rank, and the count before it
+        bins = (cumulative <= rank[..., None]).sum(axis=-1)
+        bins = np.minimum(bins, self.n_bins - 1)
+        in_bin = np.take_along_axis(self.counts, bins[..., None], axis=-1)[..., 0]
+        before = np.take_along_axis(cumulative, bins[..., None], axis=-1)[..., 0]
+        before = before - in_bin
+        offset = (rank - before + 0.5) / np.maximum(in_bin, 1)
+        lo = self.value_range[:, :1]
+        return lo + (bins + offset) * self.bin_width[:, None]
+
+
+def site_quantiles(
+    timeseries_data: xr.DataArray,
+    site_info: dict,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    q: float,
+    error: float = 0.001,
+    value_range: Union[Tuple[float, float], np.ndarray] = None,
+    max_mem: str = RECHUNK_MAX_MEM,
+) -> np.ndarray:
+    """Approximate q-th quantile of the time quantiles of each site's pixels.
+
+    The time quantile of the pool pixels is computed one batch at a time
+    and counted into a sketch per batch. The batch sketches are merged
+    into one sketch per site, so neither the stack nor the time quantiles
+    of the whole pool are held in memory. For dask-backed stacks each
+    batch sketch is a task and the sketches are merged pairwise in the
+    same graph, so batches are read in parallel (up to one batch per
+    worker in memory at a time).
+
+    Only the spatial quantile is approximate, the time quantile of each
+    pixel is exact.
+
+    Parameters
+    ----------
+    timeseries_data : xr.DataArray
+        The stack over the reference window.
+    site_info, rows, cols
+        The pixel pool of the sites, from `pixel_pool`.
+    q : float
+        The quantile to compute, between 0 and 1.
+    error : float
+        Maximum error as a fraction of the width of each band's value
+        range. See `QuantileSketch`.
+    value_range : tuple of float or array-like, optional
+        The (min, max) of the stack's values, shared by every band, or
+        an array of shape (..., 2) with the (min, max) of each band. If
+        None, the range of each band is found with an extra pass over
+        the pool.
+    max_mem : str
+        Memory budget of each batch of the stack.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (..., n_sites), in the order of site_info.
+    """
+    lead_shape = tuple(
+        timeseries_data.sizes[d]
+        for d in timeseries_data.dims
+        if d not in ("time", "y", "x")
+    )
+    lazy = timeseries_data.chunks is not None
+    if value_range is None:
+        value_range = _pool_range(timeseries_data, rows, cols, max_mem, lazy)
+    elif np.ndim(value_range) > 1:
+        # One (min, max) per row, e.g per band
+        value_range = np.reshape(value_range, (-1, 2))
+
+    # (pool position, site label) pairs sorted by position, to find the
+    # sites of each batch's pixels by binary search
+    positions = [info[0] for info in site_info.values()]
+    labels = np.repeat(np.arange(len(positions)), [p.size for p in positions])
+    positions = np.concatenate(positions)
+    order = np.argsort(positions, kind="stable")
+    positions, labels = positions[order], labels[order]
+
+    sketch_kwargs = dict(
+        n_rows=int(np.prod(lead_shape)),
+        n_labels=len(site_info),
+        value_range=value_range,
+        error=error,
+    )
+    batch_sketch = dask.delayed(_batch_sketch) if lazy else _batch_sketch
+
+    def batch_sketches():
+        for start, batch in pool_batches(timeseries_data, rows, cols, max_mem):
+            first, last = np.searchsorted(
+                positions, [start, start + batch.sizes["pixel"]]
+            )
+            yield batch_sketch(
+                batch,
+                positions[first:last] - start,
+                labels[first:last],
+                q,
+                sketch_kwargs,
+            )
+
+    if lazy:
+        sketch = _merge_pairwise(list(batch_sketches())).compute()
+    else:
+        # Batches are read eagerly, merge each one before reading the next
+        sketch = QuantileSketch(**sketch_kwargs)
+        for other in batch_sketches():
+            sketch.merge(other)
+    return sketch.quantile(q).reshape(*lead_shape, len(site_info))
+
+
+def _pool_range(timeseries_data, rows, cols, max_mem, lazy) -> np.ndarray:
+    """(min, max) of the pool's values of each row, e.g of each band.
+
+    Returns an array of shape (n_rows, 2), with (0, 0) for rows whose
+    values are all NaN.
+    """
+    point_dims = ["time", "pixel"]
+    bounds = [
+        (batch.min(point_dims, skipna=True), batch.max(point_dims, skipna=True))
+        for _, batch in pool_batches(timeseries_data, rows, cols, max_mem)
+    ]
+    if lazy:
+        (bounds,) = dask.compute(bounds)
+    lo = np.stack([np.asarray(b[0]).reshape(-1) for b in bounds])
+    hi = np.stack([np.asarray(b[1]).reshape(-1) for b in bounds])
+    with warnings.catch_warnings():
+        # Rows with only NaNs in the pool, their site quantiles are NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        ranges = np.stack([np.nanmin(lo, axis=0), np.nanmax(hi, axis=0)], axis=-1)
+    return np.nan_to_num(ranges, nan=0.0)
+
+
+def _batch_sketch(
+    batch: xr.DataArray,
+    pixels: np.ndarray,
+    labels: np.ndarray,
+    q: float,
+    sketch_kwargs: dict,
+) -> QuantileSketch:
+    """Sketch of the time quantiles of a batch's pixels, by site label"""
+    values = np.asarray(time_quantile(batch, q).transpose(..., "pixel").values)
+    values = values.reshape(-1, values.shape[-1])
+    return QuantileSketch(**sketch_kwargs).update(values[:, pixels], labels)
+
+
+def _merge_pairwise(sketches: list):
+    """Merge delayed sketches as a binary tree of delayed merges"""
+    merge = dask.delayed(QuantileSketch.merge)
+    while len(sketches) > 1:
+        merged = [merge(a, b) for a, b in zip(sketches[::2], sketches[1::2])]
+        sketches = merged + sketches[len(merged) * 2 :]
+    return sketches[0]
@@ -0,0 +1,230 @@
+"""On-disk cache of recovery targets.
+
+Targets are stored in Zarr, one entry per combination of target method,
+stack, sites, reference years and method parameters, so runs and
+processes working on the same region can reuse targets instead of
+recomputing them from the stack.
+"""
+
+import functools
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import geopandas as gpd
+import xarray as xr
+
+from dask.base import tokenize
+from dask.utils import parse_bytes
+
+from spectral_recovery._config import TARGET_CACHE_MAX_SIZE
+
+_META = "meta.json"
+_STORE = "targets.zarr"
+
+
+class TargetCache:
+    """A directory of cached recovery targets with size-based eviction.
+
+    Entries are keyed on a fingerprint of the stack (see
+    `dask.base.tokenize`), a hash of the sites' geometries, index and
+    CRS, and the target method and its parameters (e.g reference years,
+    scale, N). When the cache grows past max_size the least recently
+    used entries are evicted.
+
+    Parameters
+    ----------
+    path : str or Path
+        Directory of the cache. Created if it does not exist.
+    max_size : str or int
+        Maximum size of the cache, e.g "10GB". Default is "10GB".
+
+    Raises
+    ------
+    ImportError
+        If zarr, from the optional "zarr" extra, is not installed.
+
+    Examples
+    --------
+    >>> cache = TargetCache("~/.cache/spectral_recovery/targets")
+    >>> targets = historic.median(sites, stack, reference_years, "polygon", cache=cache)
+    >>> compute_metrics(stack, sites, ["Y2R"], recovery_target=targets)
+
+    """
+
+    def __init__(self, path, max_size: str | int = TARGET_CACHE_MAX_SIZE):
+        if importlib.util.find_spec("zarr") is None:
+            raise ImportError(
+                "TargetCache requires zarr. Install it with "
+                "`pip install spectral_recovery[zarr]`."
+            )
+        self.path = Path(path).expanduser()
+        self.max_size = parse_bytes(max_size)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def key(
+        self,
+        method,
+        sites: gpd.GeoDataFrame,
+        timeseries_data: xr.DataArray,
+        **params,
+    ) -> str:
+        """The key of a target method's result for a stack and sites."""
+        digest = hashlib.sha256()
+        digest.update(f"{method.__module__}.{method.__qualname__}".encode())
+        digest.update(tokenize(timeseries_data).encode())
+        digest.update(_sites_hash(sites).encode())
+        digest.update(tokenize(params).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """The cached targets of key, or None if not in the cache."""
+        entry = self.path / key
+        try:
+            with open(entry / _META) as f:
+                meta = json.load(f)
+            targets = {
+                site_id: _read_target(entry / _STORE, str(k), meta["names"][k])
+                for k, site_id in enumerate(meta["sites"])
+            }
+            # Mark as recently used for eviction
+            os.utime(entry / _META)
+        except FileNotFoundError:
+            return None
+        if meta["kind"] == "dataarray":
+            return targets[None]
+        return targets
+
+    def put(self, key: str, targets) -> None:
+        """Store targets (a DataArray or dict of DataArrays) under key."""
+        if isinstance(targets, xr.DataArray):
+            kind, targets = "dataarray", {None: targets}
+        else:
+            kind = "dict"
+        # Write to a temporary entry and rename it into place, so other
+        # processes never read a partially written entry.
+        tmp = self.path / f".tmp-{key}-{uuid.uuid4().hex}"
+        for k, target in enumerate(targets.values()):
+            target.to_dataset(name="target").to_zarr(
+                tmp / _STORE, group=str(k), mode="w", consolidated=False
+            )
+        with open(tmp / _META, "w") as f:
+            json.dump(
+                {
+                    "kind": kind,
+                    "sites": [_json_id(site_id) for site_id in targets.keys()],
+                    "names": [target.name for target in targets.values()],
+                },
+                f,
+            )
+        try:
+            os.rename(tmp, self.path / key)
+        except OSError:
+            # Already stored by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def compute(self, method, *args, **kwargs):
+        """Return the cached result of a target method, computing it if missing.
+
+        Parameters
+        ----------
+        method : callable
+            A target method, e.g `historic.median`, whose first two
+            parameters are the sites and the timeseries data.
+        *args, **kwargs
+            The parameters of method.
+
+        """
+        bound = inspect.signature(method).bind(*args, **kwargs)
+        bound.apply_defaults()
+        sites_param, data_param, *params = bound.arguments
+        if isinstance(bound.arguments[sites_param], str):
+            bound.arguments[sites_param] = gpd.read_file(bound.arguments[sites_param])
+        key = self.key(
+            method,
+            bound.arguments[sites_param],
+            bound.arguments[data_param],
+            **{param: bound.arguments[param] for param in params},
+        )
+        targets = self.get(key)
+        if targets is None:
+            targets = method(*bound.args, **bound.kwargs)
+            self.put(key, targets)
+        return targets
+
+    def size(self) -> int:
+        """Total size in bytes of the cached entries."""
+        return sum(_entry_size(entry) for entry in self._entries())
+
+    def evict(self) -> None:
+        """Remove least recently used entries until within max_size."""
+        entries = sorted(self._entries(), key=lambda e: (e / _META).stat().st_mtime)
+        sizes = {entry: _entry_size(entry) for entry in entries}
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        for entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _entries(self):
+        return [
+            entry
+            for entry in self.path.iterdir()
+            if not entry.name.startswith(".") and (entry / _META).exists()
+        ]
+
+
+def cached(method):
+    """Add a `cache` keyword argument to a target method.
+
+    If cache is a TargetCache, or the path of one, the method's result
+    is read from the cache when available and stored in it otherwise.
+    """
+
+    @functools.wraps(method)
+    def wrapper(*args, cache=None, **kwargs):
+        if cache is None:
+            return method(*args, **kwargs)
+        if not isinstance(cache, TargetCache):
+            cache = TargetCache(cache)
+        return cache.compute(method, *args, **kwargs)
+
+    return wrapper
+
+
+def _sites_hash(sites: gpd.GeoDataFrame) -> str:
+    """Hash of the geometries, index and CRS of sites"""
+    digest = hashlib.sha256()
+    digest.update(str(sites.crs).encode())
+    digest.update(tokenize(sites.index.tolist()).encode())
+    for geometry in sites.geometry:
+        digest.update(geometry.wkb)
+    return digest.hexdigest()
+
+
+def _json_id(site_id):
+    """Site ids as JSON-serializable Python scalars"""
+    return site_id.item() if hasattr(site_id, "item") else site_id
+
+
+def _read_target(store: Path, group: str, name) -> xr.DataArray:
+    target = xr.open_zarr(store, group=group, decode_coords="all", consolidated=False)[
+        "target"
+    ]
+    return target.load().rename(name)
+
+
+def _entry_size(entry: Path) -> int:
+    return sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
@@ -1,41 +1,59 @@
 """Methods for computing historic recovery targets"""
 
+from typing import Union
+
 import geopandas as gpd
+import numpy as np
 import xarray as xr
+import dask.array as da
+
+from spectral_recovery.targets._sites import (
+    pixel_pool,
+    pool_time_quantile,
+    segment_nanquantile,
+    site_pixels,
+    union_window,
+    clip_pixels,
+)
+from spectral_recovery.targets._sketch import site_quantiles
+from spectral_recovery._utils import dataset_per_index
+from spectral_recovery.targets.cache import cached
 
 
-def _clip_to_dict(timeseries_data, sites, reference_years) -> dict:
-    """Get spatial and temporal clip for all restoration sites"""
-    clipped_sites = {}
-    for index, site in sites.iterrows():
-        ref_s = str(reference_years[index][0])
-        ref_e = str(reference_years[index][1])
-        clipped_data = timeseries_data.rio.clip(gpd.GeoSeries(site.geometry).values)
-        clipped_sites[index] = clipped_data.sel(time=slice(ref_s, ref_e))
-    return clipped_sites
+def _group_by_reference_years(sites, reference_years) -> dict:
+    """Group site ids by their (reference_start, reference_end) years"""
+    groups = {}
+    for index in sites.index:
+        ref_years = (int(reference_years[index][0]), int(reference_years[index][1]))
+        groups.setdefault(ref_years, []).append(index)
+    return groups
 
 
 def _check_reference_years(reference_years, restoration_sites, timeseries_data):
     """Check that reference years are in timeseries coordinates and map to a polygon"""
-    for polyid, years in reference_years.items():
-        try:
-            if years[0] not in timeseries_data.time.dt.year:
-                raise ValueError(
-                    f"Invalid reference years for polygon {polyid}. {years[0]} not in timeseries_data time coordinates."
-                )
-            if years[1] not in timeseries_data.time.dt.year:
-                raise ValueError(
-                    f"Invalid reference years for polygon {polyid}. {years[1]} not in timeseries_data time coordinates."
-                )
-        except KeyError:
-            raise TypeError(
-                "Invalid reference_years format. Must be dict mapping polygon id's to nested dict of reference start and end years, e.g {0: {'reference_start': 2010, 'reference_end': 2011}, 1: {...}, ...}"
-            )
-        for polyid in restoration_sites.index.tolist():
-            if polyid not in list(reference_years.keys()):
-                raise ValueError(f"Missing reference_years for polygon {polyid}")
+    try:
+        bounds = {
+            polyid: (years[0], years[1]) for polyid, years in reference_years.items()
+        }
+    except KeyError:
+        raise TypeError(
+            "Invalid reference_years format. Must be dict mapping polygon id's to nested dict of reference start and end years, e.g {0: {'reference_start': 2010, 'reference_end': 2011}, 1: {...}, ...}"
+        )
+    missing = timeseries_data.satts.missing_years(bounds)
+    if missing:
+        invalid = "; ".join(
+            f"polygon {polyid}: {years}" for polyid, years in missing.items()
+        )
+        raise ValueError(
+            f"Invalid reference years, not in timeseries_data time coordinates ({invalid})."
+        )
+    unmapped = restoration_sites.index.difference(list(reference_years))
+    if not unmapped.empty:
+        raise ValueError(f"Missing reference_years for polygons {unmapped.tolist()}")
 
 
+@cached
+@dataset_per_index
 def median(
     restoration_sites: gpd.GeoDataFrame | str,
     timeseries_data: xr.DataArray,
@@ -49,13 +67,21 @@ def median(
     GeoDataFrame. Scale parameter used to determine the scale of
     the target for each polygon.
 
+    Sites are rasterized once into a pool of the pixels they cover.
+    Sites that share reference years share one time median over their
+    pooled pixels, and polygon-scale targets are reduced from the pool
+    with a segmented median over the site labels, so the cost does not
+    grow with a full clip of the stack per site.
+
     Parameters
     ----------
     restoration_sites : gpd.GeoDataFrame
         The restoration sites to compute a recovery targets for.
-    timeseries_data : xr.DataArray
+    timeseries_data : xr.DataArray or xr.Dataset
         The timeseries of indices to derive the recovery target from.
-        Must contain band, time, y, and x dimensions.
+        Must contain band, time, y, and x dimensions. A Dataset with one
+        (time, y, x) variable per index, e.g from `compute_indices(...,
+        as_dataset=True)`, is processed one index at a time.
     reference_years : dict
         A dictionary mapping reference_start and reference_end years
         to each polygon in restoration_sites, e.g {0: {"reference_start": 2017, "reference_end": 2018}}
@@ -64,6 +90,11 @@ def median(
         in one value per-band (median of the polygon(s) across time), or
         'pixel' which results in a value for each pixel per-band (median
         of each pixel across time).
+    cache : TargetCache or str, optional
+        A target cache, or the path of one, to read the targets from
+        if they were already computed for this stack, sites and
+        parameters, and to store them in otherwise. See
+        `spectral_recovery.targets.cache.TargetCache`.
 
     Returns
     -------
@@ -81,35 +112,151 @@ def median(
     reduced into a single value, i.e if 3 sites are given then recovery
     targets are given for each of those 3 sites.
 
+    """
+    return quantile(restoration_sites, timeseries_data, reference_years, scale)
+
+
+@cached
+@dataset_per_index
+def quantile(
+    restoration_sites: gpd.GeoDataFrame | str,
+    timeseries_data: xr.DataArray,
+    reference_years: dict,
+    scale: str,
+    q: float = 0.5,
+    approx: bool = False,
+    error: float = 0.001,
+    value_range: Union[tuple, np.ndarray] = None,
+) -> dict:
+    """Quantile target method for historic targets.
+
+    As `median`, but with the q-th quantile taken over time and, for
+    polygon-scale targets, over the spatial dimensions (x and y). The
+    time quantiles are computed in batches of pooled pixels, so only a
+    bounded part of the reference window is held in memory at a time.
+
+    Parameters
+    ----------
+    restoration_sites : gpd.GeoDataFrame
+        The restoration sites to compute a recovery targets for.
+    timeseries_data : xr.DataArray or xr.Dataset
+        The timeseries of indices to derive the recovery target from.
+        Must contain band, time, y, and x dimensions.
+    reference_years : dict
+        A dictionary mapping reference_start and reference_end years
+        to each polygon in restoration_sites.
+    scale : {"polygon", "pixel"}
+        The scale to compute target for. See `median`.
+    q : float
+        The quantile to compute, between 0 and 1, e.g 0.75 for the 75th
+        percentile. Default is 0.5, the median.
+    approx : bool
+        If True, polygon-scale targets are approximated from fixed-bin
+        histograms of each site's pixels, which are updated batch by
+        batch instead of holding the time quantiles of all pixels in
+        memory. Has no effect if scale="pixel". Default is False.
+    error : float
+        Maximum error of approximate targets as a fraction of the
+        width of each band's value range. Default is 0.001.
+    value_range : tuple of float or array-like, optional
+        The (min, max) of timeseries_data's values for approximate
+        targets, e.g (-1, 1) for normalized indices, or one (min, max)
+        per band, in the order of the band dimension. If None, the
+        range of each band is found with an extra pass over the sites'
+        pixels.
+    cache : TargetCache or str, optional
+        A target cache, or the path of one. See `median`.
+
+    Returns
+    -------
+    quantile_targets : dict
+        Dictionary of DataArrays containing the quantile recovery target
+        for each restoration site, as returned by `median`.
+
     """
     if not ((scale == "polygon") or (scale == "pixel")):
         raise ValueError(f"scale must be 'polygon' or 'pixel' ('{scale}' provided)")
+    if not 0 <= q <= 1:
+        raise ValueError(f"q must be between 0 and 1 ({q} provided)")
     if isinstance(restoration_sites, str):
         restoration_sites = gpd.read_file(restoration_sites)
     _check_reference_years(reference_years, restoration_sites, timeseries_data)
-    # Get dictionary of a time/space data clip for each polygon
-    clipped_site_data = _clip_to_dict(
-        timeseries_data=timeseries_data,
-        sites=restoration_sites,
-        reference_years=reference_years,
-    )
-    median_targets = {}
-    for poly_id, clipped_data in clipped_site_data.items():
-        # Get the median value across the time dimension
-        median_time_data = clipped_data.median(dim="time", skipna=True)
-        # Additional median calculations based on scale and dimensions
+
+    years = timeseries_data["time"].dt.year.values
+    quantile_targets = {}
+    for (ref_s, ref_e), site_ids in _group_by_reference_years(
+        restoration_sites, reference_years
+    ).items():
+        site_info, rows, cols = pixel_pool(
+            {i: restoration_sites.geometry[i] for i in site_ids}, timeseries_data
+        )
+        ref_data = timeseries_data.isel(
+            time=np.flatnonzero((years >= ref_s) & (years <= ref_e))
+        )
+        if scale == "polygon" and approx:
+            site_values = site_quantiles(
+                ref_data, site_info, rows, cols, q, error, value_range
+            )
+            quantile_targets.update(
+                _polygon_targets(site_info, site_values, timeseries_data)
+            )
+            continue
+        # Quantile across the time dimension, once per pooled pixel
+        pool_values = pool_time_quantile(ref_data, rows, cols, q)
         if scale == "polygon":
-            median_time_data = median_time_data.median(dim=["y", "x"], skipna=True)
-        # Re-assign lost band coords.
-        median_time_data = median_time_data.assign_coords(
-            band=clipped_data.coords["band"]
+            quantile_targets.update(
+                _polygon_quantiles(site_info, pool_values, timeseries_data, q)
+            )
+        else:
+            quantile_targets.update(
+                _pixel_medians(site_info, pool_values, timeseries_data)
+            )
+
+    return {poly_id: quantile_targets[poly_id] for poly_id in restoration_sites.index}
+
+
+def _polygon_quantiles(site_info, pool_values, timeseries_data, q) -> dict:
+    """Quantile of each site's pooled pixels, one segment per site"""
+    site_ids = list(site_info.keys())
+    positions = [site_info[i][0] for i in site_ids]
+    labels = np.repeat(np.arange(len(site_ids)), [p.size for p in positions])
+    site_values = segment_nanquantile(
+        pool_values[..., np.concatenate(positions)], labels, len(site_ids), q
+    )
+    return _polygon_targets(site_info, site_values, timeseries_data)
+
+
+def _polygon_targets(site_info, site_values, timeseries_data) -> dict:
+    """Wrap (..., n_sites) target values into a band DataArray per site"""
+    point = timeseries_data.isel(time=0, y=0, x=0, drop=True)
+    return {
+        site_id: point.copy(data=site_values[..., k]).assign_coords(
+            band=timeseries_data.coords["band"]
         )
-        # Store in the output dictionary
-        median_targets[poly_id] = median_time_data
+        for k, site_id in enumerate(site_info.keys())
+    }
 
-    return median_targets
+
+def _pixel_medians(site_info, pool_values, timeseries_data) -> dict:
+    """Scatter pooled pixel medians into each site's clipped window"""
+    grid = timeseries_data.isel(time=0, drop=True)
+    targets = {}
+    for site_id, (positions, rows, cols, window) in site_info.items():
+        site_grid = grid.rio.isel_window(window).transpose(..., "y", "x")
+        data = np.full(site_grid.shape, np.nan)
+        data[..., rows - window.row_off, cols - window.col_off] = pool_values[
+            ..., positions
+        ]
+        targets[site_id] = (
+            site_grid.copy(data=data)
+            .transpose(*grid.dims)
+            .assign_coords(band=timeseries_data.coords["band"])
+        )
+    return targets
 
 
+@cached
+@dataset_per_index
 def window(
     restoration_sites: gpd.GeoDataFrame | str,
     timeseries_data: xr.DataArray,
@@ -124,14 +271,16 @@ def window(
     polygon, computes the mean of a window of NxN pixels centred
     on pixel p, setting the mean to the recovery target value.
 
-    Implementation is based on raster focal method in R.
+    Implementation is based on raster focal method in R. The focal
+    mean is computed from summed-area tables (integral images), so the
+    cost per pixel does not depend on N.
 
 
     Parameters
     ----------
     polygon : gpd.GeoDataFrame
         The polygon/area to compute a recovery target for.
-    timeseries_data : xr.DataArrah
+    timeseries_data : xr.DataArray or xr.Dataset
         The timeseries of indices to derive the recovery target from.
         Must contain band, time, y, and x dimensions.
     reference_years : dict
@@ -142,6 +291,11 @@ def window(
     na_rm : bool
         If True, NaN will be removed from focal computations. The result will
         only be NA if all focal cells are NA., using na.rm=TRUE may not be a good idea in this function because it can unbalance the effect of the weights
+    cache : TargetCache or str, optional
+        A target cache, or the path of one, to read the targets from
+        if they were already computed for this stack, sites and
+        parameters, and to store them in otherwise. See
+        `spectral_recovery.targets.cache.TargetCache`.
 
     """
     if not isinstance(N, int):
@@ -157,23 +311,87 @@ def window(
         restoration_sites = gpd.read_file(restoration_sites)
     _check_reference_years(reference_years, restoration_sites, timeseries_data)
 
+    transform = timeseries_data.rio.transform(recalc=True)
+    shape = (timeseries_data.rio.height, timeseries_data.rio.width)
+    years = timeseries_data["time"].dt.year.values
     window_targets = {}
-    for poly_id, site_data in restoration_sites.iterrows():
-        ref_s = str(reference_years[poly_id][0])
-        ref_e = str(reference_years[poly_id][1])
-        sliced_data = timeseries_data.sel(time=slice(ref_s, ref_e))
+    # Sites sharing reference years share one time median and focal mean
+    # (N and na_rm are fixed per call), computed only over the union of
+    # the sites' windows buffered by the N//2 pixel focal halo.
+    for (ref_s, ref_e), site_ids in _group_by_reference_years(
+        restoration_sites, reference_years
+    ).items():
+        clipped = {
+            i: site_pixels(restoration_sites.geometry[i], transform, shape)
+            for i in site_ids
+        }
+        focal_window = union_window(
+            [window for _, _, window in clipped.values()], halo=N // 2, shape=shape
+        )
+        sliced_data = (
+            timeseries_data.rio.isel_window(focal_window)
+            .isel(time=np.flatnonzero((years >= ref_s) & (years <= ref_e)))
+            .satts.rechunk_time()
+        )
         median_time = sliced_data.median(dim="time", skipna=True)
-        if na_rm:
-            # Only 1 non-NaN value is required to set a value.
-            min_periods = 1
-        else:
-            # All values in the window must be non-NaN
-            min_periods = None
-        median_window = median_time.rolling(
-            dim={"y": N, "x": N}, center=True, min_periods=min_periods
-        ).mean()
-        window_targets[poly_id] = median_window.rio.clip(
-            gpd.GeoSeries(site_data.geometry).values
+        median_window = _focal_mean(median_time, N=N, na_rm=na_rm)
+        for poly_id, (rows, cols, window) in clipped.items():
+            window_targets[poly_id] = clip_pixels(
+                median_window, rows, cols, window, origin=focal_window
+            )
+
+    return {poly_id: window_targets[poly_id] for poly_id in restoration_sites.index}
+
+
+def _focal_mean(data: xr.DataArray, N: int, na_rm: bool) -> xr.DataArray:
+    """NxN focal mean over the y and x dimensions of data.
+
+    Equivalent to a centred rolling mean, with min_periods=1 if na_rm
+    and all N*N cells required otherwise. Dask arrays are computed
+    chunk-by-chunk with a N//2 halo of NaN-padded neighbouring cells.
+    """
+    spatial_last = data.transpose(..., "y", "x")
+    if isinstance(spatial_last.data, da.Array):
+        halo = N // 2
+        depth = {spatial_last.ndim - 2: halo, spatial_last.ndim - 1: halo}
+        focal = spatial_last.data.map_overlap(
+            _sat_focal_mean,
+            depth=depth,
+            boundary=np.nan,
+            dtype=np.float64,
+            N=N,
+            na_rm=na_rm,
+        )
+    else:
+        focal = _sat_focal_mean(spatial_last.values, N=N, na_rm=na_rm)
+    return spatial_last.copy(data=focal).transpose(*data.dims)
+
+
+def _sat_focal_mean(values: np.ndarray, N: int, na_rm: bool) -> np.ndarray:
+    """NaN-aware NxN focal mean over the last two axes via integral images.
+
+    Sums and counts of non-NaN cells in every window are read from
+    summed-area tables with four lookups per pixel. Cells beyond the
+    array edges count as missing, as in a centred rolling window.
+    """
+    halo = N // 2
+    valid = ~np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 2) + [(halo + 1, halo), (halo + 1, halo)]
+    sums = np.pad(np.where(valid, values, 0.0), pad).cumsum(-2).cumsum(-1)
+    counts = np.pad(valid.astype(np.int64), pad).cumsum(-2).cumsum(-1)
+
+    def _window_totals(table):
+        return (
+            table[..., N:, N:]
+            - table[..., :-N, N:]
+            - table[..., N:, :-N]
+            + table[..., :-N, :-N]
         )
 
-    return window_targets
+    window_sums = _window_totals(sums)
+    window_counts = _window_totals(counts)
+    # Only 1 non-NaN value is required with na_rm, else all N*N values
+    min_count = 1 if na_rm else N * N
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = window_sums / window_counts
+    return np.where(window_counts >= min_count, means, np.nan)
@@ -1,32 +1,30 @@
 """Methods for computing reference-based recovery targets"""
 
+from typing import Union
+
 import geopandas as gpd
+import numpy as np
 import xarray as xr
 
-from pandas import Index as pdIndex
-
-
-def _window_time_clip(timeseries_data, site, reference_start, reference_end):
-    """Clip data to"""
-    clipped_stacks = {}
-    for i, row in site.iterrows():
-        polygon_stack = timeseries_data.rio.clip(gpd.GeoSeries(row.geometry).values)
-        clipped_stacks[i] = polygon_stack
-
-    reference_image_stack = xr.concat(
-        clipped_stacks.values(),
-        dim=pdIndex(clipped_stacks.keys(), name="poly_id"),
-    )
-    return reference_image_stack.sel(
-        time=slice(str(reference_start), str(reference_end))
-    )
+from spectral_recovery.targets._sites import (
+    pixel_pool,
+    pool_time_quantile,
+    segment_nanmedian,
+    segment_nanquantile,
+)
+from spectral_recovery.targets._sketch import site_quantiles
+from spectral_recovery._utils import dataset_per_index
+from spectral_recovery.targets.cache import cached
 
 
+@cached
+@dataset_per_index
 def median(
     reference_sites: gpd.GeoDataFrame | str,
     timeseries_data: xr.DataArray,
     reference_start: int,
     reference_end: int,
+    pooled: bool = False,
 ):
     """Median target method for reference sites.
 
@@ -35,19 +33,34 @@ def median(
     one reference site in the GeoDataFrame then the median
     is also then taken from all reference site medians.
 
+    Reference sites are rasterized into a compact pool of the pixels
+    they cover, so widely separated sites are not padded to their
+    union extent.
+
     Parameters
     ----------
     polygon : gpd.GeoDataFrame
         The polygon/area to compute a recovery target for.
-    timeseries_data : xr.DataArrah
+    timeseries_data : xr.DataArray or xr.Dataset
         The timeseries of indices to derive the recovery target from.
-        Must contain band, time, y, and x dimensions.
+        Must contain band, time, y, and x dimensions. A Dataset with one
+        (time, y, x) variable per index, e.g from `compute_indices(...,
+        as_dataset=True)`, is processed one index at a time.
     reference_start : str
         Start year of reference window. Must exist in timeseries_data's
         time coordinates.
     reference_end :
         End year of reference window. Must exist in timeseries_data's
         time coordinates.
+    pooled : bool
+        If True, the target is the median of the time medians of all
+        reference pixels pooled together, rather than the median of the
+        per-site medians. Default is False.
+    cache : TargetCache or str, optional
+        A target cache, or the path of one, to read the targets from
+        if they were already computed for this stack, sites and
+        parameters, and to store them in otherwise. See
+        `spectral_recovery.targets.cache.TargetCache`.
 
     Returns
     -------
@@ -61,24 +74,111 @@ def median(
     and 2) because multiple polygons are reduced to a single value.
 
     """
+    return quantile(
+        reference_sites, timeseries_data, reference_start, reference_end, pooled=pooled
+    )
+
+
+@cached
+@dataset_per_index
+def quantile(
+    reference_sites: gpd.GeoDataFrame | str,
+    timeseries_data: xr.DataArray,
+    reference_start: int,
+    reference_end: int,
+    q: float = 0.5,
+    pooled: bool = False,
+    approx: bool = False,
+    error: float = 0.001,
+    value_range: Union[tuple, np.ndarray] = None,
+):
+    """Quantile target method for reference sites.
+
+    As `median`, but with the q-th quantile taken over time and over
+    the spatial dimensions (x and y). The median is still taken across
+    the per-site quantiles if there is more than one reference site.
+    The time quantiles are computed in batches of pooled pixels, so
+    only a bounded part of the reference window is held in memory at
+    a time.
+
+    Parameters
+    ----------
+    reference_sites : gpd.GeoDataFrame
+        The polygon/area to compute a recovery target for.
+    timeseries_data : xr.DataArray or xr.Dataset
+        The timeseries of indices to derive the recovery target from.
+        Must contain band, time, y, and x dimensions.
+    reference_start : int
+        Start year of reference window.
+    reference_end : int
+        End year of reference window.
+    q : float
+        The quantile to compute, between 0 and 1, e.g 0.75 for the 75th
+        percentile. Default is 0.5, the median.
+    pooled : bool
+        If True, the target is the quantile of the time quantiles of all
+        reference pixels pooled together. Default is False.
+    approx : bool
+        If True, spatial quantiles are approximated from fixed-bin
+        histograms of each site's pixels, which are updated batch by
+        batch instead of holding the time quantiles of all pixels in
+        memory. Default is False.
+    error : float
+        Maximum error of approximate targets as a fraction of the
+        width of each band's value range. Default is 0.001.
+    value_range : tuple of float or array-like, optional
+        The (min, max) of timeseries_data's values for approximate
+        targets, e.g (-1, 1) for normalized indices, or one (min, max)
+        per band, in the order of the band dimension. If None, the
+        range of each band is found with an extra pass over the sites'
+        pixels.
+    cache : TargetCache or str, optional
+        A target cache, or the path of one. See `median`.
+
+    Returns
+    -------
+    quantile_t : xr.DataArray
+        DataArray of the quantile recovery targets with 1 coordinate dimension, "band".
+
+    """
+    if not 0 <= q <= 1:
+        raise ValueError(f"q must be between 0 and 1 ({q} provided)")
     if isinstance(reference_sites, str):
         reference_sites = gpd.read_file(reference_sites)
 
-    # Clip timeseries data to polygon(s) and time dim
-    clipped_data = _window_time_clip(
-        timeseries_data=timeseries_data,
-        site=reference_sites,
-        reference_start=reference_start,
-        reference_end=reference_end,
+    site_info, rows, cols = pixel_pool(
+        dict(enumerate(reference_sites.geometry)), timeseries_data
+    )
+    window_data = timeseries_data.sel(
+        time=slice(str(reference_start), str(reference_end))
     )
-    # Compute median sequentially
-    # First compute median over time
-    median_time = clipped_data.median(dim="time", skipna=True)
-    # then compute over flattened y/x cells
-    median_time = median_time.median(dim=["y", "x"], skipna=True)
+    if pooled:
+        # all reference pixels as one site
+        site_info = {0: (np.arange(rows.size),)}
+
+    # Compute quantile sequentially
+    if approx:
+        # over time in batches, sketching the y/x cells of each site
+        site_values = site_quantiles(
+            window_data, site_info, rows, cols, q, error, value_range
+        )
+    else:
+        # First compute quantile over time, once per pooled pixel
+        pool_values = pool_time_quantile(window_data, rows, cols, q)
+        # then compute over the y/x cells of each site
+        positions = [info[0] for info in site_info.values()]
+        labels = np.repeat(np.arange(len(positions)), [p.size for p in positions])
+        site_values = segment_nanquantile(
+            pool_values[..., np.concatenate(positions)], labels, len(positions), q
+        )
     # finally, get the median value across all polygons
-    median_time = median_time.median(dim="poly_id", skipna=True)
+    target = segment_nanmedian(
+        site_values, np.zeros(site_values.shape[-1], dtype=int), 1
+    )
 
+    point = timeseries_data.isel(time=0, y=0, x=0, drop=True)
     # Re-assign lost band coords.
-    median_target = median_time.assign_coords(band=timeseries_data.coords["band"])
-    return median_target
+    quantile_target = point.copy(data=target[..., 0]).assign_coords(
+        band=timeseries_data.coords["band"]
+    )
+    return quantile_target
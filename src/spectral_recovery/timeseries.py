@@ -1,6 +1,6 @@
 """Xarray accessor for timeseries operations. Plus helper functions."""
 
-from typing import Union, Tuple
+from typing import Any, Dict, Iterable, List, Sequence, Union, Tuple
 from datetime import datetime
 
 import rioxarray
@@ -10,8 +10,14 @@ import geopandas as gpd
 import pandas as pd
 import numpy as np
 
+from dask.utils import parse_bytes
 from shapely.geometry import box
-from spectral_recovery._config import DATETIME_FREQ, REQ_DIMS
+from spectral_recovery._config import DATETIME_FREQ, REQ_DIMS, RECHUNK_MAX_MEM
+
+SPATIAL_DIMS = ["y", "x"]
+
+# Statistics computed by satts.stats, in order
+STATS = ["mean", "median", "max", "min", "std"]
 
 
 def _datetime_to_index(
@@ -74,13 +80,61 @@ class _SatelliteTimeSeries:
             return False
         return True
 
-    @property
-    def has_no_year_breaks(self, start_year: int, end_year: int):
-        """Check all years between start_year-end_year exist"""
-        years = self._obj.coords["time"].dt.year.values
-        if not np.all((years == list(range(start_year, end_year + 1)))):
-            return False
-        return True
+    def has_no_year_breaks(self, start_year: int, end_year: int) -> bool:
+        """Check all years between start_year-end_year exist.
+
+        Parameters
+        ----------
+        start_year, end_year : int
+            The first and last year (inclusive) of the range to check.
+
+        Returns
+        -------
+        bool
+            True if every year of the range is in the time axis, False otherwise.
+        """
+        return not self.missing_years({None: range(start_year, end_year + 1)})
+
+    def missing_years(
+        self, site_years: Dict[Any, Iterable[int]]
+    ) -> Dict[Any, List[int]]:
+        """Report the years of each site that are not in the time axis.
+
+        The years of all sites are checked together with one binary
+        search against the sorted years of the time axis.
+
+        Parameters
+        ----------
+        site_years : dict
+            The years required by each site, keyed by site, e.g the
+            output of `required_years`.
+
+        Returns
+        -------
+        dict
+            Sorted missing years of each site with missing years, keyed
+            by site. Empty if all years of all sites are in the time axis.
+        """
+        sites = list(site_years)
+        years = [np.asarray(list(site_years[site]), dtype=int) for site in sites]
+        if not years:
+            return {}
+        lengths = [site.size for site in years]
+        years = np.concatenate(years)
+        owner = np.repeat(np.arange(len(sites)), lengths)
+
+        missing = ~_in_sorted(np.unique(self._obj.indexes["time"].year), years)
+        # Order the missing years by site, then year, and split by site
+        order = np.lexsort((years[missing], owner[missing]))
+        owners = owner[missing][order]
+        split = np.flatnonzero(np.diff(owners)) + 1
+        return {
+            sites[site_owners[0]]: np.unique(site_missing).tolist()
+            for site_owners, site_missing in zip(
+                np.split(owners, split), np.split(years[missing][order], split)
+            )
+            if site_owners.size
+        }
 
     def contains_spatial(self, polygons: gpd.GeoDataFrame) -> bool:
         """Check if DataArray spatially contains polygons.
@@ -118,36 +172,231 @@ class _SatelliteTimeSeries:
         bool
             True if the DataArray contains the year(s), False otherwise.
         """
-        # Checking values against the Xarray datetime values is a bit
-        # of a pain. With a bit of time and thought, the use of _datetime_to_index
-        # could likely be avoided. Until then, this works.
-        required_years = _datetime_to_index(years, return_list=True)
-        for year in required_years:
-            if not pd.to_datetime(str(year)) in self._obj.coords["time"].values:
-                return False
-        return True
+        required_years = _datetime_to_index(years)
+        return bool(required_years.isin(self._obj.indexes["time"]).all())
 
-    def stats(self) -> xr.DataArray:
+    def rechunk_plan(self, max_mem: Union[int, str] = RECHUNK_MAX_MEM) -> dict:
+        """Plan a rechunk of the stack into time-contiguous spatial tiles.
+
+        Temporal reductions (e.g Y2R, RRI and target medians) touch one
+        chunk per pixel block when each chunk holds every band and year
+        of a spatial tile. Tiles are sized so that one such chunk fits in
+        `max_mem`, and tile sides are aligned to the source chunks so
+        source chunks are split evenly rather than merged.
+
+        Parameters
+        ----------
+        max_mem : int or str
+            Maximum size of a target chunk. Either bytes or a string
+            understood by dask, e.g "256MB". Default is RECHUNK_MAX_MEM.
+
+        Returns
+        -------
+        plan : dict
+            "source_chunks" and "target_chunks" map each dimension to its
+            chunk sizes. "max_mem" is the budget in bytes and "chunk_mem"
+            the size of one target chunk. "rechunk" is False if the stack
+            is already time-contiguous within budget. "intermediate" is
+            True if the source chunks feeding one target chunk exceed the
+            budget, in which case staging through an on-disk store (see
+            `rechunk_time`) bounds memory.
+
+        """
+        obj = self._obj
+        if isinstance(max_mem, str):
+            max_mem = parse_bytes(max_mem)
+        itemsize = obj.dtype.itemsize
+        if obj.chunks is None:
+            source = {dim: (obj.sizes[dim],) for dim in obj.dims}
+        else:
+            source = dict(obj.chunksizes)
+
+        # Bytes of one pixel with every band and year
+        column = itemsize * int(
+            np.prod([obj.sizes[d] for d in obj.dims if d not in SPATIAL_DIMS])
+        )
+        side = max(1, int(np.sqrt(max_mem // column)))
+        target = {}
+        for dim in obj.dims:
+            if dim not in SPATIAL_DIMS:
+                target[dim] = obj.sizes[dim]
+                continue
+            src = max(source[dim])
+            if side >= src:
+                # Merge whole source chunks
+                size = side // src * src
+            else:
+                # Split source chunks into equal parts
+                size = src // -(-src // side)
+            target[dim] = min(size, obj.sizes[dim])
+
+        chunk_mem = column * int(np.prod([target[d] for d in SPATIAL_DIMS]))
+        source_mem = column * int(np.prod([max(source[d]) for d in SPATIAL_DIMS]))
+        time_contiguous = all(
+            len(source[d]) == 1 for d in obj.dims if d not in SPATIAL_DIMS
+        )
+        # Source chunks read to assemble one target chunk: every chunk
+        # along the non-spatial dims for each spatial chunk it overlaps.
+        overlap = int(np.prod([-(-target[d] // max(source[d])) for d in SPATIAL_DIMS]))
+        return {
+            "source_chunks": source,
+            "target_chunks": target,
+            "max_mem": max_mem,
+            "chunk_mem": chunk_mem,
+            "rechunk": not (time_contiguous and source_mem <= max_mem),
+            "intermediate": overlap * source_mem > max_mem,
+        }
+
+    def rechunk_time(
+        self, max_mem: Union[int, str] = RECHUNK_MAX_MEM, temp_store: str = None
+    ) -> xr.DataArray:
+        """Rechunk a dask-backed stack into time-contiguous spatial tiles.
+
+        Follows the plan from `rechunk_plan`. NumPy-backed stacks and
+        stacks that are already time-contiguous are returned unchanged.
+        Objects without y and x dimensions (e.g site trajectories) are
+        rechunked to one chunk along time.
+
+        Only rechunk the part of a stack that is reduced along time,
+        i.e after clipping it to the sites and selecting years, since
+        every source chunk of a target tile is read to build it.
+
+        Parameters
+        ----------
+        max_mem : int or str
+            Maximum size of a target chunk. Default is RECHUNK_MAX_MEM.
+        temp_store : str, optional
+            Path to a Zarr store for the intermediate stage. If given and
+            the plan requires an intermediate, the stack is first split
+            into target-sized spatial tiles (keeping the source time
+            chunks) and written to `temp_store`, then read back with the
+            target chunks, so neither stage exceeds `max_mem`.
+
+        Returns
+        -------
+        xr.DataArray
+            The rechunked stack.
+
+        """
+        obj = self._obj
+        if obj.chunks is None:
+            return obj
+        if not set(SPATIAL_DIMS) <= set(obj.dims):
+            return obj.chunk({"time": -1})
+        plan = self.rechunk_plan(max_mem)
+        if not plan["rechunk"]:
+            return obj
+        target = plan["target_chunks"]
+        if plan["intermediate"] and temp_store is not None:
+            # Stage 1: split spatially only, with uniform chunks for Zarr
+            stage_chunks = {
+                dim: (target[dim] if dim in SPATIAL_DIMS else max(chunks))
+                for dim, chunks in plan["source_chunks"].items()
+            }
+            name = obj.name
+            obj.chunk(stage_chunks).to_dataset(name="stack").to_zarr(
+                temp_store, mode="w"
+            )
+            obj = xr.open_zarr(temp_store, decode_coords="all")["stack"].rename(name)
+        return obj.chunk(target)
+
+    def stats(self, percentiles: Sequence[float] = None) -> xr.DataArray:
         """Compute timeseries statistics.
 
-        Reduces the object along the y and x dimensions. Reduction
-        methods (stats methods) are applied sequentially, first along
-        the y and then along the x dimension.
+        Reduces the object along the y and x dimensions, skipping NaNs.
+        All statistics are computed together in one pass over each
+        image: the mean and standard deviation from the valid pixels,
+        and the min, max, median and percentiles from one partition of
+        them. Dask-backed objects are reduced image by image, so images
+        split over several spatial chunks are first rechunked into one.
+
+        Parameters
+        ----------
+        percentiles : sequence of float, optional
+            Percentiles (between 0 and 100) to compute in addition to
+            the default statistics, e.g [10, 90]. Percentiles are
+            linearly interpolated, as in `np.nanpercentile`.
 
         Returns
         -------
         stats_xr : xr.DataArray
             A 3D DataArray containing time, band and stats dimensions.
             The computed statistics accessible as named coordinates in the
-            "stats" dimension.
+            "stats" dimension: "mean", "median", "max", "min", "std" and
+            "p<percentile>" for each percentile (e.g "p10").
+
+        Raises
+        ------
+        ValueError
+            If a percentile is not between 0 and 100.
         """
-        dims = ["y", "x"]
-        stat_funcs = ["mean", "median", "max", "min", "std"]
-        stats = {}
-        for func_n in stat_funcs:
-            func = getattr(self._obj, func_n)
-            res = func(dim=dims, skipna=True)
-            stats[func.__name__] = res
-
-        stats_xr = xr.concat(stats.values(), dim=pd.Index(stats.keys(), name="stats"))
-        return stats_xr
+        obj = self._obj
+        percentiles = [] if percentiles is None else list(percentiles)
+        for p in percentiles:
+            if not 0 <= p <= 100:
+                raise ValueError(
+                    f"percentiles must be between 0 and 100 ({p} provided)"
+                )
+        labels = STATS + [f"p{p:g}" for p in percentiles]
+        if np.issubdtype(obj.dtype, np.floating):
+            dtype = obj.dtype
+        else:
+            dtype = np.dtype(np.float64)
+
+        if obj.chunks is not None and any(
+            len(obj.chunksizes[dim]) > 1 for dim in SPATIAL_DIMS
+        ):
+            obj = obj.chunk({dim: -1 if dim in SPATIAL_DIMS else 1 for dim in obj.dims})
+        stats_xr = xr.apply_ufunc(
+            _stats_kernel,
+            obj,
+            input_core_dims=[SPATIAL_DIMS],
+            output_core_dims=[["stats"]],
+            kwargs={"q": np.asarray(percentiles) / 100, "out_dtype": dtype},
+            dask="parallelized",
+            output_dtypes=[dtype],
+            dask_gufunc_kwargs={"output_sizes": {"stats": len(labels)}},
+        )
+        return stats_xr.transpose("stats", ...).assign_coords(stats=labels)
+
+
+def _in_sorted(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Mask of values found in sorted_values, by binary search"""
+    if sorted_values.size == 0:
+        return np.zeros(values.shape, dtype=bool)
+    positions = np.searchsorted(sorted_values, values)
+    positions = np.clip(positions, 0, sorted_values.size - 1)
+    return sorted_values[positions] == values
+
+
+def _stats_kernel(values: np.ndarray, q: np.ndarray, out_dtype: np.dtype):
+    """The STATS and q quantiles of each image in values, ignoring NaNs.
+
+    Images are the last two axes of values. The statistics are returned
+    along a new last axis, in the order of STATS and then q.
+    """
+    images = values.reshape(-1, values.shape[-2] * values.shape[-1])
+    out = np.full((images.shape[0], len(STATS) + len(q)), np.nan, dtype=out_dtype)
+    quantiles = np.concatenate([[0.5], q])
+    for i, image in enumerate(images):
+        # Boolean indexing and astype copy, so valid can be partitioned
+        if image.dtype.kind == "f":
+            valid = image[~np.isnan(image)]
+        else:
+            valid = image.astype(out_dtype)
+        n = valid.size
+        if n == 0:
+            continue
+        mean = valid.mean()
+        std = np.sqrt(np.square(valid - mean).mean())
+
+        # One partition places the min, max and the neighbours of every
+        # quantile at their sorted positions
+        position = quantiles * (n - 1)
+        lower = np.floor(position).astype(int)
+        upper = np.ceil(position).astype(int)
+        valid.partition(np.unique(np.concatenate([[0, n - 1], lower, upper])))
+        interpolated = valid[lower] + (valid[upper] - valid[lower]) * (position - lower)
+        out[i, : len(STATS)] = [mean, interpolated[0], valid[n - 1], valid[0], std]
+        out[i, len(STATS) :] = interpolated[1:]
+    return out.reshape(values.shape[:-2] + (out.shape[-1],))
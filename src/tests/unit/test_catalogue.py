@@ -0,0 +1,89 @@
+import json
+import subprocess
+import sys
+from types import MappingProxyType
+
+import pytest
+
+from spectral_recovery._catalogue import (
+    SR_INDICES,
+    build_catalogue,
+    catalogue,
+    write_catalogue,
+    _read_resource,
+)
+from spectral_recovery.indices import _split_indices_by_source
+
+
+class TestCatalogue:
+
+    def test_snapshot_matches_installed_spyndex(self):
+        # Regenerate with `python -m spectral_recovery._catalogue` if this fails
+        assert _read_resource("catalogue.json") == build_catalogue()
+
+    def test_write_catalogue_round_trips(self, tmp_path):
+        path = tmp_path / "catalogue.json"
+        write_catalogue(path)
+        with open(path) as f:
+            assert json.load(f) == build_catalogue()
+
+    def test_catalogue_is_loaded_once(self):
+        assert catalogue() is catalogue()
+
+    def test_catalogue_is_immutable(self):
+        cat = catalogue()
+        assert isinstance(cat.bands, tuple)
+        for name in ["band_set", "indices", "supported_indices"]:
+            assert isinstance(getattr(cat, name), frozenset)
+        for name in [
+            "common_names",
+            "domains",
+            "index_bands",
+            "formulas",
+            "constant_defaults",
+        ]:
+            assert isinstance(getattr(cat, name), MappingProxyType)
+        with pytest.raises(TypeError):
+            cat.domains["NDVI"] = "water"
+
+    def test_supported_indices_by_domain(self):
+        cat = catalogue()
+        assert {"NBR", "NDVI", "EVI"} <= cat.supported_indices
+        assert set(SR_INDICES) <= cat.supported_indices
+        assert cat.domains["NDWI"] == "water"
+        assert "NDWI" not in cat.supported_indices
+
+    def test_index_bands_and_formulas(self):
+        cat = catalogue()
+        assert cat.index_bands["NDVI"] == ("N", "R")
+        assert cat.formulas["NDVI"] == "(N-R)/(N+R)"
+        assert cat.common_names["G"] == "green"
+
+    def test_validation_does_not_import_spyndex(self):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys\n"
+                "from spectral_recovery._config import SUPPORTED_INDICES\n"
+                "from spectral_recovery._utils import common_and_long_to_short\n"
+                "common_and_long_to_short(['G', 'N'])\n"
+                "print('NBR' in SUPPORTED_INDICES, 'spyndex' in sys.modules)",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "True False"
+
+
+class TestSplitIndicesBySource:
+
+    def test_splits_spyndex_and_sr_indices(self):
+        spx_list, sr_list = _split_indices_by_source(["NBR", "GCI", "NDVI", "TCW"])
+        assert spx_list == ["NBR", "NDVI"]
+        assert sr_list == ["GCI", "TCW"]
+
+    def test_unknown_index_throws_value_error(self):
+        with pytest.raises(ValueError, match="not_an_index"):
+            _split_indices_by_source(["NBR", "not_an_index"])
@@ -0,0 +1,99 @@
+import threading
+
+import dask
+import dask.array as da
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from shapely.geometry import box
+
+from spectral_recovery.metrics import compute_metrics
+from spectral_recovery.targets import historic, reference
+
+
+class CountingArray:
+    """Array-like that records the blocks dask reads from it."""
+
+    def __init__(self, data):
+        self.data = data
+        self.shape = data.shape
+        self.dtype = data.dtype
+        self.ndim = data.ndim
+        self.reads = set()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        values = self.data[key]
+        # dask reads empty slices to infer the array's meta
+        if values.size:
+            with self._lock:
+                self.reads.add(repr(key))
+        return values
+
+
+@pytest.fixture()
+def source():
+    """40 years of 4x4 tiles of 10x10 pixels, one chunk per year and tile"""
+    rng = np.random.default_rng(0)
+    return CountingArray(rng.random((1, 40, 40, 40)))
+
+
+@pytest.fixture()
+def stack(source):
+    return xr.DataArray(
+        da.from_array(source, chunks=(1, 1, 10, 10)),
+        dims=["band", "time", "y", "x"],
+        coords={
+            "band": ["NBR"],
+            "time": pd.date_range("1990", periods=40, freq="YS"),
+            "y": np.arange(40)[::-1] + 0.5,
+            "x": np.arange(40) + 0.5,
+        },
+    ).rio.write_crs("EPSG:3348")
+
+
+@pytest.fixture()
+def site():
+    # Within a single tile
+    return gpd.GeoDataFrame(
+        {"dist_start": [2000], "rest_start": [2001]},
+        geometry=[box(2, 2, 6, 6)],
+        crs="EPSG:3348",
+    )
+
+
+def _reads(source, result) -> int:
+    with dask.config.set(scheduler="synchronous"):
+        dask.compute(result)
+    return len(source.reads)
+
+
+class TestSourceChunksPerSite:
+    """Only the chunks of a site's tile and required years are read."""
+
+    def test_dnbr_reads_timestep_years(self, source, stack, site):
+        result = compute_metrics(stack, site, ["dNBR"], timestep=5)
+        assert _reads(source, result) == 2
+
+    def test_y2r_reads_recovery_window(self, source, stack, site):
+        result = compute_metrics(
+            stack, site, ["Y2R"], recovery_target=stack.isel(time=0, drop=True)
+        )
+        # 2001-2029, and 1990 for the target
+        assert _reads(source, result) == 30
+
+    @pytest.mark.parametrize("scale", ["polygon", "pixel"])
+    def test_historic_median_reads_reference_years(self, source, stack, site, scale):
+        result = historic.median(site, stack, {0: [1995, 1999]}, scale)
+        assert _reads(source, result) == 5
+
+    def test_historic_window_reads_reference_years(self, source, stack, site):
+        result = historic.window(site, stack, {0: [1995, 1999]})
+        assert _reads(source, result) == 5
+
+    def test_reference_median_reads_reference_years(self, source, stack, site):
+        result = reference.median(site, stack, 1995, 1999)
+        assert _reads(source, result) == 5
@@ -0,0 +1,96 @@
+import re
+import subprocess
+import sys
+
+import pytest
+import spyndex as spx
+
+import spectral_recovery
+
+# Slow to import, and only needed by some functions
+HEAVY_MODULES = ["spyndex", "matplotlib", "seaborn", "prettytable", "ee"]
+
+
+def _run(script: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+class TestLazyImport:
+
+    def test_import_does_not_load_heavy_dependencies(self):
+        result = _run(
+            "import sys, spectral_recovery\n"
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+        )
+        assert result.stdout.strip() == "[]"
+
+    def test_import_time_benchmark(self, record_property):
+        # -X importtime reports the cumulative import time in us of every
+        # module, e.g "import time:  self | cumulative | spectral_recovery".
+        # The time is recorded (see `pytest --junitxml`) rather than
+        # bounded, since wall-clock time varies between machines.
+        stderr = _run("import spectral_recovery").stderr
+        times = {
+            m.group(2): int(m.group(1))
+            for m in re.finditer(r"\|\s*(\d+) \|\s*([\w.]+)\s*$", stderr, re.M)
+        }
+        record_property("import_time_us", times["spectral_recovery"])
+        assert not set(HEAVY_MODULES) & set(times)
+
+    def test_timeseries_does_not_import_targets(self):
+        result = _run(
+            "import sys, spectral_recovery.timeseries\n"
+            "print('spectral_recovery.targets' in sys.modules)"
+        )
+        assert result.stdout.strip() == "False"
+
+    def test_function_import_loads_its_dependencies(self):
+        result = _run(
+            "import sys\n"
+            "from spectral_recovery import compute_indices\n"
+            "print('spyndex' in sys.modules, 'spectral_recovery.plotting' in sys.modules)"
+        )
+        assert result.stdout.strip() == "True False"
+
+    @pytest.mark.parametrize(
+        "name, module",
+        [
+            ("read_timeseries", "spectral_recovery.io.raster"),
+            ("compute_indices", "spectral_recovery.indices"),
+            ("compute_metrics", "spectral_recovery.metrics"),
+            ("plot_spectral_trajectory", "spectral_recovery.plotting"),
+        ],
+    )
+    def test_public_functions_resolve(self, name, module):
+        assert getattr(spectral_recovery, name).__module__ == module
+
+    def test_target_modules_resolve(self):
+        from spectral_recovery import historic, reference
+
+        assert historic.__name__ == "spectral_recovery.targets.historic"
+        assert reference.__name__ == "spectral_recovery.targets.reference"
+
+    def test_unknown_attribute_throws_attribute_error(self):
+        with pytest.raises(AttributeError, match="has no attribute 'missing'"):
+            spectral_recovery.missing
+
+    def test_lazy_catalogues_match_spyndex(self):
+        from spectral_recovery._config import STANDARD_BANDS, SUPPORTED_INDICES
+        from spectral_recovery.io.raster import COMMON_LONG_SHORT_DICT
+
+        assert STANDARD_BANDS == list(spx.bands)
+        assert {"NBR", "NDVI", "GCI", "TCW"} <= set(SUPPORTED_INDICES)
+        assert COMMON_LONG_SHORT_DICT["green"] == "G"
+        assert COMMON_LONG_SHORT_DICT["green1"] == "G1"
+
+    def test_spyndex_band_names_not_mutated(self):
+        from spectral_recovery.io import raster
+
+        raster.BANDS_TABLE
+        assert spx.bands["G1"].common_name == "green"
+        assert spx.bands["RE1"].common_name == "rededge"
@@ -3,26 +3,35 @@ import pytest
 import xarray as xr
 import numpy as np
 import spyndex as spx
+import pandas as pd
 
 from typing import List
 
 from unittest.mock import patch
+from numpy.testing import assert_array_equal
 
 from spectral_recovery._config import REQ_DIMS
 from spectral_recovery.indices import (
     compute_indices,
     INDEX_CONSTANT_DEFAULTS,
+    TCB,
     TCW,
     TCG,
     GCI,
+    TC_COEFFICIENTS,
+    ENGINES,
+    tasselled_cap,
     _split_indices_by_source
 )
+from spectral_recovery._index_engine import _compile_kernel
+from spectral_recovery.io import raster
+from spectral_recovery.io.raster import read_timeseries
 
 def bands_from_index(indices: List[str]):
     """Return list of bands used in an index"""
     bands = []
     for index in indices: 
-        if index in ["TCW", "TCG", "GCI"]:
+        if index in ["TCB", "TCW", "TCG", "GCI"]:
             continue     
         for b in spx.indices[index].bands:
             if b in list(spx.bands) and b not in bands:
@@ -34,7 +43,7 @@ def constants_from_index(indices: List[str]):
     """Return list of constants used in an index"""
     constants = []
     for index in indices:
-        if index in ["TCW", "TCG", "GCI"]:
+        if index in ["TCB", "TCW", "TCG", "GCI"]:
             continue
         for b in spx.indices[index].bands:
             if b in list(spx.constants) and b not in constants:
@@ -242,6 +251,283 @@ class TestComputeIndices:
         with pytest.raises(ValueError):
             result = compute_indices(data, [index])
 
+class TestFusedEngine:
+
+    @pytest.fixture()
+    def stack(self):
+        bands = ["B", "G", "R", "N", "S1", "S2"]
+        rng = np.random.default_rng(0)
+        return xr.DataArray(
+            rng.random((len(bands), 2, 6, 8)),
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": bands,
+                "time": [0, 1],
+                "y": np.arange(6),
+                "x": np.arange(8),
+            },
+        ).rio.write_crs("EPSG:3348")
+
+    @pytest.mark.parametrize(
+        "index",
+        [
+            ["NDVI"],
+            ["NBR", "EVI", "SAVI", "NDMI"],
+            ["GCI", "NDVI", "TCW", "TCG"],
+        ],
+    )
+    def test_matches_spyndex_engine(self, stack, index):
+        constants = {"L": 0.5}
+        expected = compute_indices(stack, index, constants=constants)
+        result = compute_indices(stack, index, constants=constants, engine="fused")
+        xr.testing.assert_identical(result, expected)
+
+    @pytest.mark.parametrize("tc_sensor", ["oli", "etm+", "tm"])
+    def test_tasselled_cap_matches_spyndex_engine(self, stack, tc_sensor):
+        index = ["TCW", "GCI", "TCB", "NDVI"]
+        expected = compute_indices(stack, index, tc_sensor=tc_sensor)
+        result = compute_indices(stack, index, engine="fused", tc_sensor=tc_sensor)
+        xr.testing.assert_identical(result, expected)
+        assert list(result.band.values) == ["NDVI", "TCW", "GCI", "TCB"]
+
+    def test_dask_stack_stays_lazy_and_matches(self, stack):
+        index = ["NDVI", "EVI", "TCG"]
+        result = compute_indices(
+            stack.chunk({"y": 3, "x": 4}), index, engine="fused"
+        )
+        assert result.chunks is not None
+        xr.testing.assert_identical(
+            result.compute(), compute_indices(stack, index, engine="fused")
+        )
+
+    def test_float32_stack_keeps_dtype(self, stack):
+        result = compute_indices(stack.astype("float32"), ["NDVI", "TCW"], engine="fused")
+        assert result.dtype == np.float32
+
+    def test_missing_bands_throws_key_error(self, stack):
+        with pytest.raises(KeyError, match="Missing 'S2' in the parameters for NBR"):
+            compute_indices(stack.drop_sel(band="S2"), ["NBR"], engine="fused")
+
+    def test_shared_terms_evaluated_once(self):
+        formulas = tuple(
+            (i, spx.indices[i].formula) for i in ["NDVI", "EVI", "SAVI"]
+        )
+        kernel = _compile_kernel(formulas, ("B", "N", "R"), ("g", "C1", "C2", "L"))
+        assert kernel.source.count("N - R") == 1
+        assert kernel.source.count("N + R") == 1
+
+    def test_commuted_terms_are_shared(self):
+        formulas = (("A", "(N + R) * 2"), ("B", "(R + N) / 2"))
+        kernel = _compile_kernel(formulas, ("N", "R"), ())
+        assert kernel.source.count("N + R") + kernel.source.count("R + N") == 1
+        N, R = np.array([0.1, 0.7]), np.array([0.3, 0.2])
+        assert_array_equal(
+            kernel(N, R, out_dtype=float), np.stack([(N + R) * 2, (R + N) / 2], axis=-1)
+        )
+
+    def test_invalid_engine_throws_value_error(self, stack):
+        with pytest.raises(ValueError, match="engine must be one of"):
+            compute_indices(stack, ["NDVI"], engine="numba")
+
+
+class TestPrecision:
+
+    @pytest.fixture()
+    def stack(self):
+        bands = ["B", "G", "R", "N", "S1", "S2"]
+        rng = np.random.default_rng(0)
+        # Reflectances, as read from TIFs by read_timeseries
+        return xr.DataArray(
+            rng.uniform(0.01, 0.6, (len(bands), 2, 6, 8)),
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": bands,
+                "time": [0, 1],
+                "y": np.arange(6),
+                "x": np.arange(8),
+            },
+        ).rio.write_crs("EPSG:3348")
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_float32_within_tolerance_of_float64(self, stack, engine):
+        index = ["NDVI", "SAVI", "NBR", "NDMI", "GCI", "TCW", "TCB"]
+        constants = {"L": np.float64(0.5)}
+        expected = compute_indices(stack, index, constants=constants, engine=engine)
+        result = compute_indices(
+            stack, index, constants=constants, engine=engine, precision="float32"
+        )
+        assert expected.dtype == np.float64
+        assert result.dtype == np.float32
+        np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-6)
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_float32_dataset_variables(self, stack, engine):
+        result = compute_indices(
+            stack, ["EVI", "GCI", "TCG"], engine=engine, precision="float32", as_dataset=True
+        )
+        for i in result.data_vars:
+            assert result[i].dtype == np.float32
+
+    def test_float64_casts_float32_stack(self, stack):
+        result = compute_indices(
+            stack.astype("float32"), ["NDVI", "TCW"], engine="fused", precision="float64"
+        )
+        assert result.dtype == np.float64
+
+    def test_invalid_precision_throws_value_error(self, stack):
+        with pytest.raises(ValueError, match="precision must be one of"):
+            compute_indices(stack, ["NDVI"], precision="float16")
+
+
+class TestAsDataset:
+
+    @pytest.fixture()
+    def stack(self):
+        bands = ["B", "G", "R", "N", "S1", "S2"]
+        rng = np.random.default_rng(0)
+        return xr.DataArray(
+            rng.random((len(bands), 2, 6, 8)),
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": bands,
+                "time": [0, 1],
+                "y": np.arange(6),
+                "x": np.arange(8),
+            },
+        ).rio.write_crs("EPSG:3348")
+
+    @pytest.mark.parametrize("engine", ENGINES)
+    @pytest.mark.parametrize(
+        "index", [["NDVI"], ["GCI"], ["NBR", "TCW", "GCI", "TCG", "EVI"]]
+    )
+    def test_variables_match_band_stack(self, stack, engine, index):
+        expected = compute_indices(stack, index, engine=engine)
+        result = compute_indices(stack, index, engine=engine, as_dataset=True)
+        assert isinstance(result, xr.Dataset)
+        assert list(result.data_vars) == list(expected.band.values)
+        for i in result.data_vars:
+            # np.str_ subclasses str, so check the exact type
+            assert type(i) is str
+            assert result[i].dims == ("time", "y", "x")
+            assert_array_equal(result[i].values, expected.sel(band=i).values)
+
+    def test_spyndex_engine_keeps_dtype_per_index(self, stack):
+        result = compute_indices(
+            stack.astype("float32"), ["NDVI", "GCI"], as_dataset=True
+        )
+        assert result["NDVI"].dtype == np.float32
+        assert result["GCI"].dtype == np.float32
+
+
+class TestOut:
+
+    @pytest.fixture()
+    def stack(self):
+        bands = ["B", "G", "R", "N", "S1", "S2"]
+        rng = np.random.default_rng(0)
+        return xr.DataArray(
+            rng.random((len(bands), 3, 6, 8)),
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": bands,
+                "time": pd.date_range("2010", "2012", freq="YS"),
+                "y": np.arange(6)[::-1] + 0.5,
+                "x": np.arange(8) + 0.5,
+            },
+        ).rio.write_crs("EPSG:3348")
+
+    @pytest.mark.parametrize("out_format", ["zarr", "cog"])
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_written_indices_match_in_memory(self, stack, tmp_path, out_format, engine):
+        if out_format == "zarr":
+            pytest.importorskip("zarr")
+        index = ["NBR", "TCW", "GCI"]
+        expected = compute_indices(stack, index, engine=engine)
+        result = compute_indices(
+            stack, index, engine=engine, out=str(tmp_path / "out"), out_format=out_format
+        )
+        assert result.chunks is not None
+        assert list(result.band.values) == index
+        assert result.rio.crs == stack.rio.crs
+        assert_array_equal(result.values, expected.values)
+
+    @pytest.mark.parametrize("out_format", ["zarr", "cog"])
+    def test_as_dataset_reads_one_variable_per_index(self, stack, tmp_path, out_format):
+        if out_format == "zarr":
+            pytest.importorskip("zarr")
+        result = compute_indices(
+            stack,
+            ["NDVI", "TCG"],
+            as_dataset=True,
+            out=str(tmp_path / "out"),
+            out_format=out_format,
+        )
+        assert list(result.data_vars) == ["NDVI", "TCG"]
+        assert result["NDVI"].dims == ("time", "y", "x")
+
+    def test_cogs_readable_per_index(self, stack, tmp_path):
+        compute_indices(stack, ["NBR", "NDVI"], out=str(tmp_path), out_format="cog")
+        assert sorted(p.name for p in (tmp_path / "NBR").iterdir()) == [
+            "2010.tif",
+            "2011.tif",
+            "2012.tif",
+        ]
+        nbr = read_timeseries(str(tmp_path / "NBR"))
+        assert list(nbr.band.values) == ["NBR"]
+
+    def test_interrupted_zarr_resumes_from_incomplete_year(self, stack, tmp_path):
+        pytest.importorskip("zarr")
+        out = str(tmp_path / "out.zarr")
+        expected = compute_indices(stack, ["NBR", "NDVI"])
+        set_complete = raster._set_complete
+
+        def interrupt_second_year(out, years):
+            # Fail before the second year is flagged complete
+            if years.start == 1:
+                raise KeyboardInterrupt
+            set_complete(out, years)
+
+        with patch(
+            "spectral_recovery.io.raster._set_complete",
+            side_effect=interrupt_second_year,
+        ):
+            with pytest.raises(KeyboardInterrupt):
+                compute_indices(stack, ["NBR", "NDVI"], out=out)
+        with patch(
+            "spectral_recovery.io.raster._set_complete",
+            wraps=set_complete,
+        ) as set_complete_mock:
+            result = compute_indices(stack, ["NBR", "NDVI"], out=out)
+        assert [c.args[1] for c in set_complete_mock.call_args_list] == [
+            slice(1, 2),
+            slice(2, 3),
+        ]
+        assert_array_equal(result.values, expected.values)
+
+    def test_existing_cogs_kept_on_resume(self, stack, tmp_path):
+        compute_indices(stack, ["NBR"], out=str(tmp_path), out_format="cog")
+        kept = tmp_path / "NBR" / "2010.tif"
+        mtime = kept.stat().st_mtime_ns
+        (tmp_path / "NBR" / "2011.tif").unlink()
+        compute_indices(stack, ["NBR"], out=str(tmp_path), out_format="cog")
+        assert kept.stat().st_mtime_ns == mtime
+        assert (tmp_path / "NBR" / "2011.tif").exists()
+
+    @pytest.mark.parametrize("out_format", ["zarr", "cog"])
+    def test_changed_stack_overwrites_out(self, stack, tmp_path, out_format):
+        if out_format == "zarr":
+            pytest.importorskip("zarr")
+        out = str(tmp_path / "out")
+        compute_indices(stack, ["NDVI"], out=out, out_format=out_format)
+        result = compute_indices(stack * 2, ["GCI"], out=out, out_format=out_format)
+        expected = compute_indices(stack * 2, ["GCI"])
+        assert_array_equal(result.values, expected.values)
+
+    def test_invalid_out_format_throws_value_error(self, stack, tmp_path):
+        with pytest.raises(ValueError, match="out_format must be one of"):
+            compute_indices(stack, ["NDVI"], out=str(tmp_path), out_format="netcdf")
+
+
 class TestSplitIndices:
     def test_only_spx_returns_empty_sr(self):
         indices = ["SR", "NDVI"]
@@ -347,3 +633,55 @@ class TestTCG:
         with pytest.raises(KeyError) as keyerr:
             TCG(params_dict=params_dict)
         assert "'B'" in str(keyerr.value)
+
+
+class TestTCB:
+    def test_returns_correct_values(self):
+        params_dict = {
+            "B": xr.DataArray([0.1]),
+            "G": xr.DataArray([0.2]),
+            "R": xr.DataArray([0.3]),
+            "N": xr.DataArray([0.4]),
+            "S1": xr.DataArray([0.5]),
+            "S2": xr.DataArray([0.6]),
+        }
+        expected = xr.DataArray(
+            [[0.3029 * 0.1 + 0.2786 * 0.2 + 0.4733 * 0.3 + 0.5599 * 0.4 + 0.508 * 0.5 + 0.1872 * 0.6]],
+            dims=["band", "dim_0"],
+            coords={"band": ["TCB"]},
+        )
+
+        output = TCB(params_dict=params_dict)
+
+        xr.testing.assert_equal(output, expected)
+
+
+class TestTasselledCap:
+
+    @pytest.fixture()
+    def params_dict(self):
+        rng = np.random.default_rng(0)
+        return {
+            b: xr.DataArray(rng.random((3, 4)), dims=["y", "x"])
+            for b in ["B", "G", "R", "N", "S1", "S2"]
+        }
+
+    @pytest.mark.parametrize("sensor", ["oli", "etm+", "tm"])
+    def test_matches_weighted_sums(self, params_dict, sensor):
+        result = tasselled_cap(params_dict, sensor=sensor)
+        assert list(result.band.values) == ["TCB", "TCG", "TCW"]
+        for component, weights in zip(["TCB", "TCG", "TCW"], TC_COEFFICIENTS[sensor]):
+            expected = weights[0] * params_dict["B"]
+            for w, b in zip(weights[1:], ["G", "R", "N", "S1", "S2"]):
+                expected = expected + w * params_dict[b]
+            xr.testing.assert_equal(result.sel(band=component, drop=True), expected)
+
+    def test_float32_bands_keep_dtype(self, params_dict):
+        params_dict = {b: v.astype("float32") for b, v in params_dict.items()}
+        result = tasselled_cap(params_dict, ["TCW"])
+        assert result.dtype == np.float32
+        xr.testing.assert_equal(result, TCW(params_dict))
+
+    def test_invalid_sensor_throws_value_error(self, params_dict):
+        with pytest.raises(ValueError, match="sensor must be one of"):
+            tasselled_cap(params_dict, sensor="msi")
@@ -308,6 +308,29 @@ class TestReadTimeseriesBandNames:
         )
         assert np.all(stacked_tifs["band"].data == expected_bands)
 
+    @patch(
+        "rioxarray.open_rasterio",
+    )
+    @patch("spectral_recovery.io.raster._get_tifs_from_dir")
+    def test_correct_band_from_single_band_tifs_with_long_name(
+        self, mocked_get_tifs, mocked_rasterio_open, filenames
+    ):
+        # rioxarray gives a single band's description as a str
+        rasterio_return = xr.DataArray(
+            [[[[0]]]],
+            dims=["band", "time", "y", "x"],
+            coords={"band": [1]},
+            attrs={"long_name": "NBR"},
+        )
+        mocked_get_tifs.return_value = filenames
+        mocked_rasterio_open.return_value = rasterio_return
+
+        stacked_tifs = read_timeseries(
+            path_to_tifs="a/dir",
+            array_type="numpy",
+        )
+        assert np.all(stacked_tifs["band"].data == ["NBR"])
+
     @patch(
         "rioxarray.open_rasterio",
     )
@@ -552,6 +575,39 @@ class TestReadTimeseriesDictInput:
         )
         assert output_ts.equals(excepted_output)
 
+    @pytest.mark.parametrize(
+        "years",
+        [[2015, 2017], {0: [2015], 1: [2017]}],
+        ids=["iterable", "site_dict"],
+    )
+    @patch(
+        "rioxarray.open_rasterio",
+    )
+    def test_years_skips_unrequested_tifs(self, rasterio_mock, years):
+        path_dict = {
+            2015: "path/to/some_file.tif",
+            2016: "path/to/another.tif",
+            2017: "path/to/last.tif",
+        }
+        bands = {0: "blue"}
+        rasterio_mock.return_value = xr.DataArray([[[0.0]]], dims=["band", "y", "x"])
+        output_ts = read_timeseries(
+            path_to_tifs=path_dict, band_names=bands, array_type="numpy", years=years
+        )
+        assert rasterio_mock.call_count == 2
+        assert list(output_ts.time.dt.year.values) == [2015, 2017]
+
+    @patch(
+        "rioxarray.open_rasterio",
+    )
+    def test_no_requested_years_throws_value_err(self, rasterio_mock):
+        path_dict = {2015: "path/to/some_file.tif"}
+        with pytest.raises(ValueError, match="No TIFs found for the requested years"):
+            read_timeseries(
+                path_to_tifs=path_dict, band_names={0: "blue"}, years=[2020]
+            )
+        rasterio_mock.assert_not_called()
+
 
 class TestValidYearStr:
 
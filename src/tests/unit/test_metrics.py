@@ -17,6 +17,10 @@ from spectral_recovery.metrics import (
     r80p,
     METRIC_FUNCS,
     compute_metrics,
+    compute_pixel_metrics,
+    required_years,
+    has_no_missing_years,
+    _year_index,
 )
 
 
@@ -310,6 +314,599 @@ class TestComputeMetrics:
             xr.testing.assert_equal(call2["recovery_target"], valid_rt)
 
 
+    def test_invalid_scale_throws_value_err(self, valid_array, valid_frame):
+        with pytest.raises(ValueError, match="scale must be 'polygon' or 'pixel'"):
+            compute_metrics(
+                timeseries_data=valid_array,
+                restoration_polygons=valid_frame,
+                metrics=["dNBR"],
+                scale="not_a_scale",
+            )
+
+    def test_out_with_polygon_scale_throws_value_err(
+        self, valid_array, valid_frame, tmp_path
+    ):
+        with pytest.raises(ValueError, match="out requires scale='pixel'"):
+            compute_metrics(
+                timeseries_data=valid_array,
+                restoration_polygons=valid_frame,
+                metrics=["dNBR"],
+                scale="polygon",
+                out=str(tmp_path / "metrics.zarr"),
+            )
+
+    def test_out_writes_wall_to_wall_metrics(self, valid_array, valid_frame, tmp_path):
+        pytest.importorskip("zarr")
+        expected = compute_metrics(
+            timeseries_data=valid_array,
+            restoration_polygons=valid_frame,
+            metrics=["dNBR"],
+            timestep=1,
+        )[0]
+        result = compute_metrics(
+            timeseries_data=valid_array.chunk({"y": 1}),
+            restoration_polygons=valid_frame,
+            metrics=["dNBR"],
+            timestep=1,
+            out=str(tmp_path / "metrics.zarr"),
+        ).compute()
+        assert result.dims == ("metric", "band", "y", "x")
+        xr.testing.assert_allclose(
+            result.sel(y=expected.y, x=expected.x).drop_vars(
+                "spatial_ref", errors="ignore"
+            ),
+            expected.drop_vars("spatial_ref", errors="ignore"),
+        )
+
+    def test_out_with_overlapping_sites_throws_value_err(self, valid_array, tmp_path):
+        sites = gpd.GeoDataFrame(
+            {
+                "dist_start": [2011, 2012, 2011],
+                "rest_start": [2012, 2013, 2012],
+                "geometry": [
+                    Polygon([(0, 0), (0, 1), (1, 1), (1, 0)]),
+                    Polygon([(0.5, 0), (0.5, 1), (1.5, 1), (1.5, 0)]),
+                    # Only shares an edge with the first site
+                    Polygon([(-1, 0), (-1, 1), (0, 1), (0, 0)]),
+                ],
+            },
+            index=[3, 5, 7],
+            crs="EPSG:4326",
+        )
+        with pytest.raises(ValueError, match=r"overlapping sites: \[\(3, 5\)\]"):
+            compute_metrics(
+                timeseries_data=valid_array,
+                restoration_polygons=sites,
+                metrics=["dNBR"],
+                timestep=1,
+                out=str(tmp_path / "metrics.zarr"),
+            )
+        assert not (tmp_path / "metrics.zarr").exists()
+
+    def test_polygon_scale_passes_median_trajectory(self, valid_array, valid_frame):
+        metric_mock = Mock()
+        metric_mock.return_value = xr.DataArray([0.0, 0.0], dims=["band"])
+        clipped_array = valid_array.rio.clip(valid_frame["geometry"].values)
+
+        with patch.dict(
+            "spectral_recovery.metrics.METRIC_FUNCS", {"dnbr": metric_mock}
+        ):
+            compute_metrics(
+                timeseries_data=valid_array,
+                restoration_polygons=valid_frame,
+                metrics=["dNBR"],
+                scale="polygon",
+            )
+
+        passed_ts = metric_mock.call_args.kwargs["timeseries_data"]
+        assert passed_ts.dims == ("band", "time")
+        xr.testing.assert_equal(
+            passed_ts, clipped_array.median(dim=["y", "x"], skipna=True)
+        )
+
+    def test_polygon_scale_reduces_pixel_target(self, valid_array, valid_frame):
+        metric_mock = Mock()
+        metric_mock.return_value = xr.DataArray([0.0, 0.0], dims=["band"])
+        pixel_rt = valid_array.isel(time=0).drop_vars("time") * 2
+
+        with patch.dict(
+            "spectral_recovery.metrics.METRIC_FUNCS", {"r80p": metric_mock}
+        ):
+            compute_metrics(
+                timeseries_data=valid_array,
+                restoration_polygons=valid_frame,
+                metrics=["R80P"],
+                recovery_target=pixel_rt,
+                scale="polygon",
+            )
+
+        passed_rt = metric_mock.call_args.kwargs["recovery_target"]
+        assert passed_rt.dims == ("band",)
+        np.testing.assert_array_equal(passed_rt.data, [2.0, 2.0])
+
+    def test_polygon_scale_returns_one_value_per_band(self, valid_array, valid_frame):
+        trajectory = valid_array * xr.DataArray(
+            [1, 2, 3, 4, 5], dims=["time"], coords={"time": valid_array.time}
+        )
+        result = compute_metrics(
+            timeseries_data=trajectory,
+            restoration_polygons=valid_frame,
+            metrics=["dNBR", "YrYr"],
+            timestep=1,
+            scale="polygon",
+        )
+        assert result[0].dims == ("metric", "band")
+        np.testing.assert_array_equal(result[0].sel(metric="dNBR").data, [1.0, 1.0])
+        np.testing.assert_array_equal(result[0].sel(metric="YrYr").data, [1.0, 1.0])
+
+
+    def test_sequence_params_add_timestep_and_percent_dims(
+        self, valid_array, valid_frame, valid_rt
+    ):
+        result = compute_metrics(
+            timeseries_data=valid_array,
+            restoration_polygons=valid_frame,
+            metrics=["dNBR", "R80P"],
+            recovery_target=valid_rt,
+            timestep=[0, 1],
+            percent_of_target=[50, 100],
+        )
+        assert result[0].dims == ("metric", "timestep", "percent", "band", "y", "x")
+        assert list(result[0].timestep.values) == [0, 1]
+        assert list(result[0].percent.values) == [50, 100]
+        np.testing.assert_array_equal(
+            result[0].sel(metric="R80P", timestep=1).data[:, 0, 0, 0], [2.0, 1.0]
+        )
+        # dNBR does not depend on percent so it is broadcast along it
+        np.testing.assert_array_equal(result[0].sel(metric="dNBR").data, 0.0)
+
+
+    def test_all_timestep_returns_trajectory_per_site(self, valid_array, valid_rt):
+        multi_frame = gpd.GeoDataFrame(
+            {
+                "dist_start": [2010, 2011],
+                "rest_start": [2011, 2012],
+                "geometry": [self.valid_poly, self.valid_poly],
+            },
+            crs="EPSG:4326",
+        )
+        result = compute_metrics(
+            timeseries_data=valid_array,
+            restoration_polygons=multi_frame,
+            metrics=["dNBR", "Y2R"],
+            recovery_target=valid_rt,
+            timestep="all",
+        )
+        assert result[0].dims == (
+            "metric",
+            "years_since_restoration",
+            "band",
+            "y",
+            "x",
+        )
+        assert list(result[0].years_since_restoration.values) == [1, 2, 3]
+        # Site 1 starts a year later so has one less year of trajectory
+        assert result[1].sel(metric="dNBR", years_since_restoration=3).isnull().all()
+
+
+    def test_group_sites_computes_shared_dates_once(self, valid_array, valid_rt):
+        multi_frame = gpd.GeoDataFrame(
+            {
+                "dist_start": [2012, 2011, 2012],
+                "rest_start": [2013, 2012, 2013],
+                "geometry": [self.valid_poly, self.valid_poly, self.valid_poly],
+            },
+            crs="EPSG:4326",
+        )
+        dnbr_mock = Mock(wraps=dnbr)
+
+        with patch.dict("spectral_recovery.metrics.METRIC_FUNCS", {"dnbr": dnbr_mock}):
+            compute_metrics(
+                timeseries_data=valid_array,
+                restoration_polygons=multi_frame,
+                metrics=["dNBR"],
+                timestep=1,
+                group_sites=True,
+            )
+
+        assert dnbr_mock.call_count == 2
+        rest_starts = [c.kwargs["restoration_start"] for c in dnbr_mock.call_args_list]
+        assert sorted(rest_starts) == [2012, 2013]
+
+    def test_group_sites_matches_per_site_results(self, valid_array, valid_rt):
+        multi_frame = gpd.GeoDataFrame(
+            {
+                "dist_start": [2011, 2011, 2010],
+                "rest_start": [2012, 2012, 2011],
+                "geometry": [
+                    Polygon([(-0.2, -0.2), (-0.2, 0.2), (0.2, 0.2), (0.2, -0.2)]),
+                    Polygon([(0.8, 0.8), (0.8, 1.2), (1.2, 1.2), (1.2, 0.8)]),
+                    self.valid_poly,
+                ],
+            },
+            crs="EPSG:4326",
+        )
+        ramp = valid_array.cumsum(dim="time") * xr.DataArray(
+            [[1, 2], [3, 4]], dims=["y", "x"]
+        )
+        kwargs = dict(
+            timeseries_data=ramp,
+            restoration_polygons=multi_frame,
+            metrics=["dNBR", "RRI", "R80P"],
+            recovery_target=valid_rt,
+            timestep=[1, 2],
+        )
+
+        per_site = compute_metrics(**kwargs)
+        grouped = compute_metrics(**kwargs, group_sites=True)
+
+        xr.testing.assert_identical(per_site, grouped)
+
+    def test_group_sites_with_dict_rt_computes_target_metrics_per_site(
+        self, valid_array, valid_rt
+    ):
+        multi_frame = gpd.GeoDataFrame(
+            {
+                "dist_start": [2012, 2012],
+                "rest_start": [2013, 2013],
+                "geometry": [self.valid_poly, self.valid_poly],
+            },
+            crs="EPSG:4326",
+        )
+        dnbr_mock = Mock(wraps=dnbr)
+        r80p_mock = Mock(wraps=r80p)
+        rt_dict = {0: valid_rt, 1: valid_rt * 2}
+
+        with patch.dict(
+            "spectral_recovery.metrics.METRIC_FUNCS",
+            {"dnbr": dnbr_mock, "r80p": r80p_mock},
+        ):
+            result = compute_metrics(
+                timeseries_data=valid_array,
+                restoration_polygons=multi_frame,
+                metrics=["dNBR", "R80P"],
+                recovery_target=rt_dict,
+                timestep=1,
+                group_sites=True,
+            )
+
+        assert dnbr_mock.call_count == 1
+        assert r80p_mock.call_count == 2
+        np.testing.assert_array_equal(result[0].sel(metric="R80P").data, 1.25)
+        np.testing.assert_array_equal(result[1].sel(metric="R80P").data, 0.625)
+
+    def test_dataset_matches_band_stack(self, valid_array, valid_frame, valid_rt):
+        ramp = valid_array.cumsum(dim="time") * xr.DataArray(
+            [[1, 2], [3, 4]], dims=["y", "x"]
+        )
+        kwargs = dict(
+            restoration_polygons=valid_frame,
+            metrics=["dNBR", "RRI", "R80P", "Y2R"],
+            recovery_target=valid_rt * 3,
+            timestep=1,
+        )
+
+        expected = compute_metrics(timeseries_data=ramp, **kwargs)
+        result = compute_metrics(timeseries_data=ramp.to_dataset(dim="band"), **kwargs)
+
+        xr.testing.assert_identical(result, expected)
+
+
+class TestComputePixelMetrics:
+
+    @pytest.fixture()
+    def ramp_array(self):
+        data = np.arange(2 * 6 * 2 * 2, dtype=float).reshape(2, 6, 2, 2) ** 1.5
+        xarr = xr.DataArray(
+            data,
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": ["N", "R"],
+                "time": pd.date_range("2010", "2015", freq="YS"),
+                "y": [0, 1],
+                "x": [0, 1],
+            },
+        )
+        return xarr.rio.write_crs("EPSG:4326")
+
+    @pytest.fixture()
+    def date_rasters(self, ramp_array):
+        dist = xr.DataArray(
+            [[2010.0, 2011.0], [2012.0, np.nan]],
+            dims=["y", "x"],
+            coords={"y": [0, 1], "x": [0, 1]},
+        ).rio.write_crs("EPSG:4326")
+        return dist, dist + 1
+
+    @pytest.mark.parametrize("metric", ["dNBR", "YrYr", "RRI", "R80P", "Y2R"])
+    def test_matches_single_year_metric_per_pixel(
+        self, ramp_array, date_rasters, metric
+    ):
+        dist, rest = date_rasters
+        rt = ramp_array.isel(time=-1).drop_vars("time")
+        result = compute_pixel_metrics(
+            timeseries_data=ramp_array,
+            disturbance_start=dist,
+            restoration_start=rest,
+            metrics=[metric],
+            recovery_target=rt,
+            timestep=2,
+        )
+        for y, x in [(0, 0), (0, 1), (1, 0)]:
+            expected = METRIC_FUNCS[metric.lower()](
+                disturbance_start=int(dist[y, x]),
+                restoration_start=int(rest[y, x]),
+                timeseries_data=ramp_array.isel(y=[y], x=[x]),
+                recovery_target=rt.isel(y=[y], x=[x]),
+                params={"timestep": 2, "percent_of_target": 80},
+            )
+            np.testing.assert_allclose(
+                result.sel(metric=metric).isel(y=[y], x=[x]).data, expected.data
+            )
+
+    def test_nan_dates_return_nan(self, ramp_array, date_rasters):
+        dist, rest = date_rasters
+        result = compute_pixel_metrics(
+            timeseries_data=ramp_array,
+            disturbance_start=dist,
+            restoration_start=rest,
+            metrics=["dNBR", "RRI"],
+            timestep=1,
+        )
+        assert result.dims == ("metric", "band", "y", "x")
+        assert result.isel(y=1, x=1).isnull().all()
+
+    def test_dask_input_matches_numpy(self, ramp_array, date_rasters):
+        dist, rest = date_rasters
+        kwargs = dict(
+            disturbance_start=dist,
+            restoration_start=rest,
+            metrics=["dNBR", "YrYr"],
+            timestep=[1, 2],
+        )
+        expected = compute_pixel_metrics(timeseries_data=ramp_array, **kwargs)
+        result = compute_pixel_metrics(
+            timeseries_data=ramp_array.chunk({"time": 2, "y": 1}), **kwargs
+        )
+        assert result.chunks is not None
+        xr.testing.assert_allclose(result.compute(), expected)
+
+    def test_misaligned_date_raster_throws_value_err(self, ramp_array, date_rasters):
+        dist, rest = date_rasters
+        with pytest.raises(ValueError, match="not aligned with timeseries_data"):
+            compute_pixel_metrics(
+                timeseries_data=ramp_array,
+                disturbance_start=dist.assign_coords(x=[5, 6]),
+                restoration_start=rest,
+                metrics=["dNBR"],
+            )
+
+    @pytest.mark.parametrize(
+        "timestep", [2, "all", [1, 2]], ids=["scalar", "all", "sequence"]
+    )
+    def test_out_of_core_matches_in_memory(
+        self, ramp_array, date_rasters, timestep, tmp_path
+    ):
+        pytest.importorskip("zarr")
+        dist, rest = date_rasters
+        kwargs = dict(
+            disturbance_start=dist,
+            restoration_start=rest,
+            metrics=["dNBR", "RRI", "Y2R"],
+            recovery_target=ramp_array.isel(time=-1).drop_vars("time"),
+            timestep=timestep,
+        )
+        expected = compute_pixel_metrics(timeseries_data=ramp_array, **kwargs)
+        result = compute_pixel_metrics(
+            timeseries_data=ramp_array.chunk({"y": 1}),
+            out=str(tmp_path / "metrics.zarr"),
+            **kwargs,
+        )
+        assert result.chunks is not None
+        assert (tmp_path / "metrics.zarr").exists()
+        xr.testing.assert_allclose(
+            result.compute().drop_vars("spatial_ref", errors="ignore"),
+            expected.drop_vars("spatial_ref", errors="ignore"),
+        )
+
+    @pytest.mark.parametrize(
+        "rest_years",
+        [[[np.nan, np.nan], [np.nan, np.nan]], [[2016.0, 2017.0], [2020.0, np.nan]]],
+        ids=["all_nan", "after_timeseries"],
+    )
+    def test_y2r_without_restoration_in_timeseries_returns_nan(
+        self, ramp_array, date_rasters, rest_years
+    ):
+        dist, _ = date_rasters
+        rest = dist.copy(data=rest_years)
+        result = compute_pixel_metrics(
+            timeseries_data=ramp_array,
+            disturbance_start=dist,
+            restoration_start=rest,
+            metrics=["Y2R"],
+            recovery_target=ramp_array.isel(time=-1).drop_vars("time"),
+            percent_of_target=[50, 80],
+        )
+        assert result.dims == ("metric", "percent", "band", "y", "x")
+        assert result.isnull().all()
+
+    @pytest.mark.parametrize("chunks", [None, {"x": 1}])
+    def test_y2r_with_restoration_before_timeseries(
+        self, ramp_array, tmp_path, chunks
+    ):
+        # Every pixel first reaches the target in 2014
+        stack = xr.zeros_like(ramp_array.isel(y=[0])) + (
+            ramp_array.time.dt.year >= 2014
+        )
+        rest = xr.DataArray(
+            [[2008.0, 2012.0]], dims=["y", "x"], coords={"y": [0], "x": [0, 1]}
+        ).rio.write_crs("EPSG:4326")
+        kwargs = {}
+        if chunks is not None:
+            pytest.importorskip("zarr")
+            stack = stack.chunk(chunks)
+            kwargs["out"] = str(tmp_path / "metrics.zarr")
+        result = compute_pixel_metrics(
+            timeseries_data=stack,
+            disturbance_start=rest - 1,
+            restoration_start=rest,
+            metrics=["Y2R"],
+            recovery_target=stack.isel(time=-1).drop_vars("time"),
+            **kwargs,
+        )
+        np.testing.assert_array_equal(
+            result.sel(metric="Y2R").isel(band=0, y=0), [6.0, 2.0]
+        )
+
+    def test_out_of_core_block_without_restoration_in_timeseries(
+        self, ramp_array, date_rasters, tmp_path
+    ):
+        pytest.importorskip("zarr")
+        dist, rest = date_rasters
+        # The second row of blocks only restores after the timeseries
+        rest = rest.copy(data=[[2011.0, 2012.0], [2016.0, np.nan]])
+        kwargs = dict(
+            disturbance_start=dist,
+            restoration_start=rest,
+            metrics=["Y2R"],
+            recovery_target=ramp_array.isel(time=-1).drop_vars("time"),
+        )
+        expected = compute_pixel_metrics(timeseries_data=ramp_array, **kwargs)
+        result = compute_pixel_metrics(
+            timeseries_data=ramp_array.chunk({"y": 1}),
+            out=str(tmp_path / "metrics.zarr"),
+            **kwargs,
+        ).compute()
+        assert result.isel(y=1).isnull().all()
+        assert result.isel(y=0).notnull().all()
+        xr.testing.assert_allclose(
+            result.drop_vars("spatial_ref", errors="ignore"),
+            expected.drop_vars("spatial_ref", errors="ignore"),
+        )
+
+
+class TestRequiredYears:
+
+    @pytest.fixture()
+    def sites(self):
+        return gpd.GeoDataFrame(
+            {
+                "dist_start": [2010, 2014],
+                "rest_start": [2011, 2016],
+                "geometry": [
+                    Polygon([(0, 0), (0, 1), (1, 1), (1, 0)]),
+                    Polygon([(1, 1), (1, 2), (2, 2), (2, 1)]),
+                ],
+            }
+        )
+
+    @pytest.mark.parametrize(
+        ("metrics", "timestep", "expected"),
+        [
+            (["dNBR"], 2, {0: [2011, 2013], 1: [2016, 2018]}),
+            (["YrYr"], [1, 2], {0: [2011, 2012, 2013], 1: [2016, 2017, 2018]}),
+            (["RRI"], 2, {0: [2010, 2011, 2012, 2013], 1: [2014, 2016, 2017, 2018]}),
+            (["R80P"], 3, {0: [2014], 1: [2019]}),
+        ],
+    )
+    def test_metric_years_per_site(self, sites, metrics, timestep, expected):
+        assert required_years(sites, metrics, timestep=timestep) == expected
+
+    def test_open_ended_years_run_to_end_year(self, sites):
+        result = required_years(sites, ["Y2R", "R80P"], timestep=None, end_year=2018)
+        assert result == {0: list(range(2011, 2019)), 1: [2016, 2017, 2018]}
+
+    def test_reference_years_added_per_site_or_shared(self, sites):
+        shared = required_years(
+            sites, ["dNBR"], timestep=1, reference_years=(2000, 2001)
+        )
+        per_site = required_years(
+            sites,
+            ["dNBR"],
+            timestep=1,
+            reference_years={0: (2000, 2000), 1: (2005, 2006)},
+        )
+        assert shared == {0: [2000, 2001, 2011, 2012], 1: [2000, 2001, 2016, 2017]}
+        assert per_site == {0: [2000, 2011, 2012], 1: [2005, 2006, 2016, 2017]}
+
+    def test_open_ended_without_end_year_throws_value_err(self, sites):
+        with pytest.raises(ValueError, match="end_year is required"):
+            required_years(sites, ["dNBR"], timestep="all")
+
+    def test_metrics_on_pruned_stack_match_full_stack(self, sites):
+        data = np.arange(10 * 3 * 3, dtype=float).reshape(1, 10, 3, 3) ** 1.2
+        full = xr.DataArray(
+            data,
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": ["N"],
+                "time": pd.date_range("2010", "2019", freq="YS"),
+                "y": [0.5, 1.0, 1.5],
+                "x": [0.5, 1.0, 1.5],
+            },
+        ).rio.write_crs("EPSG:4326")
+        years = required_years(sites, ["dNBR", "RRI", "YrYr"], timestep=2)
+        all_years = sorted(set().union(*years.values()))
+        pruned = full.sel(time=full.time.dt.year.isin(all_years))
+        kwargs = dict(
+            restoration_polygons=sites, metrics=["dNBR", "RRI", "YrYr"], timestep=2
+        )
+        expected = compute_metrics(timeseries_data=full, **kwargs)
+        result = compute_metrics(timeseries_data=pruned, **kwargs)
+        assert pruned.sizes["time"] < full.sizes["time"]
+        xr.testing.assert_identical(result, expected)
+
+
+class TestYearIndex:
+
+    @pytest.fixture()
+    def stack(self):
+        return xr.DataArray(
+            np.zeros((1, 4, 2, 2)),
+            dims=["band", "time", "y", "x"],
+            coords={"time": pd.to_datetime(["2010", "2011", "2013", "2014"])},
+        )
+
+    def test_maps_years_to_positions(self, stack):
+        year_index = _year_index(stack)
+        assert list(year_index.get_indexer([2011, 2013, 2012])) == [1, 2, -1]
+
+    def test_index_built_once_per_compute_metrics_call(self, stack):
+        stack = stack.assign_coords(y=[0.25, 0.75], x=[0.25, 0.75]).rio.write_crs(
+            "EPSG:4326"
+        )
+        sites = gpd.GeoDataFrame(
+            {
+                "dist_start": [2010, 2010],
+                "rest_start": [2011, 2011],
+                "geometry": [
+                    Polygon([(0, 0), (0, 0.5), (0.5, 0.5), (0.5, 0)]),
+                    Polygon([(0.5, 0.5), (0.5, 1), (1, 1), (1, 0.5)]),
+                ],
+            },
+            crs="EPSG:4326",
+        )
+        with patch(
+            "spectral_recovery.metrics._year_index", wraps=_year_index
+        ) as year_index:
+            compute_metrics(
+                timeseries_data=stack,
+                restoration_polygons=sites,
+                metrics=["dNBR", "RRI", "YrYr"],
+                timestep=3,
+            )
+        assert year_index.call_count == 1
+
+    def test_index_follows_time_coordinate(self, stack):
+        shifted = stack.assign_coords(time=pd.date_range("2000", "2003", freq="YS"))
+        assert list(_year_index(shifted)) == [2000, 2001, 2002, 2003]
+        assert list(_year_index(stack)) == [2010, 2011, 2013, 2014]
+
+    def test_has_no_missing_years(self, stack):
+        assert not has_no_missing_years(stack)
+        assert has_no_missing_years(stack.isel(time=[2, 3]))
+
+
 class TestY2R:
     valid_poly = Polygon([(0, 0), (0, 1), (1, 1), (1, 0)])
 
@@ -601,6 +1198,30 @@ class TestY2R:
         ).equals(expected)
 
 
+    def test_percent_sequence_adds_percent_dim(self):
+        rt = xr.DataArray([100], dims=["band"]).rio.write_crs("4326")
+        obs = xr.DataArray(
+            [[[[50]], [[70]], [[90]]]],
+            coords={
+                "time": [
+                    pd.to_datetime("2020"),
+                    pd.to_datetime("2021"),
+                    pd.to_datetime("2022"),
+                ]
+            },
+            dims=["band", "time", "y", "x"],
+        ).rio.write_crs("4326")
+
+        result = y2r(
+            restoration_start=2020,
+            timeseries_data=obs,
+            recovery_target=rt,
+            params={"percent_of_target": [50, 70, 90, 100]},
+        )
+        assert result.dims == ("percent", "band", "y", "x")
+        np.testing.assert_array_equal(result.data.ravel(), [0, 1, 2, -9999])
+
+
 class TestDNBR:
     year_period = [
         pd.to_datetime("2010"),
@@ -735,6 +1356,54 @@ class TestDNBR:
             )
 
 
+    def test_timestep_sequence_dNBR(self):
+        obs = xr.DataArray(
+            [[[[50]], [[60]], [[70]], [[80]], [[90]], [[100]]]],
+            coords={"time": self.year_period},
+            dims=["band", "time", "y", "x"],
+        ).rio.write_crs("4326")
+
+        result = dnbr(
+            restoration_start=2010,
+            timeseries_data=obs,
+            params={"timestep": [1, 3, 5]},
+        )
+        assert result.dims == ("timestep", "band", "y", "x")
+        assert list(result.timestep.values) == [1, 3, 5]
+        np.testing.assert_array_equal(result.data.ravel(), [10, 30, 50])
+
+
+    def test_all_timestep_returns_trajectory(self):
+        obs = xr.DataArray(
+            [[[[50]], [[60]], [[70]], [[80]], [[90]], [[100]]]],
+            coords={"time": self.year_period},
+            dims=["band", "time", "y", "x"],
+        ).rio.write_crs("4326")
+
+        result = dnbr(
+            restoration_start=2012,
+            timeseries_data=obs,
+            params={"timestep": "all"},
+        )
+        assert result.dims == ("years_since_restoration", "band", "y", "x")
+        assert list(result.years_since_restoration.values) == [1, 2, 3]
+        np.testing.assert_array_equal(result.data.ravel(), [10, 20, 30])
+
+    def test_invalid_str_timestep_throws_err(self):
+        obs = xr.DataArray(
+            [[[[50]], [[60]], [[70]], [[80]], [[90]], [[100]]]],
+            coords={"time": self.year_period},
+            dims=["band", "time", "y", "x"],
+        ).rio.write_crs("4326")
+
+        with pytest.raises(ValueError, match="timestep must be an int"):
+            dnbr(
+                restoration_start=2012,
+                timeseries_data=obs,
+                params={"timestep": "some"},
+            )
+
+
 class TestRRI:
     year_period_RI = [
         pd.to_datetime("2000"),
@@ -947,6 +1616,41 @@ class TestRRI:
         ).equals(expected)
 
 
+    def test_timestep_sequence(self):
+        obs = xr.DataArray(
+            [[[[70]], [[60]], [[70]], [[80]], [[90]], [[100]], [[80]]]],
+            coords={"time": self.year_period_RI},
+            dims=["band", "time", "y", "x"],
+        ).rio.write_crs("4326")
+
+        result = rri(
+            disturbance_start=2000,
+            restoration_start=2001,
+            timeseries_data=obs,
+            params={"timestep": [1, 4, 5]},
+        )
+        assert result.dims == ("timestep", "band", "y", "x")
+        np.testing.assert_array_equal(result.data.ravel(), [1.0, 4.0, 4.0])
+
+
+    def test_all_timestep_uses_max_of_previous_and_current_year(self):
+        obs = xr.DataArray(
+            [[[[70]], [[60]], [[70]], [[65]], [[90]], [[100]], [[80]]]],
+            coords={"time": self.year_period_RI},
+            dims=["band", "time", "y", "x"],
+        ).rio.write_crs("4326")
+
+        result = rri(
+            disturbance_start=2000,
+            restoration_start=2001,
+            timeseries_data=obs,
+            params={"timestep": "all"},
+        )
+        assert result.dims == ("years_since_restoration", "band", "y", "x")
+        assert list(result.years_since_restoration.values) == [1, 2, 3, 4, 5]
+        np.testing.assert_array_equal(result.data.ravel(), [1.0, 1.0, 3.0, 4.0, 4.0])
+
+
 class TestR80P:
     year_period = [
         pd.to_datetime("2010"),
@@ -1070,6 +1774,24 @@ class TestR80P:
             )
 
 
+    def test_timestep_and_percent_sequences(self):
+        obs = xr.DataArray(
+            [[[[40]], [[50]], [[60]], [[70]], [[75]], [[80]]]],
+            coords={"time": self.year_period},
+            dims=["band", "time", "y", "x"],
+        ).rio.write_crs("4326")
+        rt = xr.DataArray([100], dims=["band"])
+
+        result = r80p(
+            restoration_start=2010,
+            timeseries_data=obs,
+            recovery_target=rt,
+            params={"timestep": [1, 5], "percent_of_target": [50, 100]},
+        )
+        assert result.dims == ("timestep", "percent", "band", "y", "x")
+        np.testing.assert_array_equal(result.data.ravel(), [1.0, 0.5, 1.6, 0.8])
+
+
 class TestYrYr:
     year_period = [
         pd.to_datetime("2010"),
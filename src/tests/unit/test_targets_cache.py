@@ -0,0 +1,150 @@
+import pytest
+import subprocess
+import sys
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+import geopandas as gpd
+
+from shapely import Polygon
+from unittest.mock import patch
+from xarray.testing import assert_identical
+
+from spectral_recovery.targets import historic, reference
+from spectral_recovery.targets.cache import TargetCache
+
+pytest.importorskip("zarr")
+
+
+@pytest.fixture()
+def stack():
+    rng = np.random.default_rng(0)
+    return xr.DataArray(
+        rng.random((2, 3, 10, 10)),
+        dims=["band", "time", "y", "x"],
+        coords={
+            "band": ["NBR", "NDVI"],
+            "time": pd.date_range("2010", "2012", freq="YS"),
+            "y": np.arange(10)[::-1] + 0.5,
+            "x": np.arange(10) + 0.5,
+        },
+    ).rio.write_crs("EPSG:3348", inplace=True)
+
+
+@pytest.fixture()
+def sites():
+    return gpd.GeoDataFrame(
+        geometry=[
+            Polygon([(1, 1), (1, 4), (4, 4), (4, 1)]),
+            Polygon([(5, 5), (5, 9), (9, 9), (9, 5)]),
+        ],
+        index=[4, 9],
+    ).set_crs("EPSG:3348")
+
+
+@pytest.fixture()
+def reference_years():
+    return {4: [2010, 2011], 9: [2011, 2012]}
+
+
+class TestTargetCache:
+
+    @pytest.mark.parametrize("scale", ["polygon", "pixel"])
+    def test_cached_historic_targets_identical(
+        self, tmp_path, stack, sites, reference_years, scale
+    ):
+        expected = historic.median(sites, stack, reference_years, scale)
+        first = historic.median(
+            sites, stack, reference_years, scale, cache=tmp_path
+        )
+        with patch(
+            "spectral_recovery.targets.historic.pixel_pool",
+            side_effect=AssertionError("targets recomputed"),
+        ):
+            second = historic.median(
+                sites, stack, reference_years, scale, cache=tmp_path
+            )
+        assert list(second.keys()) == list(expected.keys())
+        for index in expected:
+            assert_identical(first[index], expected[index])
+            assert_identical(second[index], expected[index])
+
+    def test_cached_reference_target_identical(self, tmp_path, stack, sites):
+        expected = reference.median(sites, stack, 2010, 2012)
+        reference.median(sites, stack, 2010, 2012, cache=tmp_path)
+        with patch(
+            "spectral_recovery.targets.reference.pixel_pool",
+            side_effect=AssertionError("targets recomputed"),
+        ):
+            cached = reference.median(
+                reference_sites=sites,
+                timeseries_data=stack,
+                reference_start=2010,
+                reference_end=2012,
+                cache=tmp_path,
+            )
+        assert_identical(cached, expected)
+
+    def test_key_changes_with_inputs(self, stack, sites, reference_years, tmp_path):
+        cache = TargetCache(tmp_path)
+        key = cache.key(historic.median, sites, stack, reference_years=reference_years)
+        assert key == cache.key(
+            historic.median, sites.copy(), stack.copy(), reference_years=reference_years
+        )
+        assert key != cache.key(
+            historic.median, sites, stack + 1, reference_years=reference_years
+        )
+        assert key != cache.key(
+            historic.median,
+            sites.set_geometry(sites.geometry.translate(1, 0)),
+            stack,
+            reference_years=reference_years,
+        )
+        assert key != cache.key(
+            historic.median, sites, stack, reference_years={4: [2010, 2010]}
+        )
+        assert key != cache.key(
+            historic.window, sites, stack, reference_years=reference_years
+        )
+
+    def test_key_is_stable_across_processes(self, stack, sites, tmp_path):
+        stack.to_dataset(name="stack").to_zarr(tmp_path / "stack.zarr")
+        sites.to_file(tmp_path / "sites.gpkg")
+        script = f"""
+import xarray as xr, geopandas as gpd
+from spectral_recovery.targets import reference
+from spectral_recovery.targets.cache import TargetCache
+stack = xr.open_zarr({str(tmp_path / "stack.zarr")!r}, decode_coords="all")["stack"]
+sites = gpd.read_file({str(tmp_path / "sites.gpkg")!r})
+print(TargetCache({str(tmp_path / "cache")!r}).key(reference.median, sites, stack.load()))
+"""
+        keys = {
+            subprocess.run(
+                [sys.executable, "-c", script], capture_output=True, text=True
+            ).stdout
+            for _ in range(2)
+        }
+        assert len(keys) == 1
+        assert len(keys.pop().strip()) == 64
+
+    def test_evicts_least_recently_used(self, tmp_path, stack, sites):
+        cache = TargetCache(tmp_path)
+        target = reference.median(sites, stack, 2010, 2012)
+        for key in ["a", "b", "c"]:
+            cache.put(key, target)
+        entry_size = cache.size() // 3
+        cache.get("a")
+        cache.max_size = 2 * entry_size
+        cache.evict()
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+
+    def test_missing_key_returns_none(self, tmp_path):
+        assert TargetCache(tmp_path).get("missing") is None
+
+    def test_missing_zarr_throws_import_error(self, tmp_path):
+        with patch("importlib.util.find_spec", return_value=None):
+            with pytest.raises(ImportError, match="spectral_recovery\\[zarr\\]"):
+                TargetCache(tmp_path)
@@ -5,14 +5,21 @@ import xarray as xr
 import pandas as pd
 import geopandas as gpd
 
-from shapely import Polygon
+from shapely import Point, Polygon
 
 from unittest.mock import patch, MagicMock
 from xarray.testing import assert_equal
 from numpy.testing import assert_array_equal
 
 
-from spectral_recovery.targets.historic import median, window, _check_reference_years
+from spectral_recovery.targets import _sites
+from spectral_recovery.targets.historic import (
+    median,
+    quantile,
+    window,
+    _check_reference_years,
+    _focal_mean,
+)
 
 
 def test_invalid_scale_throws_value_error():
@@ -550,6 +557,139 @@ class TestMedianMultipleSites:
         assert_equal(out_dict[33], expected_dict[33])
 
 
+class TestMedianManySites:
+
+    @pytest.fixture()
+    def stack(self):
+        rng = np.random.default_rng(0)
+        data = rng.random((2, 4, 20, 25))
+        data[data < 0.1] = np.nan
+        return xr.DataArray(
+            data,
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": ["NBR", "SAVI"],
+                "time": pd.date_range("2010", "2013", freq="YS"),
+                "y": np.arange(20.0)[::-1],
+                "x": np.arange(25.0),
+            },
+        ).rio.write_crs("EPSG:3348", inplace=True)
+
+    @pytest.fixture()
+    def sites(self):
+        rng = np.random.default_rng(1)
+        geoms = [
+            Point(rng.uniform(2, 22), rng.uniform(2, 17)).buffer(rng.uniform(1, 4))
+            for _ in range(12)
+        ]
+        return gpd.GeoDataFrame(geometry=geoms, index=range(30, 42)).set_crs(
+            "EPSG:3348"
+        )
+
+    @pytest.fixture()
+    def reference_years(self, sites):
+        windows = [[2010, 2011], [2011, 2013], [2012, 2012]]
+        return {index: windows[i % 3] for i, index in enumerate(sites.index)}
+
+    @pytest.mark.parametrize("scale", ["pixel", "polygon"])
+    def test_matches_per_site_clip(self, stack, sites, reference_years, scale):
+        result = median(
+            restoration_sites=sites,
+            timeseries_data=stack,
+            reference_years=reference_years,
+            scale=scale,
+        )
+        assert list(result.keys()) == list(sites.index)
+        for index, site in sites.iterrows():
+            ref_s, ref_e = reference_years[index]
+            expected = (
+                stack.rio.clip([site.geometry])
+                .sel(time=slice(str(ref_s), str(ref_e)))
+                .median(dim="time", skipna=True)
+            )
+            if scale == "polygon":
+                expected = expected.median(dim=["y", "x"], skipna=True)
+            xr.testing.assert_allclose(result[index], expected)
+
+    @pytest.mark.parametrize("scale", ["pixel", "polygon"])
+    def test_dataset_matches_band_stack(self, stack, sites, reference_years, scale):
+        expected = median(sites, stack, reference_years, scale)
+        result = median(sites, stack.to_dataset(dim="band"), reference_years, scale)
+        assert list(result.keys()) == list(expected.keys())
+        for index in expected:
+            xr.testing.assert_identical(result[index], expected[index])
+
+    def test_one_gather_per_reference_window(self, stack, sites, reference_years):
+        with patch(
+            "spectral_recovery.targets._sites.gather_pixels",
+            wraps=_sites.gather_pixels,
+        ) as gather_mock:
+            median(
+                restoration_sites=sites,
+                timeseries_data=stack,
+                reference_years=reference_years,
+                scale="pixel",
+            )
+        assert gather_mock.call_count == 3
+
+    @pytest.mark.parametrize("scale", ["pixel", "polygon"])
+    def test_quantile_matches_per_site_clip(
+        self, stack, sites, reference_years, scale
+    ):
+        result = quantile(
+            restoration_sites=sites,
+            timeseries_data=stack,
+            reference_years=reference_years,
+            scale=scale,
+            q=0.75,
+        )
+        for index, site in sites.iterrows():
+            ref_s, ref_e = reference_years[index]
+            expected = (
+                stack.rio.clip([site.geometry])
+                .sel(time=slice(str(ref_s), str(ref_e)))
+                .quantile(0.75, dim="time", skipna=True)
+            )
+            if scale == "polygon":
+                expected = expected.quantile(0.75, dim=["y", "x"], skipna=True)
+            np.testing.assert_allclose(
+                result[index], expected.transpose(*result[index].dims)
+            )
+
+    @pytest.mark.parametrize("q", [0.25, 0.5, 0.9])
+    def test_approx_quantile_within_error(self, stack, sites, reference_years, q):
+        exact = quantile(
+            restoration_sites=sites,
+            timeseries_data=stack,
+            reference_years=reference_years,
+            scale="polygon",
+            q=q,
+        )
+        approx = quantile(
+            restoration_sites=sites,
+            timeseries_data=stack.chunk({"y": 7, "x": 7}),
+            reference_years=reference_years,
+            scale="polygon",
+            q=q,
+            approx=True,
+            error=0.01,
+            value_range=(0, 1),
+        )
+        for index in sites.index:
+            np.testing.assert_allclose(approx[index], exact[index], atol=0.01)
+
+    @pytest.mark.parametrize("q", [-0.1, 1.5])
+    def test_invalid_q_throws_value_error(self, stack, sites, reference_years, q):
+        with pytest.raises(ValueError, match="q must be between 0 and 1"):
+            quantile(
+                restoration_sites=sites,
+                timeseries_data=stack,
+                reference_years=reference_years,
+                scale="polygon",
+                q=q,
+            )
+
+
 class TestCheckReferenceYears:
 
     test_stack = xr.DataArray(
@@ -601,6 +741,16 @@ class TestCheckReferenceYears:
                 },
             )
 
+    def test_reports_all_missing_years(self):
+        with pytest.raises(
+            ValueError, match=r"polygon 0: \[2009\]; polygon 1: \[2011\]"
+        ):
+            _check_reference_years(
+                restoration_sites=self.valid_gpd,
+                timeseries_data=self.test_stack,
+                reference_years={0: [2009, 2010], 1: [2010, 2011]},
+            )
+
 
 class TestWindow:
     valid_poly = Polygon([(-1.5, -1.5), (-1.5, 2.5), (2.5, 2.5), (1.5, -1.5)])
@@ -664,20 +814,22 @@ class TestWindow:
                 N=2,
             )
 
-    @patch("xarray.DataArray.rolling")
-    def test_rolling_called_with_N_center_True_and_minp_None(
-        self, roll_mock, valid_array, valid_gpd
-    ):
-
-        window(
-            restoration_sites=valid_gpd,
-            timeseries_data=valid_array,
-            reference_years={0: [2010, 2011]},
-        )
-        assert roll_mock.called_once
-        roll_mock.call_args.kwargs["dim"] == {"x": 3, "y": 3}
-        roll_mock.call_args.kwargs["center"] == True
-        roll_mock.call_args.kwargs["min_periods"] == None
+    @pytest.mark.parametrize("N", [1, 3, 15, 31])
+    @pytest.mark.parametrize("na_rm", [True, False])
+    @pytest.mark.parametrize("chunked", [False, True])
+    def test_focal_mean_matches_centred_rolling_mean(self, N, na_rm, chunked):
+        rng = np.random.default_rng(0)
+        data = rng.random((2, 40, 36))
+        data[data < 0.05] = np.nan
+        median_time = xr.DataArray(data, dims=["band", "y", "x"])
+        expected = median_time.rolling(
+            dim={"y": N, "x": N}, center=True, min_periods=1 if na_rm else None
+        ).mean()
+        if chunked:
+            median_time = median_time.chunk({"y": 8, "x": 12})
+        result = _focal_mean(median_time, N=N, na_rm=na_rm)
+        assert (result.chunks is not None) == chunked
+        xr.testing.assert_allclose(result.compute(), expected)
 
     def test_window_returns_correct_dict(self, valid_array, valid_gpd):
         expected_dims_and_sizes = {"band": 2, "y": 4, "x": 4}
@@ -887,3 +1039,63 @@ class TestWindow:
         result_dict = window(**valid_build, na_rm=False)
         result_stack = result_dict[0]
         assert_array_equal(expected_data, result_stack)
+
+    def test_sites_sharing_reference_years_share_one_median(self, valid_array):
+        sites = gpd.GeoDataFrame(
+            geometry=[
+                Polygon([(-4.5, -4.5), (-4.5, -2.5), (-2.5, -2.5), (-2.5, -4.5)]),
+                Polygon([(0.5, 0.5), (0.5, 2.5), (2.5, 2.5), (2.5, 0.5)]),
+                Polygon([(-1.5, -1.5), (-1.5, 0.5), (0.5, 0.5), (0.5, -1.5)]),
+            ]
+        ).set_crs("EPSG:3348")
+        reference_years = {0: [2010, 2011], 1: [2010, 2011], 2: [2012, 2013]}
+        with patch.object(
+            xr.DataArray, "median", autospec=True, side_effect=xr.DataArray.median
+        ) as median_mock:
+            result = window(
+                restoration_sites=sites,
+                timeseries_data=valid_array,
+                reference_years=reference_years,
+            )
+        assert median_mock.call_count == 2
+        assert list(result.keys()) == [0, 1, 2]
+
+    @pytest.mark.parametrize("na_rm", [True, False])
+    def test_focal_over_union_window_matches_full_scene(self, na_rm):
+        rng = np.random.default_rng(0)
+        data = rng.random((1, 3, 12, 12))
+        data[data < 0.1] = np.nan
+        stack = xr.DataArray(
+            data,
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": ["NBR"],
+                "time": pd.date_range("2010", "2012", freq="YS"),
+                "y": np.arange(12)[::-1],
+                "x": np.arange(12),
+            },
+        ).rio.write_crs("EPSG:3348", inplace=True)
+        sites = gpd.GeoDataFrame(
+            geometry=[
+                Polygon([(0.5, 0.5), (0.5, 3.5), (3.5, 3.5), (3.5, 0.5)]),
+                Polygon([(6.5, 4.5), (6.5, 8.5), (9.5, 8.5), (9.5, 4.5)]),
+            ]
+        ).set_crs("EPSG:3348")
+        result = window(
+            restoration_sites=sites,
+            timeseries_data=stack,
+            reference_years={0: [2010, 2012], 1: [2010, 2012]},
+            N=5,
+            na_rm=na_rm,
+        )
+        full_scene = (
+            stack.median(dim="time", skipna=True)
+            .rolling(
+                dim={"y": 5, "x": 5}, center=True, min_periods=1 if na_rm else None
+            )
+            .mean()
+        )
+        for poly_id, site in sites.iterrows():
+            xr.testing.assert_allclose(
+                result[poly_id], full_scene.rio.clip([site.geometry])
+            )
@@ -6,9 +6,12 @@ import geopandas as gpd
 
 from shapely import Polygon
 from xarray.testing import assert_equal
+from numpy.testing import assert_array_equal
 from unittest.mock import patch
 
-from spectral_recovery.targets.reference import median
+from spectral_recovery.targets import _sites
+from spectral_recovery.targets.reference import median, quantile
+from spectral_recovery.targets._sketch import QuantileSketch, site_quantiles
 
 
 class TestMedian:
@@ -242,3 +245,249 @@ class TestMedianMultipleSites:
             reference_end="1",
         )
         assert_equal(out_stack, expected_stack)
+
+    def test_pooled_takes_median_of_all_reference_pixels(self):
+        # Site 1 covers 1 pixel, site 2 covers 3 pixels
+        polygon1 = Polygon([(-1.5, 1.5), (-0.5, 1.5), (-0.5, 0.5), (-1.5, 0.5)])
+        polygon2 = Polygon([(0.5, 1.5), (1.5, 1.5), (1.5, -1.5), (0.5, -1.5)])
+        valid_gpd = gpd.GeoDataFrame(geometry=[polygon1, polygon2]).set_crs("EPSG:3348")
+        test_stack = xr.DataArray(
+            [[[[1.0, 0.0, 2.0], [0.0, 0.0, 4.0], [0.0, 0.0, 6.0]]]],
+            dims=["time", "band", "y", "x"],
+            coords={"time": [0], "y": [1, 0, -1], "x": [-1, 0, 1]},
+        ).rio.write_crs("EPSG:3348", inplace=True)
+
+        median_of_medians = median(
+            reference_sites=valid_gpd,
+            timeseries_data=test_stack,
+            reference_start=0,
+            reference_end=0,
+        )
+        pooled = median(
+            reference_sites=valid_gpd,
+            timeseries_data=test_stack,
+            reference_start=0,
+            reference_end=0,
+            pooled=True,
+        )
+        # median(median([1]), median([2, 4, 6])) vs. median([1, 2, 4, 6])
+        assert_array_equal(median_of_medians.values, [2.5])
+        assert_array_equal(pooled.values, [3.0])
+
+    def test_separated_sites_only_gather_covered_pixels(self):
+        polygon1 = Polygon([(0, 0), (0, 2), (2, 2), (2, 0)])
+        polygon2 = Polygon([(96, 96), (96, 98), (98, 98), (98, 96)])
+        valid_gpd = gpd.GeoDataFrame(geometry=[polygon1, polygon2]).set_crs("EPSG:3348")
+        test_stack = xr.DataArray(
+            np.ones((1, 2, 100, 100)),
+            dims=["band", "time", "y", "x"],
+            coords={
+                "time": [0, 1],
+                "y": np.arange(100)[::-1] + 0.5,
+                "x": np.arange(100) + 0.5,
+            },
+        ).rio.write_crs("EPSG:3348", inplace=True)
+        with patch(
+            "spectral_recovery.targets._sites.gather_pixels",
+            wraps=_sites.gather_pixels,
+        ) as gather_mock:
+            out_stack = median(
+                reference_sites=valid_gpd,
+                timeseries_data=test_stack,
+                reference_start=0,
+                reference_end=1,
+            )
+        assert gather_mock.call_args.args[1].size == 8
+        assert_array_equal(out_stack.values, [1.0])
+
+    def test_quantile_of_site_quantiles(self):
+        # Site 1 covers 1 pixel, site 2 covers 3 pixels
+        polygon1 = Polygon([(-1.5, 1.5), (-0.5, 1.5), (-0.5, 0.5), (-1.5, 0.5)])
+        polygon2 = Polygon([(0.5, 1.5), (1.5, 1.5), (1.5, -1.5), (0.5, -1.5)])
+        valid_gpd = gpd.GeoDataFrame(geometry=[polygon1, polygon2]).set_crs("EPSG:3348")
+        test_stack = xr.DataArray(
+            [[[[1.0, 0.0, 2.0], [0.0, 0.0, 4.0], [0.0, 0.0, 6.0]]]],
+            dims=["time", "band", "y", "x"],
+            coords={"time": [0], "y": [1, 0, -1], "x": [-1, 0, 1]},
+        ).rio.write_crs("EPSG:3348", inplace=True)
+
+        per_site = quantile(
+            reference_sites=valid_gpd,
+            timeseries_data=test_stack,
+            reference_start=0,
+            reference_end=0,
+            q=0.75,
+        )
+        pooled = quantile(
+            reference_sites=valid_gpd,
+            timeseries_data=test_stack,
+            reference_start=0,
+            reference_end=0,
+            q=0.75,
+            pooled=True,
+        )
+        # median(q75([1]), q75([2, 4, 6])) vs. q75([1, 2, 4, 6])
+        assert_array_equal(per_site.values, [3.0])
+        assert_array_equal(pooled.values, [4.5])
+
+    @pytest.mark.parametrize("pooled", [False, True])
+    def test_approx_quantile_within_error(self, pooled):
+        rng = np.random.default_rng(0)
+        polygon1 = Polygon([(0, 0), (0, 40), (30, 40), (30, 0)])
+        polygon2 = Polygon([(50, 50), (50, 90), (90, 90), (90, 50)])
+        valid_gpd = gpd.GeoDataFrame(geometry=[polygon1, polygon2]).set_crs("EPSG:3348")
+        test_stack = xr.DataArray(
+            rng.normal(size=(2, 5, 100, 100)),
+            dims=["band", "time", "y", "x"],
+            coords={
+                "time": [0, 1, 2, 3, 4],
+                "y": np.arange(100)[::-1] + 0.5,
+                "x": np.arange(100) + 0.5,
+            },
+        ).rio.write_crs("EPSG:3348", inplace=True)
+        kwargs = dict(
+            reference_sites=valid_gpd,
+            reference_start=0,
+            reference_end=4,
+            q=0.75,
+            pooled=pooled,
+        )
+        exact = quantile(timeseries_data=test_stack, **kwargs)
+        approx = quantile(
+            timeseries_data=test_stack.chunk({"y": 30, "x": 30}),
+            approx=True,
+            error=0.001,
+            value_range=(-5, 5),
+            **kwargs,
+        )
+        np.testing.assert_allclose(approx, exact, atol=0.01)
+
+    @pytest.mark.parametrize("value_range", [None, [(0, 10000), (0, 1)]])
+    def test_approx_error_is_per_band(self, value_range):
+        # A reflectance band and an index band on very different scales
+        rng = np.random.default_rng(0)
+        polygon = Polygon([(0, 0), (0, 40), (30, 40), (30, 0)])
+        valid_gpd = gpd.GeoDataFrame(geometry=[polygon]).set_crs("EPSG:3348")
+        data = rng.random((2, 3, 50, 50))
+        data[0] = data[0] * 9000 + 1000
+        data[1] = data[1] * 0.2 + 0.2
+        test_stack = xr.DataArray(
+            data,
+            dims=["band", "time", "y", "x"],
+            coords={
+                "time": [0, 1, 2],
+                "y": np.arange(50)[::-1] + 0.5,
+                "x": np.arange(50) + 0.5,
+            },
+        ).rio.write_crs("EPSG:3348", inplace=True)
+        kwargs = dict(
+            reference_sites=valid_gpd,
+            timeseries_data=test_stack,
+            reference_start=0,
+            reference_end=2,
+            q=0.5,
+        )
+        exact = quantile(**kwargs)
+        approx = quantile(approx=True, error=0.001, value_range=value_range, **kwargs)
+        np.testing.assert_allclose(approx[0], exact[0], atol=10)
+        np.testing.assert_allclose(approx[1], exact[1], atol=0.001)
+
+    def test_dataset_matches_band_stack(self):
+        rng = np.random.default_rng(0)
+        polygon1 = Polygon([(0, 0), (0, 4), (3, 4), (3, 0)])
+        polygon2 = Polygon([(5, 5), (5, 9), (9, 9), (9, 5)])
+        valid_gpd = gpd.GeoDataFrame(geometry=[polygon1, polygon2]).set_crs("EPSG:3348")
+        test_stack = xr.DataArray(
+            rng.random((2, 3, 10, 10)),
+            dims=["band", "time", "y", "x"],
+            coords={
+                "band": ["NBR", "NDVI"],
+                "time": [0, 1, 2],
+                "y": np.arange(10)[::-1] + 0.5,
+                "x": np.arange(10) + 0.5,
+            },
+        ).rio.write_crs("EPSG:3348", inplace=True)
+
+        expected = median(valid_gpd, test_stack, 0, 2)
+        result = median(valid_gpd, test_stack.to_dataset(dim="band"), 0, 2)
+        xr.testing.assert_identical(result, expected)
+
+
+class TestQuantileSketch:
+
+    def test_merged_sketches_match_one_sketch(self):
+        rng = np.random.default_rng(0)
+        values = rng.random((2, 1000))
+        labels = rng.integers(0, 3, 1000)
+        whole = QuantileSketch(2, 3, (0, 1), error=0.01).update(values, labels)
+        merged = QuantileSketch(2, 3, (0, 1), error=0.01)
+        for chunk in np.array_split(np.arange(1000), 7):
+            merged.merge(
+                QuantileSketch(2, 3, (0, 1), error=0.01).update(
+                    values[:, chunk], labels[chunk]
+                )
+            )
+        assert_array_equal(merged.counts, whole.counts)
+
+    @pytest.mark.parametrize("q", [0.0, 0.1, 0.5, 0.75, 1.0])
+    def test_quantile_within_one_bin(self, q):
+        rng = np.random.default_rng(1)
+        values = rng.random((1, 501))
+        values[0, :10] = np.nan
+        labels = np.zeros(501, dtype=int)
+        sketch = QuantileSketch(1, 1, (0, 1), error=0.01).update(values, labels)
+        np.testing.assert_allclose(
+            sketch.quantile(q)[0, 0], np.nanquantile(values, q), atol=0.01
+        )
+
+    @pytest.mark.parametrize("chunks", [None, {"y": 7, "x": 7}])
+    def test_site_quantiles_merges_batch_sketches(self, chunks):
+        rng = np.random.default_rng(2)
+        test_stack = xr.DataArray(
+            rng.random((2, 3, 20, 20)),
+            dims=["band", "time", "y", "x"],
+            coords={
+                "time": [0, 1, 2],
+                "y": np.arange(20)[::-1] + 0.5,
+                "x": np.arange(20) + 0.5,
+            },
+        ).rio.write_crs("EPSG:3348", inplace=True)
+        sites = {
+            0: Polygon([(0, 0), (0, 12), (12, 12), (12, 0)]),
+            1: Polygon([(8, 8), (8, 20), (20, 20), (20, 8)]),
+        }
+        site_info, rows, cols = _sites.pixel_pool(sites, test_stack)
+        if chunks is not None:
+            test_stack = test_stack.chunk(chunks)
+        kwargs = dict(q=0.5, error=0.01, value_range=(0, 1))
+
+        whole = site_quantiles(test_stack, site_info, rows, cols, **kwargs)
+        with patch.object(
+            QuantileSketch, "merge", autospec=True, side_effect=QuantileSketch.merge
+        ) as merge_mock:
+            # 2 bands x 3 times x 8 bytes per pixel, 50 pixels per batch
+            batched = site_quantiles(
+                test_stack, site_info, rows, cols, max_mem="2400B", **kwargs
+            )
+        assert merge_mock.call_count >= rows.size // 50
+        assert_array_equal(batched, whole)
+        expected = [
+            np.median(test_stack.median("time").values[:, r, c], axis=-1)
+            for _, r, c, _ in site_info.values()
+        ]
+        np.testing.assert_allclose(batched, np.stack(expected, axis=-1), atol=0.01)
+
+    def test_rows_have_their_own_bins(self):
+        values = np.array([[5000.0, 6000.0], [0.3, 0.31]])
+        sketch = QuantileSketch(
+            2, 1, [(0, 10000), (0, 1)], error=0.001
+        ).update(values, np.array([0, 0]))
+        median = sketch.quantile(0.5)[:, 0]
+        np.testing.assert_allclose(median[0], 5500.0, atol=10)
+        np.testing.assert_allclose(median[1], 0.305, atol=0.001)
+
+    def test_label_without_values_is_nan(self):
+        sketch = QuantileSketch(1, 2, (0, 1)).update(
+            np.array([[0.5, np.nan]]), np.array([0, 1])
+        )
+        assert np.isnan(sketch.quantile(0.5)[0, 1])
@@ -86,6 +86,52 @@ class TestSatelliteTimeSeriesContainsTemporal:
         test_date = [pd.to_datetime("2006"), pd.to_datetime("2008")]
         assert not image_stack.satts.contains_temporal(test_date)
 
+    def test_second_resolution_time_axis(self, image_stack):
+        image_stack = image_stack.assign_coords(
+            time=image_stack.time.values.astype("datetime64[s]")
+        )
+        assert image_stack.satts.contains_temporal(
+            [pd.to_datetime("2007"), pd.to_datetime("2009")]
+        )
+
+
+class TestSatelliteTimeSeriesMissingYears:
+    @pytest.fixture()
+    def image_stack(self):
+        return xr.DataArray(
+            np.zeros((1, 4, 1, 1)),
+            dims=["band", "time", "y", "x"],
+            coords={"time": pd.to_datetime(["2012", "2008", "2009", "2011"])},
+        )
+
+    def test_reports_every_missing_year_per_site(self, image_stack):
+        site_years = {
+            "a": [2013, 2008, 2010, 2010],
+            "b": [2009, 2011],
+            3: np.array([2007.0]),
+            4: range(2008, 2013),
+        }
+        assert image_stack.satts.missing_years(site_years) == {
+            "a": [2010, 2013],
+            3: [2007],
+            4: [2010],
+        }
+
+    def test_no_missing_years_returns_empty(self, image_stack):
+        assert image_stack.satts.missing_years({0: [2008, 2012], 1: []}) == {}
+        assert image_stack.satts.missing_years({}) == {}
+
+    def test_empty_time_axis_reports_all_years(self, image_stack):
+        empty = image_stack.isel(time=[])
+        assert empty.satts.missing_years({0: [2009, 2008]}) == {0: [2008, 2009]}
+
+    @pytest.mark.parametrize(
+        "start, end, expected",
+        [(2008, 2009, True), (2011, 2012, True), (2008, 2011, False)],
+    )
+    def test_has_no_year_breaks(self, image_stack, start, end, expected):
+        assert image_stack.satts.has_no_year_breaks(start, end) is expected
+
 
 class TestSatelliteTimeSeriesStats:
     @pytest.fixture()
@@ -143,3 +189,112 @@ class TestSatelliteTimeSeriesStats:
             )
             is None
         )
+
+    @pytest.fixture()
+    def nan_stack(self):
+        rng = np.random.default_rng(0)
+        data = rng.random((2, 3, 9, 7))
+        data[rng.random(data.shape) < 0.2] = np.nan
+        data[0, 1] = np.nan
+        return xr.DataArray(
+            data,
+            dims=["band", "time", "y", "x"],
+            coords={"time": pd.date_range("2007", "2009", freq=DATETIME_FREQ)},
+        )
+
+    @pytest.mark.parametrize("chunks", [None, {"y": 4, "x": 3}])
+    def test_stats_match_xarray_reductions(self, nan_stack, chunks):
+        stack = nan_stack if chunks is None else nan_stack.chunk(chunks)
+        stats = stack.satts.stats(percentiles=[10, 97.5]).compute()
+        expected = {
+            "mean": nan_stack.mean(dim=["y", "x"]),
+            "median": nan_stack.median(dim=["y", "x"]),
+            "max": nan_stack.max(dim=["y", "x"]),
+            "min": nan_stack.min(dim=["y", "x"]),
+            "std": nan_stack.std(dim=["y", "x"]),
+            "p10": nan_stack.quantile(0.1, dim=["y", "x"]),
+            "p97.5": nan_stack.quantile(0.975, dim=["y", "x"]),
+        }
+        assert list(stats["stats"].values) == list(expected)
+        for name, values in expected.items():
+            np.testing.assert_allclose(stats.sel(stats=name), values, rtol=1e-12)
+
+    def test_dask_median_exact_for_bands_on_different_scales(self, nan_stack):
+        # A reflectance band, an index band and an image with an outlier
+        stack = nan_stack.copy()
+        stack[0] = stack[0] * 10000
+        stack[1] = stack[1] * 0.1 + 0.25
+        stack[1, 0, 0, 0] = 1e6
+        stats = stack.chunk({"y": 4, "x": 3}).satts.stats(percentiles=[10])
+        np.testing.assert_allclose(
+            stats.sel(stats="median"), stack.median(dim=["y", "x"]), rtol=1e-12
+        )
+        np.testing.assert_allclose(
+            stats.sel(stats="p10"), stack.quantile(0.1, dim=["y", "x"]), rtol=1e-12
+        )
+
+    def test_all_nan_image_returns_nan(self, nan_stack):
+        stats = nan_stack.satts.stats(percentiles=[50])
+        assert stats.isel(band=0, time=1).isnull().all()
+        assert stats.isel(band=0, time=0).notnull().all()
+
+    def test_float32_stack_keeps_dtype(self, nan_stack):
+        stats = nan_stack.astype(np.float32).satts.stats()
+        assert stats.dtype == np.float32
+
+    @pytest.mark.parametrize("percentile", [-1, 101])
+    def test_invalid_percentile_throws_value_error(self, test_stack, percentile):
+        with pytest.raises(ValueError, match="between 0 and 100"):
+            test_stack.satts.stats(percentiles=[percentile])
+
+
+class TestSatelliteTimeSeriesRechunk:
+    @pytest.fixture()
+    def test_stack(self):
+        test_data = np.arange(2 * 4 * 8 * 6, dtype=float).reshape(2, 4, 8, 6)
+        test_stack = xr.DataArray(
+            test_data,
+            dims=["band", "time", "y", "x"],
+            coords={
+                "time": pd.date_range("2007", "2010", freq=DATETIME_FREQ),
+                "y": np.arange(8.0),
+                "x": np.arange(6.0),
+            },
+        )
+        return test_stack.rio.write_crs("EPSG:3005")
+
+    def test_plan_spans_full_time_within_max_mem(self, test_stack):
+        # One pixel with every band and year is 2 * 4 * 8 = 64 bytes
+        plan = test_stack.chunk({"time": 1}).satts.rechunk_plan(max_mem=64 * 4)
+        assert plan["target_chunks"] == {"band": 2, "time": 4, "y": 2, "x": 2}
+        assert plan["chunk_mem"] <= plan["max_mem"]
+        assert plan["rechunk"]
+        assert plan["intermediate"]
+
+    def test_plan_accepts_byte_strings(self, test_stack):
+        plan = test_stack.chunk({"time": 1}).satts.rechunk_plan(max_mem="1kB")
+        assert plan["max_mem"] == 1000
+
+    def test_time_contiguous_stack_needs_no_rechunk(self, test_stack):
+        chunked = test_stack.chunk({"y": 2, "x": 2})
+        assert not chunked.satts.rechunk_plan(max_mem=64 * 4)["rechunk"]
+        assert chunked.satts.rechunk_time(max_mem=64 * 4) is chunked
+
+    def test_numpy_stack_returned_unchanged(self, test_stack):
+        assert test_stack.satts.rechunk_time() is test_stack
+
+    def test_rechunk_time_uses_planned_chunks(self, test_stack):
+        result = test_stack.chunk({"time": 1}).satts.rechunk_time(max_mem=64 * 4)
+        assert result.chunksizes["time"] == (4,)
+        assert result.chunksizes["y"] == (2, 2, 2, 2)
+        xr.testing.assert_identical(result.compute(), test_stack)
+
+    def test_rechunk_time_through_temp_store(self, test_stack, tmp_path):
+        pytest.importorskip("zarr")
+        result = test_stack.chunk({"time": 1}).satts.rechunk_time(
+            max_mem=64 * 4, temp_store=str(tmp_path / "stage.zarr")
+        )
+        assert (tmp_path / "stage.zarr").exists()
+        assert result.chunksizes["time"] == (4,)
+        assert result.rio.crs == test_stack.rio.crs
+        xr.testing.assert_allclose(result.compute(), test_stack)